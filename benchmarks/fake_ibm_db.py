@@ -0,0 +1,241 @@
+# ibm_db-compatible stand-in over SQLite, for benchmarks only.
+# Install it with sys.modules["ibm_db"] = fake_ibm_db before importing anything from scripts/.
+# job_mgmt and public are attached SQLite files so schema-qualified DB2 names keep working.
+import datetime
+import decimal
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SQL_AUTOCOMMIT_ON = 1
+SQL_AUTOCOMMIT_OFF = 0
+SQL_ATTR_CURSOR_TYPE = 10
+SQL_CURSOR_FORWARD_ONLY = 0
+SQL_ATTR_QUERY_TIMEOUT = 11
+SQL_ATTR_ROWCOUNT_PREFETCH = 12
+SQL_ROWCOUNT_PREFETCH_ON = 1
+
+# Simulated network latency per round trip (connects cost 10x)
+LATENCY_MS = float(os.getenv("FAKE_DB2_LATENCY_MS", "0"))
+
+ROUND_TRIPS = 0
+CONNECTS = 0
+_lock = threading.Lock()
+_errmsg = ""
+
+
+def _count(connect=False):
+    global ROUND_TRIPS, CONNECTS
+    with _lock:
+        ROUND_TRIPS += 1
+        if connect:
+            CONNECTS += 1
+    if LATENCY_MS:
+        time.sleep(LATENCY_MS * (10 if connect else 1) / 1000)
+
+
+def reset_counters():
+    global ROUND_TRIPS, CONNECTS
+    with _lock:
+        ROUND_TRIPS = 0
+        CONNECTS = 0
+
+
+def _days_between(a, b):
+    def as_date(v):
+        if isinstance(v, str):
+            v = datetime.datetime.fromisoformat(v)
+        if isinstance(v, datetime.datetime):
+            v = v.date()
+        return v
+    if a is None or b is None:
+        return None
+    return (as_date(a) - as_date(b)).days
+
+
+_REWRITES = [
+    (re.compile(r"SELECT\s+IDENTITY_VAL_LOCAL\(\)\s+FROM\s+sysibm\.sysdummy1", re.I), 'SELECT last_insert_rowid() AS "1"'),
+    (re.compile(r"\s+FROM\s+sysibm\.sysdummy1", re.I), ""),
+    (re.compile(r"\s+FOR\s+READ\s+ONLY(\s+WITH\s+UR)?", re.I), ""),
+    (re.compile(r"\s+WITH\s+UR\b", re.I), ""),
+    (re.compile(r"FETCH\s+FIRST\s+(\d+)\s+ROWS?\s+ONLY", re.I), r"LIMIT \1"),
+    (re.compile(r"CURRENT\s+TIMESTAMP", re.I), "CURRENT_TIMESTAMP"),
+    (re.compile(r"CURRENT\s+DATE", re.I), "CURRENT_DATE"),
+]
+
+
+def translate(sql):
+    for pattern, repl in _REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+
+class _Conn:
+    def __init__(self, path):
+        self.db = sqlite3.connect(os.path.join(path, "main.db"), check_same_thread=False,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None)
+        for schema in ("job_mgmt", "public"):
+            self.db.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(path, f"{schema}.db"),))
+        self.db.create_function("DAYS_BETWEEN", 2, _days_between)
+        self.db.create_function("MOD", 2, lambda a, b: None if a is None else a % b)
+        self.autocommit = True
+        self.open = True
+
+
+class _Stmt:
+    def __init__(self, conn, sql):
+        self.conn = conn
+        self.sql = translate(sql)
+        self.cursor = None
+        self.rowcount = -1
+
+    def run(self, params=()):
+        _count()
+        c = self.conn.db
+        if not self.conn.autocommit and not c.in_transaction:
+            c.execute("BEGIN")
+        self.cursor = c.execute(self.sql, tuple(_adapt(p) for p in params))
+        self.rowcount = self.cursor.rowcount
+        self._peek = None
+        return True
+
+
+def _adapt(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def connect(conn_str, user, password):
+    _count(connect=True)
+    path = os.getenv("FAKE_DB2_PATH")
+    m = re.search(r"SQLITE=([^;]+)", conn_str or "")
+    if m:
+        path = m.group(1)
+    if not path:
+        raise Exception("[fake ibm_db] no database path (set FAKE_DB2_PATH)")
+    return _Conn(path)
+
+
+def close(conn):
+    conn.db.close()
+    conn.open = False
+    return True
+
+
+def active(conn):
+    return conn is not None and conn.open
+
+
+def autocommit(conn, value=None):
+    if value is None:
+        return SQL_AUTOCOMMIT_ON if conn.autocommit else SQL_AUTOCOMMIT_OFF
+    conn.autocommit = value == SQL_AUTOCOMMIT_ON
+    return True
+
+
+def commit(conn):
+    _count()
+    if conn.db.in_transaction:
+        conn.db.execute("COMMIT")
+    return True
+
+
+def rollback(conn):
+    _count()
+    if conn.db.in_transaction:
+        conn.db.execute("ROLLBACK")
+    return True
+
+
+def prepare(conn, sql, options=None):
+    return _Stmt(conn, sql)
+
+
+def execute(stmt, params=()):
+    return stmt.run(params or ())
+
+
+def exec_immediate(conn, sql, options=None):
+    stmt = _Stmt(conn, sql)
+    stmt.run()
+    return stmt
+
+
+def set_option(resource, options, kind):
+    return True
+
+
+def num_rows(stmt):
+    return stmt.rowcount
+
+
+def num_fields(stmt):
+    return len(stmt.cursor.description or [])
+
+
+def field_name(stmt, i):
+    return stmt.cursor.description[i][0].upper()
+
+
+def _first_row(stmt):
+    if stmt._peek is None:
+        row = stmt.cursor.fetchone()
+        stmt._peek = [row] if row is not None else []
+    return stmt._peek[0] if stmt._peek else None
+
+
+def field_type(stmt, i):
+    row = _first_row(stmt)
+    value = row[i] if row else None
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, datetime.datetime):
+        return "timestamp"
+    if isinstance(value, datetime.date):
+        return "date"
+    return "string"
+
+
+def field_precision(stmt, i):
+    return 0
+
+
+def field_scale(stmt, i):
+    return 0
+
+
+def _next(stmt):
+    if stmt._peek:
+        return stmt._peek.pop()
+    return stmt.cursor.fetchone()
+
+
+def fetch_tuple(stmt):
+    if stmt.cursor is None or stmt.cursor.description is None:
+        return False
+    row = _next(stmt)
+    return tuple(row) if row is not None else False
+
+
+def fetch_assoc(stmt):
+    if stmt.cursor is None or stmt.cursor.description is None:
+        return False
+    row = _next(stmt)
+    if row is None:
+        return False
+    return {d[0].upper(): v for d, v in zip(stmt.cursor.description, row)}
+
+
+def stmt_errormsg(stmt=None):
+    return _errmsg
+
+
+def conn_errormsg(conn=None):
+    return _errmsg
@@ -0,0 +1,192 @@
+# In-memory stand-in for kubernetes.client.BatchV1Api (CronJobs only), for benchmarks.
+import copy
+import os
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+try:
+    from kubernetes.client.exceptions import ApiException as _ApiException
+except ImportError:
+    _ApiException = Exception
+
+LATENCY_MS = float(os.getenv("FAKE_K8S_LATENCY_MS", "0"))
+
+
+class FakeApiException(_ApiException):
+    # Subclasses the real ApiException so `except ApiException` in scripts/ still catches it
+    def __init__(self, status, reason=""):
+        Exception.__init__(self, f"({status}) {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = None
+        self.headers = None
+
+
+def _to_dict(body):
+    if isinstance(body, dict):
+        return copy.deepcopy(body)
+    from kubernetes import client
+    return client.ApiClient().sanitize_for_serialization(body)
+
+
+def _merge(target, patch):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def as_object(manifest):
+    # Mimics the attribute access of the real client models (cj.metadata.name, cj.spec.suspend...)
+    obj = _namespace(manifest)
+    metadata = obj.metadata
+    # The real models keep these as plain dicts
+    metadata.annotations = manifest["metadata"].get("annotations")
+    metadata.labels = manifest["metadata"].get("labels")
+    metadata.resource_version = manifest["metadata"].get("resourceVersion")
+    if not hasattr(obj.spec, "suspend"):
+        obj.spec.suspend = None
+    return obj
+
+
+class FakeBatchV1Api:
+    def __init__(self, latency_ms=LATENCY_MS):
+        self.latency_ms = latency_ms
+        self.cronjobs = {}
+        self.calls = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._watchers = []
+
+    def _call(self, verb):
+        with self._lock:
+            self.calls[verb] = self.calls.get(verb, 0) + 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _store(self, name, manifest):
+        self._version += 1
+        manifest.setdefault("metadata", {})["name"] = name
+        manifest["metadata"]["resourceVersion"] = str(self._version)
+        event_type = "MODIFIED" if name in self.cronjobs else "ADDED"
+        self.cronjobs[name] = manifest
+        self._publish(event_type, manifest)
+
+    def _publish(self, event_type, manifest):
+        for events in self._watchers:
+            events.put((event_type, copy.deepcopy(manifest)))
+
+    def subscribe(self):
+        events = queue.Queue()
+        with self._lock:
+            self._watchers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self._lock:
+            if events in self._watchers:
+                self._watchers.remove(events)
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def list_namespaced_cron_job(self, namespace, label_selector=None, **kwargs):
+        self._call("list")
+        with self._lock:
+            items = [as_object(m) for m in self.cronjobs.values() if _matches(m, label_selector)]
+            version = str(self._version)
+        return SimpleNamespace(items=items, metadata=SimpleNamespace(resource_version=version))
+
+    def read_namespaced_cron_job(self, name, namespace, **kwargs):
+        self._call("get")
+        with self._lock:
+            if name not in self.cronjobs:
+                raise FakeApiException(404, "Not Found")
+            return as_object(self.cronjobs[name])
+
+    def create_namespaced_cron_job(self, namespace, body, **kwargs):
+        self._call("create")
+        manifest = _to_dict(body)
+        name = manifest["metadata"]["name"]
+        with self._lock:
+            if name in self.cronjobs:
+                raise FakeApiException(409, "AlreadyExists")
+            self._store(name, manifest)
+        return as_object(manifest)
+
+    def replace_namespaced_cron_job(self, name, namespace, body, **kwargs):
+        self._call("replace")
+        with self._lock:
+            if name not in self.cronjobs:
+                raise FakeApiException(404, "Not Found")
+            manifest = _to_dict(body)
+            self._store(name, manifest)
+        return as_object(manifest)
+
+    def patch_namespaced_cron_job(self, name, namespace, body, **kwargs):
+        # Merge patches and server-side apply both end up as a deep merge here
+        self._call("apply" if kwargs.get("_content_type") == "application/apply-patch+yaml" else "patch")
+        with self._lock:
+            if name not in self.cronjobs and kwargs.get("_content_type") != "application/apply-patch+yaml":
+                raise FakeApiException(404, "Not Found")
+            manifest = _merge(copy.deepcopy(self.cronjobs.get(name, {})), _to_dict(body))
+            self._store(name, manifest)
+        return as_object(manifest)
+
+    def delete_namespaced_cron_job(self, name, namespace, **kwargs):
+        self._call("delete")
+        with self._lock:
+            manifest = self.cronjobs.pop(name, None)
+            if manifest is None:
+                raise FakeApiException(404, "Not Found")
+            self._version += 1
+            self._publish("DELETED", manifest)
+
+
+class FakeWatch:
+    # Stand-in for kubernetes.watch.Watch, streams the events of a FakeBatchV1Api
+    def __init__(self, api):
+        self.api = api
+        self._stopped = False
+
+    def stream(self, func, namespace=None, label_selector=None, resource_version=None, timeout_seconds=None, **kwargs):
+        events = self.api.subscribe()
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+        try:
+            while not self._stopped:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                try:
+                    event_type, manifest = events.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if _matches(manifest, label_selector):
+                    yield {"type": event_type, "object": as_object(manifest)}
+        finally:
+            self.api.unsubscribe(events)
+
+    def stop(self):
+        self._stopped = True
+
+
+def _matches(manifest, label_selector):
+    if not label_selector:
+        return True
+    labels = manifest.get("metadata", {}).get("labels") or {}
+    for term in label_selector.split(","):
+        key, _, value = term.partition("=")
+        if labels.get(key.strip()) != value.strip():
+            return False
+    return True
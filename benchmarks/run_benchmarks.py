@@ -0,0 +1,408 @@
+# Benchmarks the runner, registration, sync and /metrics paths against fake_ibm_db and fake_k8s.
+#
+# > python benchmarks/run_benchmarks.py --rows 100000 --jobs 200 --out bench.json
+# > python benchmarks/run_benchmarks.py --rows 100000 --jobs 200 --baseline bench.json
+#
+# Each suite runs in its own interpreter so peak RSS is per suite.
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+RESULT_MARKER = "BENCH_RESULT "
+SUITES = ["export-csv", "export-parquet", "register", "sync", "reconcile", "scrape"]
+
+EXPORT_QUERY = """
+SELECT t.transaction_id, t.customer_id, t.amount, t.transaction_date, t.category
+FROM public.customer_transactions t
+"""
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_stats(prefix, values):
+    return {
+        f"{prefix}_p50_s": percentile(values, 50),
+        f"{prefix}_p95_s": percentile(values, 95),
+        f"{prefix}_p99_s": percentile(values, 99),
+        f"{prefix}_max_s": max(values) if values else None,
+    }
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_job_yaml(path, job_name, query, output, **extra):
+    import yaml
+    data = {"job_name": job_name, "type": "db2-select", "query": query, "output": output,
+            "schedule": "0 6 * * *", "notify": False, **extra}
+    with open(path, "w") as f:
+        yaml.safe_dump(data, f)
+
+
+# --- suites (run inside the child interpreter) ---
+
+def setup_fakes(workdir, suite):
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, PROJECT_ROOT)
+    import fake_ibm_db
+    sys.modules["ibm_db"] = fake_ibm_db
+
+    db_path = os.path.join(workdir, f"db-{suite}")
+    os.environ["FAKE_DB2_PATH"] = db_path
+    os.environ["CONN_STR"] = f"SQLITE={db_path}"
+    import seed
+    return fake_ibm_db, seed, seed.create_database(db_path)
+
+
+def suite_export(args, workdir, fmt):
+    fake_db, seed, db = setup_fakes(workdir, f"export-{fmt}")
+    seed.seed_public(db, args.rows)
+    db.close()
+
+    from scripts.jobfile_class import JobFile
+    from scripts.db_pool import connect_count
+
+    out_dir = os.path.join(workdir, f"exports-{fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    yaml_path = os.path.join(workdir, f"export-{fmt}.yaml")
+    write_job_yaml(yaml_path, f"bench-export-{fmt}", EXPORT_QUERY, f"bench.{fmt}", batch_size=args.batch_size)
+
+    job = JobFile(yaml_path)
+    timings, trips = [], []
+    for _ in range(args.repeat):
+        fake_db.reset_counters()
+        started = time.perf_counter()
+        job.run(output_dir=out_dir)
+        timings.append(time.perf_counter() - started)
+        trips.append(fake_db.ROUND_TRIPS)
+        if job.status != "SUCCESS":
+            raise RuntimeError(f"export run failed with status {job.status}")
+
+    median = percentile(timings, 50)
+    return {
+        "rows": job.rows_exported,
+        "bytes_written": job.bytes_written,
+        "rows_per_sec": job.rows_exported / median if median else None,
+        **latency_stats("run", timings),
+        "db_round_trips_per_run": percentile(trips, 50),
+        "db_connects_total": connect_count(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def suite_register(args, workdir):
+    fake_db, seed, db = setup_fakes(workdir, "register")
+    db.close()
+
+    from scripts.registration import register_jobs
+    from scripts.db_pool import connect_count
+
+    jobs_dir = os.path.join(workdir, "register-jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+    paths = []
+    for i in range(args.jobs):
+        path = os.path.join(jobs_dir, f"job-{i}.yaml")
+        write_job_yaml(path, f"job-{i}", EXPORT_QUERY, f"job-{i}.csv")
+        paths.append(path)
+
+    fake_db.reset_counters()
+    started = time.perf_counter()
+    results = register_jobs(paths)
+    total = time.perf_counter() - started
+    registered = sum(1 for r in results if r["status"] == "registered")
+    if registered != args.jobs:
+        raise RuntimeError(f"only {registered}/{args.jobs} jobs registered")
+
+    fake_db.reset_counters()
+    started = time.perf_counter()
+    register_jobs(paths)
+    rerun = time.perf_counter() - started
+
+    return {
+        "jobs": args.jobs,
+        "total_s": total,
+        "jobs_per_sec": args.jobs / total if total else None,
+        "already_registered_s": rerun,
+        "db_round_trips": fake_db.ROUND_TRIPS,
+        "db_connects_total": connect_count(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def suite_sync(args, workdir):
+    fake_db, seed, db = setup_fakes(workdir, "sync")
+    now = datetime.datetime.now()
+    db.executemany("INSERT INTO job_mgmt.jobs (job_name, schedule, is_active, created_at) VALUES (?, ?, ?, ?)",
+                   [(f"job-{i}", "0 6 * * *", True, now) for i in range(args.jobs)])
+    db.commit()
+    db.close()
+
+    import fake_k8s
+    from scripts import sync_jobfiles
+
+    jobs_dir = os.path.join(workdir, "sync-jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+    for i in range(args.jobs):
+        write_job_yaml(os.path.join(jobs_dir, f"job-{i}.yaml"), f"job-{i}", EXPORT_QUERY, f"job-{i}.csv")
+
+    api = fake_k8s.FakeBatchV1Api()
+    sync_jobfiles.batch_v1 = api
+    sync_jobfiles.JOBS_DIR = jobs_dir
+
+    passes = []
+    for _ in range(max(2, args.repeat)):
+        fake_db.reset_counters()
+        calls_before = api.total_calls()
+        started = time.perf_counter()
+        sync_jobfiles.sync_all()
+        passes.append({
+            "seconds": time.perf_counter() - started,
+            "db_round_trips": fake_db.ROUND_TRIPS,
+            "k8s_calls": api.total_calls() - calls_before,
+        })
+
+    steady = passes[1:]
+    return {
+        "jobs": args.jobs,
+        "cold_pass_s": passes[0]["seconds"],
+        "cold_k8s_calls": passes[0]["k8s_calls"],
+        "cold_db_round_trips": passes[0]["db_round_trips"],
+        **latency_stats("steady_pass", [p["seconds"] for p in steady]),
+        "steady_k8s_calls_per_pass": percentile([p["k8s_calls"] for p in steady], 50),
+        "steady_db_round_trips_per_pass": percentile([p["db_round_trips"] for p in steady], 50),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def wait_for(predicate, timeout=30.0):
+    started = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("condition not reached")
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+
+def suite_reconcile(args, workdir):
+    os.environ.setdefault("RECONCILER_FS_POLL", "0.1")
+    os.environ.setdefault("RECONCILER_DB_POLL", "0.2")
+    os.environ.setdefault("RECONCILE_MIN_INTERVAL", "0")
+    fake_db, seed, db = setup_fakes(workdir, "reconcile")
+    db.close()
+
+    import fake_k8s
+    from scripts.reconciler import Reconciler
+
+    jobs_dir = os.path.join(workdir, "reconcile-jobs")
+    os.makedirs(jobs_dir, exist_ok=True)
+    for i in range(args.jobs):
+        write_job_yaml(os.path.join(jobs_dir, f"job-{i}.yaml"), f"job-{i}", EXPORT_QUERY, f"job-{i}.csv")
+
+    api = fake_k8s.FakeBatchV1Api()
+    reconciler = Reconciler(jobs_dir=jobs_dir, api=api, watch_factory=lambda: fake_k8s.FakeWatch(api))
+    started = time.perf_counter()
+    reconciler.start()
+    cold = time.perf_counter() - started
+    reconciler.wait_idle()
+
+    edited = [f"job-{i}" for i in range(min(10, args.jobs))]
+    for name in edited:
+        write_job_yaml(os.path.join(jobs_dir, f"{name}.yaml"), name, EXPORT_QUERY, f"{name}.csv", schedule="15 3 * * *")
+    yaml_change = wait_for(lambda: all(api.cronjobs[n]["spec"]["schedule"] == "15 3 * * *" for n in edited))
+
+    api.delete_namespaced_cron_job(name="job-0", namespace="default")
+    drift = wait_for(lambda: "job-0" in api.cronjobs)
+
+    os.remove(os.path.join(jobs_dir, "job-1.yaml"))
+    removal = wait_for(lambda: api.cronjobs["job-1"]["spec"]["suspend"] is True)
+
+    reconciler.wait_idle()
+    fake_db.reset_counters()
+    calls_before = api.total_calls()
+    time.sleep(2)
+    idle_k8s = api.total_calls() - calls_before
+    idle_trips = fake_db.ROUND_TRIPS
+    reconciler.stop()
+
+    return {
+        "jobs": args.jobs,
+        "startup_sync_s": cold,
+        "yaml_change_converge_s": yaml_change,
+        "cronjob_drift_converge_s": drift,
+        "yaml_removal_converge_s": removal,
+        "idle_k8s_calls_per_2s": idle_k8s,
+        "idle_db_round_trips_per_2s": idle_trips,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def suite_scrape(args, workdir):
+    fake_db, seed, db = setup_fakes(workdir, "scrape")
+    job_ids = seed.seed_run_history(db, args.jobs, args.runs_per_job)
+
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "prometheus", "exporter"))
+    import metrics_exporter
+
+    aggregator = metrics_exporter.RunAggregator(os.environ["CONN_STR"])
+    fake_db.reset_counters()
+    started = time.perf_counter()
+    aggregator.poll()
+    cold = time.perf_counter() - started
+    cold_trips = fake_db.ROUND_TRIPS
+
+    polls, scrapes, trips = [], [], []
+    now = datetime.datetime.now()
+    for i in range(args.scrapes):
+        # A handful of runs finish between two polls
+        db.executemany(
+            "INSERT INTO job_mgmt.job_runs (job_id, started_at, ended_at, status) VALUES (?, ?, ?, ?)",
+            [(job_ids[(i + k) % len(job_ids)], now, now + datetime.timedelta(seconds=30), "SUCCESS") for k in range(5)]
+        )
+        db.commit()
+        fake_db.reset_counters()
+        t0 = time.perf_counter()
+        aggregator.poll()
+        polls.append(time.perf_counter() - t0)
+        trips.append(fake_db.ROUND_TRIPS)
+
+        t0 = time.perf_counter()
+        metrics_exporter.get_metrics()
+        scrapes.append(time.perf_counter() - t0)
+
+    return {
+        "history_runs": args.jobs * args.runs_per_job,
+        "cold_poll_s": cold,
+        "cold_poll_db_round_trips": cold_trips,
+        **latency_stats("poll", polls),
+        **latency_stats("scrape", scrapes),
+        "db_round_trips_per_poll": percentile(trips, 50),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_suite(name, args, workdir):
+    if name.startswith("export-"):
+        return suite_export(args, workdir, name.removeprefix("export-"))
+    suites = {"register": suite_register, "sync": suite_sync, "reconcile": suite_reconcile, "scrape": suite_scrape}
+    return suites[name](args, workdir)
+
+
+# --- orchestration (parent interpreter) ---
+
+def spawn_suite(name, args, workdir):
+    cmd = [sys.executable, __file__, "--run-suite", name, "--workdir", workdir,
+           "--rows", str(args.rows), "--jobs", str(args.jobs), "--repeat", str(args.repeat),
+           "--batch-size", str(args.batch_size), "--scrapes", str(args.scrapes),
+           "--runs-per-job", str(args.runs_per_job)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=PROJECT_ROOT)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {"error": (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ["no output"]}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# Echoes of the parameters, not something to compare
+INFO_METRICS = {"rows", "jobs", "history_runs", "bytes_written"}
+
+
+def lower_is_better(metric):
+    return not metric.endswith("_per_sec")
+
+
+def compare(results, baseline, threshold, min_seconds):
+    regressions = []
+    print(f"\n{'SUITE / METRIC':<50} {'BASELINE':>14} {'CURRENT':>14} {'CHANGE':>9}")
+    for suite, metrics in results.items():
+        old_metrics = baseline.get("results", {}).get(suite, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if metric in INFO_METRICS or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = change > threshold if lower_is_better(metric) else change < -threshold
+            if metric.endswith("_s") and max(value, old) < min_seconds:
+                worse = False  # below timer noise
+            flag = " ❌" if worse else ""
+            print(f"{suite + ' / ' + metric:<50} {old:>14.4g} {value:>14.4g} {change:>+8.1%}{flag}")
+            if worse:
+                regressions.append(f"{suite}/{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {SUITES}")
+    parser.add_argument("--rows", type=lambda v: int(float(v)), default=100_000, help="Synthetic customer_transactions rows (1e3 .. 1e8)")
+    parser.add_argument("--jobs", type=int, default=100, help="Job YAMLs for register/sync, jobs with history for scrape")
+    parser.add_argument("--runs-per-job", type=int, default=100, help="job_runs history per job for the scrape suite")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scrapes", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare against an earlier results JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="Timings below this are never flagged")
+    parser.add_argument("--run-suite", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_suite:
+        real_stdout = sys.stdout
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run_suite(args.run_suite, args, args.workdir)
+        real_stdout.write(RESULT_MARKER + json.dumps(result) + "\n")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="orchestration-bench-")
+    results = {}
+    for suite in args.suites.split(","):
+        print(f"⏱️ Running {suite}...")
+        results[suite] = spawn_suite(suite, args, workdir)
+        print(json.dumps(results[suite], indent=2))
+
+    payload = {
+        "revision": git_revision(),
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("run_suite", "workdir", "out", "baseline")},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"💾 Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n❌ Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
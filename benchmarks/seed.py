@@ -0,0 +1,118 @@
+# Builds a SQLite database usable by fake_ibm_db: job_mgmt from infra/init_job_mgmt.sql, synthetic public data.
+import datetime
+import os
+import random
+import re
+import shutil
+import sqlite3
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+JOB_MGMT_SQL = os.path.join(PROJECT_ROOT, "infra", "init_job_mgmt.sql")
+CHUNK = 100_000
+
+PUBLIC_DDL = """
+CREATE TABLE public.users (
+  id          INTEGER PRIMARY KEY,
+  email       VARCHAR(255) NOT NULL,
+  created_at  TIMESTAMP NOT NULL,
+  last_login  TIMESTAMP NOT NULL,
+  is_active   SMALLINT
+);
+CREATE TABLE public.customer_transactions (
+  transaction_id   INTEGER PRIMARY KEY,
+  customer_id      INTEGER NOT NULL,
+  amount           DECIMAL(12,2) NOT NULL,
+  transaction_date DATE NOT NULL,
+  category         VARCHAR(50)
+);
+"""
+
+# DB2 DDL -> SQLite DDL, just enough for init_job_mgmt.sql
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_ROW_CHANGE = re.compile(r"CREATE\s+TABLE\s+job_mgmt\.(\w+)\s*\(.*?(\w+)\s+TIMESTAMP\s+NOT\s+NULL\s+GENERATED\s+ALWAYS\s+"
+                         r"FOR\s+EACH\s+ROW\s+ON\s+UPDATE\s+AS\s+ROW\s+CHANGE\s+TIMESTAMP", re.I | re.S)
+_DDL_REWRITES = [
+    (re.compile(r"--[^\n]*"), ""),
+    (re.compile(r"INTEGER\s+GENERATED\s+(ALWAYS|BY\s+DEFAULT)\s+AS\s+IDENTITY\s+PRIMARY\s+KEY", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"REFERENCES\s+job_mgmt\.", re.I), "REFERENCES "),
+    # Emulated with an update trigger below
+    (re.compile(r"NOT\s+NULL\s+GENERATED\s+ALWAYS\s+FOR\s+EACH\s+ROW\s+ON\s+UPDATE\s+AS\s+ROW\s+CHANGE\s+TIMESTAMP", re.I),
+     f"DEFAULT ({_NOW})"),
+    (re.compile(r"(CREATE\s+(?:UNIQUE\s+)?INDEX\s+job_mgmt\.\w+\s+ON\s+)job_mgmt\.", re.I), r"\1job_mgmt_table_placeholder."),
+]
+
+
+def translate_ddl(statement):
+    for pattern, repl in _DDL_REWRITES:
+        statement = pattern.sub(repl, statement)
+    # SQLite wants the index's table unqualified (it lives in the index's schema)
+    statement = statement.replace("job_mgmt_table_placeholder.", "")
+    return statement.strip()
+
+
+def create_database(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    db = sqlite3.connect(os.path.join(path, "main.db"))
+    for schema in ("job_mgmt", "public"):
+        db.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(path, f"{schema}.db"),))
+
+    with open(JOB_MGMT_SQL) as f:
+        statements = f.read().split(";")
+    for statement in statements:
+        statement = translate_ddl(statement)
+        if not statement or statement.upper().startswith("CREATE SCHEMA"):
+            continue
+        try:
+            db.execute(statement)
+        except sqlite3.Error as e:
+            print(f"⚠️ Skipped DDL the SQLite stand-in can't run ({e}): {statement.splitlines()[0]}")
+    for table, column in (m.groups() for m in map(_ROW_CHANGE.search, statements) if m):
+        # ROW CHANGE TIMESTAMP: bumped on every update (recursive triggers are off, so this one doesn't refire)
+        db.execute(f"CREATE TRIGGER job_mgmt.{table}_{column}_row_change AFTER UPDATE ON {table} FOR EACH ROW "
+                   f"BEGIN UPDATE {table} SET {column} = {_NOW} WHERE rowid = NEW.rowid; END")
+
+    db.executescript(PUBLIC_DDL)
+    return db
+
+
+def seed_public(db, transactions, users=None, seed=42):
+    rng = random.Random(seed)
+    users = users or max(5, transactions // 10)
+    now = datetime.datetime.now().replace(microsecond=0)
+
+    for start in range(1, users + 1, CHUNK):
+        db.executemany("INSERT INTO public.users VALUES (?, ?, ?, ?, ?)", [
+            (i, f"user{i}@example.com", now - datetime.timedelta(days=rng.randint(30, 400)),
+             now - datetime.timedelta(days=rng.randint(0, 30)), 1)
+            for i in range(start, min(start + CHUNK, users + 1))
+        ])
+    for start in range(1, transactions + 1, CHUNK):
+        db.executemany("INSERT INTO public.customer_transactions VALUES (?, ?, ?, ?, ?)", [
+            (i, rng.randint(1, users), round(rng.random() * 1000, 2),
+             (now - datetime.timedelta(days=rng.randint(0, 3))).date(),
+             "withdrawal" if rng.random() < 0.5 else "deposit")
+            for i in range(start, min(start + CHUNK, transactions + 1))
+        ])
+    db.commit()
+
+
+def seed_run_history(db, jobs, runs_per_job, seed=42):
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    db.executemany("INSERT INTO job_mgmt.jobs (job_name, schedule, is_active, created_at) VALUES (?, ?, ?, ?)",
+                   [(f"history-job-{j}", "0 6 * * *", True, now) for j in range(jobs)])
+    job_ids = [row[0] for row in db.execute("SELECT job_id FROM job_mgmt.jobs WHERE job_name LIKE 'history-job-%'")]
+    rows = []
+    for job_id in job_ids:
+        for r in range(runs_per_job):
+            started = now - datetime.timedelta(hours=r + 1)
+            duration = datetime.timedelta(seconds=rng.expovariate(1 / 60))
+            status = "SUCCESS" if rng.random() < 0.9 else "FAILURE"
+            rows.append((job_id, started, started + duration, status, rng.randint(0, 10**6), rng.randint(0, 10**8)))
+    db.executemany(
+        "INSERT INTO job_mgmt.job_runs (job_id, started_at, ended_at, status, rows_exported, bytes_written) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    db.commit()
+    return job_ids
@@ -83,9 +83,27 @@ foreach ($selectedJob in $selectedJobs) {
         continue
     }
 
+    # Checksums of every file a manifest vouches for (files written before manifests existed have none)
+    $expected = @{}
+    Get-ChildItem "$nested\*.manifest.json" -File | ForEach-Object {
+        $manifest = Get-Content $_.FullName -Raw | ConvertFrom-Json
+        foreach ($file in $manifest.files) { $expected[$file.name] = $file.sha256 }
+    }
+
     # Move to final destination with filename prefix
-    Get-ChildItem "$nested\*" -File | ForEach-Object {
+    Get-ChildItem "$nested\*" -File | Where-Object { $_.Name -notmatch '\.tmp-' } | ForEach-Object {
         $finalPath = Join-Path $localExportPath "$selectedJob-$($_.Name)"
+        if ($expected.ContainsKey($_.Name)) {
+            $hash = (Get-FileHash $_.FullName -Algorithm SHA256).Hash
+            if ($hash -ne $expected[$_.Name]) {
+                Write-Warning "⚠️ Skipped $($_.Name): checksum doesn't match its manifest (incomplete copy?)"
+                return
+            }
+            if ((Test-Path $finalPath) -and (Get-FileHash $finalPath -Algorithm SHA256).Hash -eq $hash) {
+                Write-Host "⏭️ Unchanged: $finalPath"
+                return
+            }
+        }
         Copy-Item $_.FullName $finalPath -Force
         Write-Host "✅ Copied: $finalPath"
     }
@@ -0,0 +1,24 @@
+import argparse
+import os
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from scripts.parallel_executor import run_jobs, EXECUTOR_WORKERS
+from scripts.shared_scan import SHARED_SCAN_WINDOW
+
+parser = argparse.ArgumentParser(description="Run many job YAMLs concurrently in one process")
+parser.add_argument("yaml_paths", nargs="+")
+parser.add_argument("--workers", type=int, default=EXECUTOR_WORKERS, help="Jobs running at the same time")
+parser.add_argument("--db-connections", type=int, default=None, help="Global DB2 connection limit (default: workers + 1)")
+parser.add_argument("--output-dir", default="/app/data/exports")
+parser.add_argument("--shared-scan", action="store_true",
+                    help="Read each table once for all `scan` jobs due in the same window")
+parser.add_argument("--scan-window", type=int, default=SHARED_SCAN_WINDOW,
+                    help="Minutes between schedule fires that still count as the same window")
+args = parser.parse_args()
+
+results = run_jobs(args.yaml_paths, args.workers, args.db_connections, args.output_dir,
+                   shared_scan=args.shared_scan, scan_window=args.scan_window)
+sys.exit(0 if all(r["status"] == "SUCCESS" for r in results) else 1)
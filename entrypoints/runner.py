@@ -1,11 +1,59 @@
 import sys
 import os
+import time
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
+# Usage: python runner.py <job.yaml> [--profile-startup]
+PROFILE_TOP = 15
+
+
+def profile_startup(argv):
+    # Runs the job again under -X importtime and summarizes where the startup went
+    import subprocess
+    env = dict(os.environ, RUNNER_SPAWNED_AT=repr(time.time()))
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), *argv],
+                          env=env, stderr=subprocess.PIPE, text=True)
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            print(line, file=sys.stderr)
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # the header line
+        name = parts[2].rstrip()
+        # Only top-level imports, nested ones are already in their parent's cumulative time
+        if not name.startswith("  "):
+            imports.append((int(parts[1]), name.strip()))
+
+    total_us = sum(us for us, _ in imports)
+    print(f"\n⏱️ Import time: {total_us / 1000:.0f} ms over {len(imports)} top-level modules")
+    for us, name in sorted(imports, reverse=True)[:PROFILE_TOP]:
+        print(f"   {us / 1000:8.1f} ms  {name}")
+    sys.exit(proc.returncode)
+
+
+if "--profile-startup" in sys.argv:
+    profile_startup([arg for arg in sys.argv[1:] if arg != "--profile-startup"])
+
 from scripts.jobfile_class import JobFile
+from scripts.db_pool import connect_count, first_query_at
+from scripts.parallel_executor import dependency_closure, run_jobs
 
 yaml_path = sys.argv[1]
-job = JobFile(yaml_path)
-job.run()
+paths = dependency_closure(yaml_path)
+if len(paths) > 1:
+    # A job with depends_on runs its upstream jobs first, in this same process, so their results are handed over in memory
+    print(f"🔗 {os.path.basename(yaml_path)} depends on {len(paths) - 1} other job(s), running them first")
+    run_jobs(paths)
+else:
+    job = JobFile(yaml_path)
+    job.run()
+print(f"🔌 DB connects this run: {connect_count()}")
+
+spawned_at = os.getenv("RUNNER_SPAWNED_AT")
+if spawned_at and first_query_at():
+    print(f"⏱️ First DB query {(first_query_at() - float(spawned_at)) * 1000:.0f} ms after process start")
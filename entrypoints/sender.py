@@ -1,20 +1,20 @@
 import os
 import sys
-from pathlib import Path
 
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
 
-from scripts.jobfile_class import JobFile
+from scripts.registration import register_jobs, print_results
 
 
-file = Path(sys.argv[1])
-if file.exists():
-    print(f"Registering job: {file.name}")
-    job = JobFile(str(file))
-    print(f"✅ Registered {job.job_name}\n")
-else:
-    print(f"❌ File not found: {file}")
-sys.exit(0)
\ No newline at end of file
+# Usage: python sender.py jobs/a.yaml [jobs/b.yaml ...]
+if len(sys.argv) < 2:
+    print("❌ Usage: sender.py <job.yaml> [<job.yaml> ...]")
+    sys.exit(1)
+
+print(f"📬 Registering {len(sys.argv) - 1} job file(s)")
+results = register_jobs(sys.argv[1:])
+print_results(results)
+sys.exit(1 if any(r["status"] in ("invalid", "failed") for r in results) else 0)
@@ -4,10 +4,14 @@ CREATE SCHEMA job_mgmt;
 -- Create JOBS table
 CREATE TABLE job_mgmt.JOBS (
     JOB_ID      INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-    JOB_NAME    VARCHAR(255),
+    JOB_NAME    VARCHAR(255) NOT NULL,
     SCHEDULE    VARCHAR(255),
     IS_ACTIVE   BOOLEAN,
-    CREATED_AT  TIMESTAMP
+    CREATED_AT  TIMESTAMP,
+    CONTENT_HASH VARCHAR(64),
+    SCHEDULE_OFFSET SMALLINT DEFAULT 0,
+    -- Set by DB2 on every insert/update, also by hand edits (reconciler change detection)
+    UPDATED_AT  TIMESTAMP NOT NULL GENERATED ALWAYS FOR EACH ROW ON UPDATE AS ROW CHANGE TIMESTAMP
 );
 
 -- Create JOB_RUNS table
@@ -17,6 +21,10 @@ CREATE TABLE job_mgmt.JOB_RUNS (
     STARTED_AT  TIMESTAMP,
     ENDED_AT    TIMESTAMP,
     STATUS      VARCHAR(50),
+    CACHE_HIT   SMALLINT DEFAULT 0,
+    ROWS_EXPORTED BIGINT,
+    BYTES_WRITTEN BIGINT,
+    QUEUE_SECONDS DOUBLE,
     FOREIGN KEY (JOB_ID) REFERENCES job_mgmt.JOBS(JOB_ID)
 );
 
@@ -27,4 +35,84 @@ CREATE TABLE job_mgmt.JOB_LOGS (
     LOG_TIME    TIMESTAMP,
     MESSAGE     VARCHAR(1000),
     FOREIGN KEY (RUN_ID) REFERENCES job_mgmt.JOB_RUNS(RUN_ID)
-);
\ No newline at end of file
+);
+
+-- Create JOB_WATERMARKS table (high-water mark of incremental jobs)
+CREATE TABLE job_mgmt.JOB_WATERMARKS (
+    JOB_ID      INTEGER NOT NULL PRIMARY KEY,
+    COLUMN_NAME VARCHAR(128) NOT NULL,
+    HIGH_WATER  VARCHAR(255),
+    RUN_ID      INTEGER,
+    UPDATED_AT  TIMESTAMP,
+    FOREIGN KEY (JOB_ID) REFERENCES job_mgmt.JOBS(JOB_ID)
+);
+
+-- Create JOB_RUN_ATTEMPTS table (one row per attempt of a run with retries)
+CREATE TABLE job_mgmt.JOB_RUN_ATTEMPTS (
+    RUN_ID        INTEGER NOT NULL,
+    ATTEMPT       INTEGER NOT NULL,
+    STARTED_AT    TIMESTAMP,
+    ENDED_AT      TIMESTAMP,
+    STATUS        VARCHAR(50),
+    ROWS_EXPORTED BIGINT,
+    ERROR         VARCHAR(1000),
+    PRIMARY KEY (RUN_ID, ATTEMPT),
+    FOREIGN KEY (RUN_ID) REFERENCES job_mgmt.JOB_RUNS(RUN_ID)
+);
+
+-- Create JOB_CHECKPOINTS table (committed partitions/segments a retried run can resume from)
+CREATE TABLE job_mgmt.JOB_CHECKPOINTS (
+    RUN_ID      INTEGER NOT NULL,
+    PART        INTEGER NOT NULL,
+    SPEC_HASH   VARCHAR(64) NOT NULL,
+    ROWS_DONE   BIGINT,
+    BYTES_DONE  BIGINT,
+    LAST_KEY    VARCHAR(255),
+    UPDATED_AT  TIMESTAMP,
+    PRIMARY KEY (RUN_ID, PART),
+    FOREIGN KEY (RUN_ID) REFERENCES job_mgmt.JOB_RUNS(RUN_ID)
+);
+
+-- Create RUN_LEASES table (one row per slot of the global run concurrency budget)
+CREATE TABLE job_mgmt.RUN_LEASES (
+    SLOT        INTEGER NOT NULL PRIMARY KEY,
+    HOLDER      VARCHAR(255),
+    RUN_ID      INTEGER,
+    JOB_NAME    VARCHAR(255),
+    ACQUIRED_AT TIMESTAMP,
+    EXPIRES_AT  TIMESTAMP
+);
+
+-- Create JOB_RUN_DAILY table (per-job, per-day stats of runs pruned from JOB_RUNS by scripts/maintenance.py)
+-- *_HIST columns hold histogram counts as "upper_bound=count ..." (bound "inf" for the overflow bucket)
+CREATE TABLE job_mgmt.JOB_RUN_DAILY (
+    JOB_ID          INTEGER NOT NULL,
+    RUN_DATE        DATE NOT NULL,
+    RUNS            INTEGER DEFAULT 0,
+    SUCCESSES       INTEGER DEFAULT 0,
+    FAILURES        INTEGER DEFAULT 0,
+    CACHE_HITS      INTEGER DEFAULT 0,
+    DURATION_COUNT  INTEGER DEFAULT 0,
+    DURATION_SUM    DOUBLE DEFAULT 0,
+    SUCCESS_SECONDS DOUBLE DEFAULT 0,
+    ROWS_EXPORTED   BIGINT DEFAULT 0,
+    BYTES_WRITTEN   BIGINT DEFAULT 0,
+    QUEUE_SECONDS   DOUBLE DEFAULT 0,
+    DURATION_MIN    DOUBLE,
+    DURATION_MAX    DOUBLE,
+    LAST_ENDED_AT   TIMESTAMP,
+    LAST_STATUS     VARCHAR(50),
+    DURATION_HIST   VARCHAR(1000),
+    ROWS_HIST       VARCHAR(1000),
+    BYTES_HIST      VARCHAR(1000),
+    QUEUE_HIST      VARCHAR(1000),
+    PRIMARY KEY (JOB_ID, RUN_DATE),
+    FOREIGN KEY (JOB_ID) REFERENCES job_mgmt.JOBS(JOB_ID)
+);
+
+-- Indexes
+CREATE UNIQUE INDEX job_mgmt.JOBS_NAME_UX ON job_mgmt.JOBS (JOB_NAME);
+CREATE INDEX job_mgmt.JOB_RUNS_JOB_IX ON job_mgmt.JOB_RUNS (JOB_ID, RUN_ID);
+CREATE INDEX job_mgmt.JOB_RUNS_STARTED_IX ON job_mgmt.JOB_RUNS (STARTED_AT);
+CREATE INDEX job_mgmt.JOB_LOGS_RUN_IX ON job_mgmt.JOB_LOGS (RUN_ID);
+CREATE INDEX job_mgmt.JOB_RUN_DAILY_DATE_IX ON job_mgmt.JOB_RUN_DAILY (RUN_DATE);
@@ -0,0 +1,103 @@
+-- Schema changes for databases created with an older init_job_mgmt.sql.
+-- init_job_mgmt.sql already contains all of this for fresh databases.
+-- Run the sections you're missing, in order.
+
+-- Incremental jobs
+CREATE TABLE job_mgmt.JOB_WATERMARKS (
+    JOB_ID      INTEGER NOT NULL PRIMARY KEY,
+    COLUMN_NAME VARCHAR(128) NOT NULL,
+    HIGH_WATER  VARCHAR(255),
+    RUN_ID      INTEGER,
+    UPDATED_AT  TIMESTAMP,
+    FOREIGN KEY (JOB_ID) REFERENCES job_mgmt.JOBS(JOB_ID)
+);
+
+-- Result cache
+ALTER TABLE job_mgmt.JOB_RUNS ADD COLUMN CACHE_HIT SMALLINT DEFAULT 0;
+
+-- Rows / bytes per run (histograms)
+ALTER TABLE job_mgmt.JOB_RUNS ADD COLUMN ROWS_EXPORTED BIGINT;
+ALTER TABLE job_mgmt.JOB_RUNS ADD COLUMN BYTES_WRITTEN BIGINT;
+
+-- Content hash of the job YAML (sync change detection)
+ALTER TABLE job_mgmt.JOBS ADD COLUMN CONTENT_HASH VARCHAR(64);
+
+-- Run retries and checkpointed resume
+CREATE TABLE job_mgmt.JOB_RUN_ATTEMPTS (
+    RUN_ID        INTEGER NOT NULL,
+    ATTEMPT       INTEGER NOT NULL,
+    STARTED_AT    TIMESTAMP,
+    ENDED_AT      TIMESTAMP,
+    STATUS        VARCHAR(50),
+    ROWS_EXPORTED BIGINT,
+    ERROR         VARCHAR(1000),
+    PRIMARY KEY (RUN_ID, ATTEMPT),
+    FOREIGN KEY (RUN_ID) REFERENCES job_mgmt.JOB_RUNS(RUN_ID)
+);
+
+CREATE TABLE job_mgmt.JOB_CHECKPOINTS (
+    RUN_ID      INTEGER NOT NULL,
+    PART        INTEGER NOT NULL,
+    SPEC_HASH   VARCHAR(64) NOT NULL,
+    ROWS_DONE   BIGINT,
+    BYTES_DONE  BIGINT,
+    LAST_KEY    VARCHAR(255),
+    UPDATED_AT  TIMESTAMP,
+    PRIMARY KEY (RUN_ID, PART),
+    FOREIGN KEY (RUN_ID) REFERENCES job_mgmt.JOB_RUNS(RUN_ID)
+);
+
+-- Schedule smoothing and admission control
+ALTER TABLE job_mgmt.JOBS ADD COLUMN SCHEDULE_OFFSET SMALLINT DEFAULT 0;
+ALTER TABLE job_mgmt.JOB_RUNS ADD COLUMN QUEUE_SECONDS DOUBLE;
+
+CREATE TABLE job_mgmt.RUN_LEASES (
+    SLOT        INTEGER NOT NULL PRIMARY KEY,
+    HOLDER      VARCHAR(255),
+    RUN_ID      INTEGER,
+    JOB_NAME    VARCHAR(255),
+    ACQUIRED_AT TIMESTAMP,
+    EXPIRES_AT  TIMESTAMP
+);
+
+-- Run history retention (rollups and indexes)
+-- The unique index fails while job names are duplicated, find them with
+--   SELECT JOB_NAME, COUNT(*) FROM job_mgmt.JOBS GROUP BY JOB_NAME HAVING COUNT(*) > 1
+-- and repoint or delete the extra rows first.
+ALTER TABLE job_mgmt.JOBS ALTER COLUMN JOB_NAME SET NOT NULL;
+CALL SYSPROC.ADMIN_CMD('REORG TABLE job_mgmt.JOBS');
+CREATE UNIQUE INDEX job_mgmt.JOBS_NAME_UX ON job_mgmt.JOBS (JOB_NAME);
+CREATE INDEX job_mgmt.JOB_RUNS_JOB_IX ON job_mgmt.JOB_RUNS (JOB_ID, RUN_ID);
+CREATE INDEX job_mgmt.JOB_RUNS_STARTED_IX ON job_mgmt.JOB_RUNS (STARTED_AT);
+CREATE INDEX job_mgmt.JOB_LOGS_RUN_IX ON job_mgmt.JOB_LOGS (RUN_ID);
+
+CREATE TABLE job_mgmt.JOB_RUN_DAILY (
+    JOB_ID          INTEGER NOT NULL,
+    RUN_DATE        DATE NOT NULL,
+    RUNS            INTEGER DEFAULT 0,
+    SUCCESSES       INTEGER DEFAULT 0,
+    FAILURES        INTEGER DEFAULT 0,
+    CACHE_HITS      INTEGER DEFAULT 0,
+    DURATION_COUNT  INTEGER DEFAULT 0,
+    DURATION_SUM    DOUBLE DEFAULT 0,
+    SUCCESS_SECONDS DOUBLE DEFAULT 0,
+    ROWS_EXPORTED   BIGINT DEFAULT 0,
+    BYTES_WRITTEN   BIGINT DEFAULT 0,
+    QUEUE_SECONDS   DOUBLE DEFAULT 0,
+    DURATION_MIN    DOUBLE,
+    DURATION_MAX    DOUBLE,
+    LAST_ENDED_AT   TIMESTAMP,
+    LAST_STATUS     VARCHAR(50),
+    DURATION_HIST   VARCHAR(1000),
+    ROWS_HIST       VARCHAR(1000),
+    BYTES_HIST      VARCHAR(1000),
+    QUEUE_HIST      VARCHAR(1000),
+    PRIMARY KEY (JOB_ID, RUN_DATE),
+    FOREIGN KEY (JOB_ID) REFERENCES job_mgmt.JOBS(JOB_ID)
+);
+
+CREATE INDEX job_mgmt.JOB_RUN_DAILY_DATE_IX ON job_mgmt.JOB_RUN_DAILY (RUN_DATE);
+
+-- Reconciler change detection (schedule, offset and content hash edits, by sync or by hand)
+ALTER TABLE job_mgmt.JOBS ADD COLUMN UPDATED_AT TIMESTAMP NOT NULL GENERATED ALWAYS FOR EACH ROW ON UPDATE AS ROW CHANGE TIMESTAMP;
+CALL SYSPROC.ADMIN_CMD('REORG TABLE job_mgmt.JOBS');
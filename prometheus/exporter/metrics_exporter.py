@@ -1,6 +1,12 @@
-from fastapi import FastAPI, Response
+from fastapi import Body, FastAPI, HTTPException, Response
+import calendar
+import glob
+import json
+import math
 import os
 import platform
+import threading
+import time
 
 if platform.system() == "Windows":
     dll_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../infra/db2_driver/clidriver/bin"))
@@ -11,100 +17,410 @@ import ibm_db
 app = FastAPI()
 
 DB_CONN_STR = os.getenv("CONN_STR") or "DATABASE=testdb;HOSTNAME=localhost;PORT=50000;PROTOCOL=TCPIP;UID=db2inst1;PWD=passw0rd;"
+POLL_INTERVAL = float(os.getenv("METRICS_POLL_INTERVAL", "10"))
+# Open runs are re-checked by primary key, this many ids per statement
+OPEN_RUN_CHUNK = 200
+# Live progress of running jobs: POSTed to /progress by the runners and/or read from their status files on the
+# shared exports volume (<exports>/.progress). Snapshots not refreshed for PROGRESS_TTL seconds are dropped.
+PROGRESS_DIR = os.getenv("PROGRESS_DIR")
+PROGRESS_TTL = float(os.getenv("PROGRESS_TTL", "900"))
+PROGRESS_GAUGES = {
+    "job_progress_rows": ("Rows fetched so far by a running job", "rows"),
+    "job_progress_bytes": ("Bytes written so far by a running job", "bytes"),
+    "job_progress_rows_per_second": ("Rows per second since the previous progress snapshot", "rows_per_sec"),
+    "job_progress_elapsed_seconds": ("Seconds since the run started", "elapsed_seconds"),
+    "job_progress_rss_bytes": ("Resident memory of the runner process", "rss_bytes"),
+}
 
-@app.get("/metrics")
-def get_metrics():
-    try:
-        conn = ibm_db.connect(DB_CONN_STR, "", "")
-    except Exception as e:
-        return Response(f"# DB connection failed: {e}", status_code=500)
+# Only runs that actually ran feed the per-run histograms and min/max/avg, not the SKIPPED, INVALID or RESUMED
+# placeholder rows (closed the moment they're written, so they'd pull every quantile towards 0)
+RAN_STATUSES = ("SUCCESS", "FAILURE")
+RUN_COLUMNS = "run_id, job_id, started_at, ended_at, status, cache_hit, rows_exported, bytes_written, queue_seconds"
+ROLLUP_COLUMNS = ("job_id, runs, successes, failures, cache_hits, duration_count, duration_sum, duration_min, duration_max, "
+                  "rows_exported, bytes_written, queue_seconds, last_ended_at, last_status, "
+                  "duration_hist, rows_hist, bytes_hist, queue_hist")
 
-    metrics = []
 
-    try:
+def parse_buckets(env_name, default):
+    return sorted(float(b) for b in os.getenv(env_name, default).split(","))
+
+
+DURATION_BUCKETS = parse_buckets("DURATION_BUCKETS", "1,5,15,30,60,120,300,600,1800,3600,7200")
+ROWS_BUCKETS = parse_buckets("ROWS_BUCKETS", "10,100,1000,1e4,1e5,1e6,1e7,1e8")
+BYTES_BUCKETS = parse_buckets("BYTES_BUCKETS", "1e3,1e4,1e5,1e6,1e7,1e8,1e9,1e10")
+QUEUE_BUCKETS = parse_buckets("QUEUE_BUCKETS", "1,5,15,30,60,120,300,600,1800,3600")
+
+
+def label_value(value):
+    # Escaped as the text format wants it, job names and phases come from YAML files and runner payloads
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def clean_progress(snapshot):
+    # Snapshots come from outside (POST bodies, files on a shared volume): keep only what we render, as numbers
+    if not isinstance(snapshot, dict) or snapshot.get("job_name") in (None, "") or snapshot.get("run_id") in (None, ""):
+        raise ValueError("job_name and run_id are required")
+    clean = {"job_name": str(snapshot["job_name"]), "run_id": str(snapshot["run_id"]),
+             "phase": str(snapshot.get("phase") or ""), "finished": bool(snapshot.get("finished"))}
+    for field in [field for _, field in PROGRESS_GAUGES.values()] + ["updated_at"]:
+        value = snapshot.get(field)
+        if value is None:
+            clean[field] = None
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}")
+        if not math.isfinite(value):
+            raise ValueError(f"{field} must be a finite number, got {value!r}")
+        clean[field] = value
+    if clean["updated_at"] is None:
+        clean["updated_at"] = time.time()
+    return clean
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # per bucket, made cumulative when rendered
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def add_counts(self, text, total):
+        # Counts stored by scripts/maintenance.py as "upper_bound=count ...", folded into our own buckets
+        for pair in (text or "").split():
+            bound, count = pair.split("=")
+            bound, count = float(bound), int(count)
+            for i, own in enumerate(self.buckets):
+                if bound <= own:
+                    self.counts[i] += count
+                    break
+            self.count += count
+        self.sum += float(total or 0)
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+HISTOGRAMS = {
+    "job_run_duration_seconds": ("Run duration in seconds", DURATION_BUCKETS),
+    "job_rows_exported": ("Rows exported per run", ROWS_BUCKETS),
+    "job_bytes_written": ("Bytes written per run", BYTES_BUCKETS),
+    "job_queue_delay_seconds": ("Seconds a run waited for a run slot (RUN_CONCURRENCY_BUDGET)", QUEUE_BUCKETS),
+}
+
+
+class JobAggregate:
+    def __init__(self):
+        self.counts = {}
+        self.cache_hits = 0
+        self.duration_min = None
+        self.duration_max = None
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.last_ended = None
+        self.last_status = None
+        self.active = 0
+        self.histograms = {name: Histogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()}
+
+    def add_finished(self, row):
+        status = row["STATUS"]
+        started, ended = row["STARTED_AT"], row["ENDED_AT"]
+        if status in RAN_STATUSES:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            if row.get("CACHE_HIT"):
+                self.cache_hits += 1
+            if started is not None:
+                duration = (ended - started).total_seconds()
+                self.duration_min = duration if self.duration_min is None else min(self.duration_min, duration)
+                self.duration_max = duration if self.duration_max is None else max(self.duration_max, duration)
+                self.duration_sum += duration
+                self.duration_count += 1
+                self.histograms["job_run_duration_seconds"].observe(duration)
+            if row.get("ROWS_EXPORTED") is not None:
+                self.histograms["job_rows_exported"].observe(row["ROWS_EXPORTED"])
+            if row.get("BYTES_WRITTEN") is not None:
+                self.histograms["job_bytes_written"].observe(row["BYTES_WRITTEN"])
+            if row.get("QUEUE_SECONDS") is not None:
+                self.histograms["job_queue_delay_seconds"].observe(float(row["QUEUE_SECONDS"]))
+
+        if self.last_ended is None or ended >= self.last_ended:
+            self.last_ended = ended
+            self.last_status = status
+
+    def add_rollup(self, row):
+        # One job_run_daily row: the pruned runs of a day, already summed up
+        for status, column in (("SUCCESS", "SUCCESSES"), ("FAILURE", "FAILURES")):
+            if row[column]:
+                self.counts[status] = self.counts.get(status, 0) + int(row[column])
+        self.cache_hits += int(row["CACHE_HITS"] or 0)
+        if row["DURATION_COUNT"]:
+            self.duration_min = row["DURATION_MIN"] if self.duration_min is None else min(self.duration_min, row["DURATION_MIN"])
+            self.duration_max = row["DURATION_MAX"] if self.duration_max is None else max(self.duration_max, row["DURATION_MAX"])
+            self.duration_sum += float(row["DURATION_SUM"])
+            self.duration_count += int(row["DURATION_COUNT"])
+        for name, hist, total in (("job_run_duration_seconds", "DURATION_HIST", "DURATION_SUM"),
+                                  ("job_rows_exported", "ROWS_HIST", "ROWS_EXPORTED"),
+                                  ("job_bytes_written", "BYTES_HIST", "BYTES_WRITTEN"),
+                                  ("job_queue_delay_seconds", "QUEUE_HIST", "QUEUE_SECONDS")):
+            self.histograms[name].add_counts(row[hist], row[total])
+        ended = row["LAST_ENDED_AT"]
+        if ended is not None and (self.last_ended is None or ended >= self.last_ended):
+            self.last_ended = ended
+            self.last_status = row["LAST_STATUS"]
+
+
+class RunAggregator:
+    # Keeps per-job aggregates in memory and folds in only the runs that are new or were still open.
+
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        self.conn = None
+        self.jobs = {}
+        self.open_runs = {}  # run_id -> job_id
+        self.last_run_id = 0
+        self.bootstrapped = False
+        self.tables = []
+        self.poll_errors = 0
+        self.last_poll = None
+        self.snapshot = "# exporter warming up"
+        self._lock = threading.Lock()
+        self.progress = {}  # (job_name, run_id) -> last snapshot
+
+    def connect(self):
+        if self.conn is not None and ibm_db.active(self.conn):
+            return self.conn
+        self.conn = ibm_db.connect(self.conn_str, "", "")
+        return self.conn
+
+    def fetch(self, sql, params=()):
+        stmt = ibm_db.prepare(self.connect(), sql)
+        ibm_db.execute(stmt, params)
+        rows = []
+        while row := ibm_db.fetch_assoc(stmt):
+            rows.append(row)
+        return rows
+
+    def check_tables(self):
         # Confirm table exists
-        stmt = ibm_db.exec_immediate(conn, """
+        rows = self.fetch("""
             SELECT TABSCHEMA, TABNAME
             FROM SYSCAT.TABLES
             WHERE LOWER(TABNAME) = 'job_runs'
         """)
-        while row := ibm_db.fetch_assoc(stmt):
-            metrics.append(f'# Found table: {row["TABSCHEMA"]}.{row["TABNAME"]}')
-    except Exception as e:
-        return Response(f"# Table check failed: {e}", status_code=500)
+        self.tables = [f'{row["TABSCHEMA"]}.{row["TABNAME"]}' for row in rows]
 
-    try:
-        # Run counts by status
-        for status in ["SUCCESS", "FAILURE"]:
-            stmt = ibm_db.exec_immediate(conn, f"""
-                SELECT job_id, COUNT(*) as count
-                FROM job_mgmt.job_runs
-                WHERE status = '{status}'
-                GROUP BY job_id
-            """)
-            while row := ibm_db.fetch_assoc(stmt):
-                metrics.append(
-                    f'job_runs_total{{job_id="{row["JOB_ID"]}",status="{status.lower()}"}} {row["COUNT"]}'
-                )
-    except Exception as e:
-        metrics.append(f"# Job count query failed: {e}")
+    def job(self, job_id):
+        if job_id not in self.jobs:
+            self.jobs[job_id] = JobAggregate()
+        return self.jobs[job_id]
 
-    try:
-        # Duration stats
-        stmt = ibm_db.exec_immediate(conn, """
-            SELECT job_id,
-                MAX(BIGINT(DAYS(ENDED_AT)) * 86400 + MIDNIGHT_SECONDS(ENDED_AT) -
-                    (BIGINT(DAYS(STARTED_AT)) * 86400 + MIDNIGHT_SECONDS(STARTED_AT))) AS max_duration,
-                MIN(BIGINT(DAYS(ENDED_AT)) * 86400 + MIDNIGHT_SECONDS(ENDED_AT) -
-                    (BIGINT(DAYS(STARTED_AT)) * 86400 + MIDNIGHT_SECONDS(STARTED_AT))) AS min_duration,
-                AVG(DOUBLE(BIGINT(DAYS(ENDED_AT)) * 86400 + MIDNIGHT_SECONDS(ENDED_AT) -
-                    (BIGINT(DAYS(STARTED_AT)) * 86400 + MIDNIGHT_SECONDS(STARTED_AT)))) AS avg_duration
-            FROM "JOB_MGMT"."JOB_RUNS"
-            WHERE STARTED_AT IS NOT NULL AND ENDED_AT IS NOT NULL
-            GROUP BY job_id
-        """)
-        while row := ibm_db.fetch_assoc(stmt):
-            metrics.append(f'job_duration_seconds_max{{job_id="{row["JOB_ID"]}"}} {row["MAX_DURATION"]}')
-            metrics.append(f'job_duration_seconds_min{{job_id="{row["JOB_ID"]}"}} {row["MIN_DURATION"]}')
-            metrics.append(f'job_duration_seconds_avg{{job_id="{row["JOB_ID"]}"}} {row["AVG_DURATION"]}')
-    except Exception as e:
-        metrics.append(f"# Duration stats query failed: {e}")
+    def apply(self, row):
+        run_id, job_id = row["RUN_ID"], row["JOB_ID"]
+        was_open = run_id in self.open_runs
+        if row["ENDED_AT"] is None:
+            if not was_open:
+                self.open_runs[run_id] = job_id
+                self.job(job_id).active += 1
+            return
+        if was_open:
+            del self.open_runs[run_id]
+            self.job(job_id).active -= 1
+        self.job(job_id).add_finished(row)
 
-    try:
-        # Last run status and timestamp
-        stmt = ibm_db.exec_immediate(conn, """
-            SELECT job_id, status,
-                BIGINT(DAYS(ENDED_AT) - DAYS(DATE('1970-01-01'))) * 86400
-                + MIDNIGHT_SECONDS(ENDED_AT) AS ended
-            FROM (
-                SELECT job_id, status, ended_at,
-                    ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY ended_at DESC) AS rn
-                FROM "JOB_MGMT"."JOB_RUNS"
-                WHERE ended_at IS NOT NULL
-            ) sub
-            WHERE rn = 1
-        """)
+    def bootstrap(self):
+        # History older than RUN_RETENTION_DAYS only exists as daily rollups, one row per job and day.
+        # Later polls only read new or open runs, so this is the one time they are read.
+        try:
+            rollups = self.fetch(f'SELECT {ROLLUP_COLUMNS} FROM "JOB_MGMT"."JOB_RUN_DAILY"')
+        except Exception as e:
+            print(f"⚠️ No run rollups loaded (run infra/upgrade_job_mgmt.sql?): {e}")
+            rollups = []
+        with self._lock:
+            for row in rollups:
+                self.job(row["JOB_ID"]).add_rollup(row)
+            self.bootstrapped = True
 
+    def poll(self):
+        if not self.bootstrapped:
+            self.bootstrap()
+        rows = self.fetch(
+            f'SELECT {RUN_COLUMNS} FROM "JOB_MGMT"."JOB_RUNS" WHERE run_id > ? ORDER BY run_id',
+            (self.last_run_id,)
+        )
 
-        while row := ibm_db.fetch_assoc(stmt):
-            status_value = 1 if row["STATUS"] == "SUCCESS" else 0
-            metrics.append(f'job_last_status{{job_id="{row["JOB_ID"]}"}} {status_value}')
-            metrics.append(f'job_run_timestamp{{job_id="{row["JOB_ID"]}"}} {row["ENDED"]}')
-    except Exception as e:
-        metrics.append(f"# Last status query failed: {e}")
+        open_ids = sorted(self.open_runs)
+        found = set()
+        for i in range(0, len(open_ids), OPEN_RUN_CHUNK):
+            chunk = open_ids[i:i + OPEN_RUN_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.fetch(
+                f'SELECT {RUN_COLUMNS} FROM "JOB_MGMT"."JOB_RUNS" WHERE run_id IN ({placeholders})',
+                tuple(chunk)
+            ):
+                found.add(row["RUN_ID"])
+                if row["ENDED_AT"] is not None:
+                    rows.append(row)
 
-    try:
-        # Count of active (unfinished) runs
-        stmt = ibm_db.exec_immediate(conn, """
-            SELECT job_id, COUNT(*) AS active
-            FROM "JOB_MGMT"."JOB_RUNS"
-            WHERE ENDED_AT IS NULL
-            GROUP BY job_id
-        """)
-        while row := ibm_db.fetch_assoc(stmt):
-            metrics.append(f'job_active_count{{job_id="{row["JOB_ID"]}"}} {row["ACTIVE"]}')
-    except Exception as e:
-        metrics.append(f"# Active job query failed: {e}")
+        with self._lock:
+            # Open runs deleted in the meantime (pruned, cleaned up by hand) would count as active forever
+            for run_id in set(open_ids) - found:
+                job_id = self.open_runs.pop(run_id, None)
+                if job_id is not None:
+                    self.job(job_id).active -= 1
+            for row in rows:
+                self.apply(row)
+                self.last_run_id = max(self.last_run_id, row["RUN_ID"])
+            self.last_poll = time.time()
+            self.snapshot = self.render()
+
+    def update_progress(self, snapshot, source="push"):
+        snapshot = clean_progress(snapshot)
+        key = (snapshot["job_name"], snapshot["run_id"])
+        with self._lock:
+            if snapshot.get("finished"):
+                self.progress.pop(key, None)
+                return
+            current = self.progress.get(key)
+            if current is None or snapshot["updated_at"] >= current["updated_at"]:
+                self.progress[key] = dict(snapshot, source=source)
+
+    def read_progress_dir(self, directory=PROGRESS_DIR):
+        seen = set()
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            try:
+                with open(path) as f:
+                    snapshot = clean_progress(json.load(f))
+            except OSError:
+                continue  # removed while listing
+            except ValueError as e:
+                print(f"⚠️ Ignoring progress file {path}: {e}")
+                continue
+            seen.add((snapshot["job_name"], snapshot["run_id"]))
+            self.update_progress(snapshot, source="file")
+        # A runner removes its file when the run ends
+        with self._lock:
+            for key in [k for k, v in self.progress.items() if v["source"] == "file" and k not in seen]:
+                del self.progress[key]
+
+    def render_progress(self):
+        # Rendered per scrape from memory, so pushed snapshots show up without waiting for the next poll
+        now = time.time()
+        for key in [k for k, v in self.progress.items() if now - v["updated_at"] > PROGRESS_TTL]:
+            del self.progress[key]
+        runs = [(f'job_name="{label_value(job_name)}",run_id="{label_value(run_id)}"', snapshot)
+                for (job_name, run_id), snapshot in sorted(self.progress.items())]
+        metrics = []
+        for name, (help_text, field) in PROGRESS_GAUGES.items():
+            metrics.append(f"# HELP {name} {help_text}")
+            metrics.append(f"# TYPE {name} gauge")
+            for labels, snapshot in runs:
+                if snapshot[field] is not None:
+                    metrics.append(f'{name}{{{labels}}} {snapshot[field]}')
+        metrics.append("# HELP job_progress_age_seconds Seconds since the run last reported progress (stalled runners)")
+        metrics.append("# TYPE job_progress_age_seconds gauge")
+        for labels, snapshot in runs:
+            metrics.append(f'job_progress_age_seconds{{{labels}}} {max(0.0, now - snapshot["updated_at"]):.1f}')
+        metrics.append("# HELP job_progress_phase Current phase of the run (fetch, serialize, write, publish, queued, ...)")
+        metrics.append("# TYPE job_progress_phase gauge")
+        for labels, snapshot in runs:
+            metrics.append(f'job_progress_phase{{{labels},phase="{label_value(snapshot["phase"])}"}} 1')
+        return "\n".join(metrics)
+
+    def render(self):
+        metrics = [f"# Found table: {table}" for table in self.tables]
 
-    ibm_db.close(conn)
-    return Response("\n".join(metrics), media_type="text/plain")
\ No newline at end of file
+        for job_id, agg in sorted(self.jobs.items()):
+            for status in ("SUCCESS", "FAILURE"):
+                if status in agg.counts:
+                    metrics.append(f'job_runs_total{{job_id="{job_id}",status="{status.lower()}"}} {agg.counts[status]}')
+            if agg.cache_hits:
+                metrics.append(f'job_cache_hits_total{{job_id="{job_id}"}} {agg.cache_hits}')
+            if agg.duration_count:
+                metrics.append(f'job_duration_seconds_max{{job_id="{job_id}"}} {agg.duration_max}')
+                metrics.append(f'job_duration_seconds_min{{job_id="{job_id}"}} {agg.duration_min}')
+                metrics.append(f'job_duration_seconds_avg{{job_id="{job_id}"}} {agg.duration_sum / agg.duration_count}')
+            if agg.last_ended is not None:
+                status_value = 1 if agg.last_status == "SUCCESS" else 0
+                metrics.append(f'job_last_status{{job_id="{job_id}"}} {status_value}')
+                metrics.append(f'job_run_timestamp{{job_id="{job_id}"}} {calendar.timegm(agg.last_ended.timetuple())}')
+            if agg.active:
+                metrics.append(f'job_active_count{{job_id="{job_id}"}} {agg.active}')
+
+        # Histogram families are kept contiguous, as the text format expects
+        for name, (help_text, _) in HISTOGRAMS.items():
+            metrics.append(f"# HELP {name} {help_text}")
+            metrics.append(f"# TYPE {name} histogram")
+            for job_id, agg in sorted(self.jobs.items()):
+                if agg.histograms[name].count:
+                    metrics.extend(agg.histograms[name].render(name, f'job_id="{job_id}"'))
+
+        metrics.append(f"exporter_poll_errors_total {self.poll_errors}")
+        if self.last_poll is not None:
+            metrics.append(f"exporter_last_poll_timestamp {self.last_poll}")
+        return "\n".join(metrics)
+
+    def run_forever(self, interval=POLL_INTERVAL):
+        while True:
+            if PROGRESS_DIR:
+                try:
+                    self.read_progress_dir()
+                except Exception as e:
+                    print(f"⚠️ Reading progress files failed: {e}")
+            try:
+                if not self.tables:
+                    try:
+                        self.check_tables()
+                    except Exception as e:
+                        print(f"⚠️ Table check failed: {e}")
+                self.poll()
+            except Exception as e:
+                print(f"❌ Metrics poll failed: {e}")
+                with self._lock:
+                    self.poll_errors += 1
+                    self.snapshot = self.render() + f"\n# Last poll failed: {e}"
+                if self.conn is not None and not ibm_db.active(self.conn):
+                    self.conn = None
+            time.sleep(interval)
+
+
+aggregator = RunAggregator(DB_CONN_STR)
+
+
+@app.on_event("startup")
+def start_poller():
+    threading.Thread(target=aggregator.run_forever, name="metrics-poller", daemon=True).start()
+
+
+@app.get("/metrics")
+def get_metrics():
+    # Served from the last poll, no DB round trip per scrape
+    with aggregator._lock:
+        body = aggregator.snapshot + "\n" + aggregator.render_progress()
+    return Response(body, media_type="text/plain")
+
+
+@app.post("/progress")
+def post_progress(snapshot: dict = Body(...)):
+    # Live progress pushed by runners (PROGRESS_URL), see scripts/progress.py
+    try:
+        aggregator.update_progress(snapshot)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True}
@@ -4,15 +4,13 @@ MODE="$1"  # --send or --exec
 
 if [[ "$MODE" == "--send" ]]; then
     echo "📬 Registering all jobs..."
-    for filename in jobs/*.yaml; do
-        python3 entrypoints/sender.py "$filename"
-    done
+    # One process, one batched insert for every new job
+    python3 entrypoints/sender.py jobs/*.yaml
 
 elif [[ "$MODE" == "--exec" ]]; then
     echo "⚙️ Executing all jobs..."
-    for filename in jobs/*.yaml; do
-        python3 entrypoints/runner.py "$filename"
-    done
+    # One process, bounded worker pool (EXECUTOR_WORKERS, default 4)
+    python3 entrypoints/run_all.py jobs/*.yaml "${@:2}"
 
 else
     echo "❌ Usage: $0 [--send | --exec]"
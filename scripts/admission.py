@@ -0,0 +1,96 @@
+import os
+import random
+import socket
+import threading
+import time
+
+import ibm_db
+
+# Runs allowed to query DB2 at the same time across every runner pod, 0 turns admission control off
+RUN_CONCURRENCY_BUDGET = int(os.getenv("RUN_CONCURRENCY_BUDGET", "0"))
+# A lease not renewed for this long (crashed pod) is free again
+RUN_LEASE_TTL = int(os.getenv("RUN_LEASE_TTL", "120"))
+ADMISSION_POLL_INTERVAL = float(os.getenv("ADMISSION_POLL_INTERVAL", "5"))
+# A run still queued after this many seconds fails instead of waiting forever
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "3600"))
+
+
+def _timestamp(offset=0):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + offset))
+
+
+def ensure_slots(pool, budget):
+    # One row per slot in job_mgmt.run_leases, a run holds a slot while it runs
+    existing = {int(row["SLOT"]) for row in pool.fetch_all("SELECT slot FROM job_mgmt.run_leases WHERE slot <= ?", (budget,))}
+    for slot in range(1, budget + 1):
+        if slot not in existing:
+            try:
+                pool.execute("INSERT INTO job_mgmt.run_leases (slot) VALUES (?)", (slot,))
+            except Exception:
+                pass  # another pod created it first
+
+
+class Lease:
+    def __init__(self, pool, slot, holder, ttl=RUN_LEASE_TTL):
+        self.pool = pool
+        self.slot = slot
+        self.holder = holder
+        self.ttl = ttl
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, name="run-lease", daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.pool.execute("UPDATE job_mgmt.run_leases SET expires_at = ? WHERE slot = ? AND holder = ?",
+                                  (_timestamp(self.ttl), self.slot, self.holder))
+            except Exception as e:
+                print(f"⚠️ Could not renew run lease {self.slot}: {e}")
+
+    def release(self):
+        self._stop.set()
+        self.pool.execute(
+            "UPDATE job_mgmt.run_leases SET holder = NULL, run_id = NULL, job_name = NULL, expires_at = NULL "
+            "WHERE slot = ? AND holder = ?",
+            (self.slot, self.holder)
+        )
+
+
+def try_acquire(pool, budget, holder, job_name, run_id, ttl=RUN_LEASE_TTL):
+    now = _timestamp()
+    free = [int(row["SLOT"]) for row in pool.fetch_all(
+        "SELECT slot FROM job_mgmt.run_leases WHERE slot <= ? AND (holder IS NULL OR expires_at < ?)", (budget, now)
+    )]
+    # Random order, so pods polling at the same moment don't all race for the same slot
+    random.shuffle(free)
+    for slot in free:
+        with pool.connection() as db:
+            stmt = db.execute(
+                "UPDATE job_mgmt.run_leases SET holder = ?, run_id = ?, job_name = ?, acquired_at = ?, expires_at = ? "
+                "WHERE slot = ? AND (holder IS NULL OR expires_at < ?)",
+                (holder, run_id, job_name, now, _timestamp(ttl), slot, now)
+            )
+            if ibm_db.num_rows(stmt) == 1:
+                return Lease(pool, slot, holder, ttl)
+    return None
+
+
+def acquire(pool, job_name, run_id, budget=RUN_CONCURRENCY_BUDGET, max_wait=ADMISSION_MAX_WAIT,
+            poll=ADMISSION_POLL_INTERVAL, on_wait=None):
+    # Returns (lease, seconds queued). Blocks while all `budget` slots are taken.
+    holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    ensure_slots(pool, budget)
+    started = time.monotonic()
+    polls = 0
+    while True:
+        lease = try_acquire(pool, budget, holder, job_name, run_id)
+        waited = time.monotonic() - started
+        if lease:
+            return lease, waited
+        if waited > max_wait:
+            raise TimeoutError(f"No run slot free after {max_wait:g}s (RUN_CONCURRENCY_BUDGET={budget})")
+        if on_wait and polls == 0:
+            on_wait()
+        polls += 1
+        time.sleep(poll * random.uniform(0.5, 1.5))
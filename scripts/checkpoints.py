@@ -0,0 +1,177 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import ibm_db
+
+from scripts.export_writers import split_output
+
+# A failed run is only picked up again by the next pod if it failed less than this many seconds ago
+RESUME_WITHIN = int(os.getenv("RESUME_WITHIN", "3600"))
+# Batches per committed segment of a checkpointed streaming export
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "10"))
+
+
+def parse_retry(data):
+    timeout = data.get("timeout")
+    backoff = data.get("backoff", 30)
+    if not isinstance(backoff, dict):
+        backoff = {"initial": backoff}
+    spec = {
+        "timeout": float(timeout) if timeout else None,
+        "retries": max(0, int(data.get("retries", 0))),
+        "backoff": float(backoff.get("initial", 30)),
+        "factor": float(backoff.get("factor", 2)),
+        "max_backoff": float(backoff.get("max", 600)),
+    }
+    checkpoint = data.get("checkpoint")
+    if isinstance(checkpoint, str):
+        checkpoint = {"column": checkpoint}
+    spec["checkpoint_column"] = str(checkpoint["column"]).upper() if checkpoint and checkpoint.get("column") else None
+    spec["checkpoint_every"] = int((checkpoint or {}).get("every", CHECKPOINT_EVERY))
+    return spec
+
+
+def backoff_delay(spec, attempt):
+    # attempt is the one that just failed, starting at 1
+    return min(spec["max_backoff"], spec["backoff"] * spec["factor"] ** (attempt - 1))
+
+
+def spec_hash(*parts):
+    # Checkpoints only apply to a run of the exact same extraction
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def find_resumable(pool, job_id, current_hash):
+    # The job's latest run, if it failed recently and left checkpoints for this same spec
+    row = pool.fetch_one(
+        "SELECT r.run_id, r.status, r.started_at, r.ended_at FROM job_mgmt.job_runs r "
+        "WHERE r.job_id = ? AND r.status IS NOT NULL AND r.status <> 'RESUMED' ORDER BY r.run_id DESC FETCH FIRST 1 ROWS ONLY",
+        (job_id,)
+    )
+    if row is None or row["STATUS"] != "FAILURE":
+        return None
+    ended = row["ENDED_AT"]
+    if isinstance(ended, str):
+        ended = datetime.datetime.fromisoformat(ended)
+    if ended is None or (datetime.datetime.now() - ended).total_seconds() > RESUME_WITHIN:
+        return None
+    checkpoint = pool.fetch_one(
+        "SELECT COUNT(*) AS n FROM job_mgmt.job_checkpoints WHERE run_id = ? AND spec_hash = ?",
+        (row["RUN_ID"], current_hash)
+    )
+    if not checkpoint or not checkpoint["N"]:
+        return None
+    started = row["STARTED_AT"]
+    if isinstance(started, str):
+        started = datetime.datetime.fromisoformat(started)
+    return row["RUN_ID"], started.timestamp() if started else None
+
+
+def last_attempt(pool, run_id):
+    row = pool.fetch_one("SELECT MAX(attempt) AS n FROM job_mgmt.job_run_attempts WHERE run_id = ?", (run_id,))
+    return int(row["N"] or 0) if row else 0
+
+
+def start_attempt(pool, run_id, attempt):
+    pool.execute(
+        "INSERT INTO job_mgmt.job_run_attempts (run_id, attempt, started_at, status) VALUES (?, ?, ?, ?)",
+        (run_id, attempt, _now(), "RUNNING")
+    )
+
+
+def end_attempt(pool, run_id, attempt, status, rows, error=None):
+    pool.execute(
+        "UPDATE job_mgmt.job_run_attempts SET ended_at = ?, status = ?, rows_exported = ?, error = ? "
+        "WHERE run_id = ? AND attempt = ?",
+        (_now(), status, rows, error[:1000] if error else None, run_id, attempt)
+    )
+
+
+def load(db, run_id, current_hash):
+    # On the connection the export already holds, like save()
+    stmt = db.execute(
+        "SELECT part, rows_done, bytes_done, last_key FROM job_mgmt.job_checkpoints "
+        "WHERE run_id = ? AND spec_hash = ? ORDER BY part",
+        (run_id, current_hash)
+    )
+    done = {}
+    while r := ibm_db.fetch_assoc(stmt):
+        done[int(r["PART"])] = {"rows": int(r["ROWS_DONE"]), "bytes": int(r["BYTES_DONE"]), "last_key": r["LAST_KEY"]}
+    return done
+
+
+def save(db, run_id, current_hash, part, rows, nbytes, last_key=None):
+    # db is a PooledConnection, so a streaming export can checkpoint on the connection it already holds
+    params = (current_hash, rows, nbytes, last_key, _now(), run_id, part)
+    stmt = db.execute(
+        "UPDATE job_mgmt.job_checkpoints SET spec_hash = ?, rows_done = ?, bytes_done = ?, last_key = ?, updated_at = ? "
+        "WHERE run_id = ? AND part = ?",
+        params
+    )
+    if ibm_db.num_rows(stmt) == 0:
+        db.execute(
+            "INSERT INTO job_mgmt.job_checkpoints (spec_hash, rows_done, bytes_done, last_key, updated_at, run_id, part) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            params
+        )
+
+
+def clear(db, run_id, after):
+    # Drops the segments past `after`, segments are numbered from 1.
+    # A pool or a connection already held, both have execute()
+    db.execute("DELETE FROM job_mgmt.job_checkpoints WHERE run_id = ? AND part > ?", (run_id, after))
+
+
+def clear_all(db, run_id):
+    # Every checkpoint of a run that succeeded, partitions are numbered from 0
+    db.execute("DELETE FROM job_mgmt.job_checkpoints WHERE run_id = ?", (run_id,))
+
+
+class KeySegments:
+    # Cuts batches ordered on key_index into segments of `every` batches that never end inside a run of equal keys,
+    # so a resume from `key > last committed key` neither skips nor repeats rows of a non-unique key
+
+    def __init__(self, batches, key_index, every):
+        self.batches = batches
+        self.key_index = key_index
+        self.every = max(1, every)
+        self._carry = None  # rows of the next segment, split off the batch that ended the last one
+
+    def _next(self):
+        batch, self._carry = self._carry, None
+        return batch if batch is not None else next(self.batches, None)
+
+    def segment(self):
+        # The batches of the next segment, none once the cursor is drained
+        count, last = 0, None
+        while True:
+            batch = self._next()
+            if batch is None:
+                return
+            if count < self.every:
+                count += 1
+                last = batch[-1][self.key_index]
+                yield batch
+                continue
+            # Quota reached, only the rows still on the segment's last key go with it
+            n = 0
+            while n < len(batch) and batch[n][self.key_index] == last:
+                n += 1
+            if n < len(batch):
+                self._carry = batch[n:]  # a copy, fetch_batches reuses its buffer
+                if n:
+                    yield batch[:n]
+                return
+            yield batch
+
+
+def segment_output(output_path, segment):
+    stem, ext = split_output(output_path)
+    return f"{stem}.seg{segment:04d}{ext}"
@@ -0,0 +1,74 @@
+import datetime
+
+# The CronJob schedule syntax: minute hour day-of-month month day-of-week, plus the usual @ macros
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# How far back previous_fire looks, a bit over a week covers every weekly schedule
+LOOKBACK_MINUTES = 8 * 24 * 60
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_schedule(schedule):
+    fields = MACROS.get(schedule.strip(), schedule).split()
+    if len(fields) != 5:
+        raise ValueError(f"Expected 5 cron fields, got '{schedule}'")
+    minutes, hours, days, months, weekdays = (
+        _parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)
+    )
+    if 7 in weekdays:
+        weekdays = (weekdays - {7}) | {0}  # both mean Sunday
+    return {
+        "minutes": minutes, "hours": hours, "days": days, "months": months, "weekdays": weekdays,
+        # cron ORs day-of-month and day-of-week when both are restricted
+        "any_day": fields[2] == "*", "any_weekday": fields[4] == "*",
+    }
+
+
+def matches(spec, moment):
+    if moment.minute not in spec["minutes"] or moment.hour not in spec["hours"] or moment.month not in spec["months"]:
+        return False
+    day_ok = moment.day in spec["days"]
+    weekday_ok = (moment.weekday() + 1) % 7 in spec["weekdays"]
+    if spec["any_day"] or spec["any_weekday"]:
+        return day_ok and weekday_ok
+    return day_ok or weekday_ok
+
+
+def previous_fire(schedule, now=None, lookback=LOOKBACK_MINUTES):
+    # The last minute at or before now the schedule fired, None if it didn't within lookback minutes
+    if not schedule:
+        return None
+    spec = parse_schedule(str(schedule))
+    moment = (now or datetime.datetime.now()).replace(second=0, microsecond=0)
+    for _ in range(lookback + 1):
+        if matches(spec, moment):
+            return moment
+        moment -= datetime.timedelta(minutes=1)
+    return None
@@ -0,0 +1,130 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+NAMESPACE = "default"
+# Only CronJobs generated from job YAMLs, not the sync/scheduler CronJobs themselves
+CRONJOB_LABELS = {"app": "batch-runner"}
+CRONJOB_SELECTOR = ",".join(f"{k}={v}" for k, v in CRONJOB_LABELS.items())
+# CronJob annotation holding the content hash it was generated from
+HASH_ANNOTATION = "batch-runner/content-hash"
+FIELD_MANAGER = os.getenv("CRONJOB_FIELD_MANAGER", "job-sync")
+APPLY_WORKERS = int(os.getenv("CRONJOB_APPLY_WORKERS", "16"))
+APPLY_CONTENT_TYPE = "application/apply-patch+yaml"
+
+
+def cronjob_manifest(job_name, schedule, yaml_path, suspend=False, content_hash=None):
+    runner_image = os.getenv("RUNNER_IMAGE", "batch-runner:latest")
+    metadata = {"name": job_name, "labels": dict(CRONJOB_LABELS)}
+    if content_hash:
+        metadata["annotations"] = {HASH_ANNOTATION: content_hash}
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "CronJob",
+        "metadata": metadata,
+        "spec": {
+            "schedule": schedule,
+            "suspend": suspend,
+            "jobTemplate": {"spec": {"template": {"spec": {
+                "containers": [{
+                    "name": "runner",
+                    "image": runner_image,
+                    "imagePullPolicy": "Never",
+                    "command": ["python", "runner.py", yaml_path],
+                    "env": [{
+                        "name": "CONN_STR",
+                        "valueFrom": {"secretKeyRef": {"name": "db-credentials", "key": "conn_str"}},
+                    }],
+                    "volumeMounts": [{"name": "export-volume", "mountPath": "/app/data/exports"}],
+                }],
+                "volumes": [{
+                    "name": "export-volume",
+                    "persistentVolumeClaim": {"claimName": "job-exports-pvc"},
+                }],
+                "restartPolicy": "Never",
+            }}}},
+        },
+    }
+
+
+def cronjob_state(cj):
+    # What the diff looks at: (suspend, content hash annotation, schedule)
+    return bool(cj.spec.suspend), (cj.metadata.annotations or {}).get(HASH_ANNOTATION), cj.spec.schedule
+
+
+def is_generated(cj):
+    labels = cj.metadata.labels or {}
+    return all(labels.get(k) == v for k, v in CRONJOB_LABELS.items())
+
+
+class CronJobApplier:
+    # Server-side apply under one field manager: the API server merges, nothing is deleted and recreated,
+    # so CronJob history and lastScheduleTime survive an update.
+
+    def __init__(self, api, namespace=NAMESPACE, field_manager=FIELD_MANAGER, max_workers=APPLY_WORKERS):
+        self.api = api
+        self.namespace = namespace
+        self.field_manager = field_manager
+        self.max_workers = max(1, max_workers)
+
+    def live_state(self):
+        cronjobs = self.api.list_namespaced_cron_job(namespace=self.namespace, label_selector=CRONJOB_SELECTOR).items
+        return {cj.metadata.name: cronjob_state(cj) for cj in cronjobs}
+
+    def read_state(self, name):
+        from kubernetes.client.exceptions import ApiException
+        try:
+            cj = self.api.read_namespaced_cron_job(name=name, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        return cronjob_state(cj) if is_generated(cj) else None
+
+    def apply(self, manifest):
+        return self.api.patch_namespaced_cron_job(
+            name=manifest["metadata"]["name"], namespace=self.namespace, body=manifest,
+            field_manager=self.field_manager, force=True, _content_type=APPLY_CONTENT_TYPE,
+        )
+
+    def delete(self, name):
+        return self.api.delete_namespaced_cron_job(name=name, namespace=self.namespace)
+
+    def run_one(self, name, action, manifest=None):
+        started = time.perf_counter()
+        error = None
+        try:
+            if action == "delete":
+                self.delete(name)
+            else:
+                self.apply(manifest)
+        except Exception as e:
+            error = str(e)
+        return {"name": name, "action": action, "seconds": time.perf_counter() - started, "error": error}
+
+    def run(self, operations):
+        # operations: (name, action, manifest) tuples; manifest is None for deletes
+        if not operations:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations)), thread_name_prefix="cronjob-apply") as pool:
+            return list(pool.map(lambda op: self.run_one(*op), operations))
+
+
+def report(results, elapsed):
+    if not results:
+        return
+    counts = {}
+    for result in results:
+        counts[result["action"]] = counts.get(result["action"], 0) + 1
+    latencies = sorted(r["seconds"] for r in results)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    summary = ", ".join(f"{action} {count}" for action, count in sorted(counts.items()))
+    print(f"⚡ Applied {len(results)} CronJob change(s) in {elapsed:.2f}s ({summary}); "
+          f"per call p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, max {latencies[-1] * 1000:.0f}ms")
+
+    for result in sorted(results, key=lambda r: -r["seconds"])[:5]:
+        print(f"   {result['name']}: {result['action']} {result['seconds'] * 1000:.0f}ms")
+    for result in results:
+        if result["error"]:
+            print(f"❌ Failed to {result['action']} CronJob {result['name']}: {result['error']}")
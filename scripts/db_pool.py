@@ -0,0 +1,204 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import ibm_db
+
+# A running job holds one connection for the extract and needs another for metadata writes
+POOL_SIZE = max(2, int(os.getenv("DB_POOL_SIZE", "4")))
+# Connections idle for longer than this get a round trip before being reused
+HEALTH_CHECK_AFTER = float(os.getenv("DB_HEALTH_CHECK_AFTER", "30"))
+# SQLSTATE classes that mean the connection itself is gone
+_CONNECTION_LOST = ("SQLSTATE=08", "SQLSTATE=40003", "SQL30081N", "SQL30108N")
+
+_stats_lock = threading.Lock()
+_connects = 0
+_first_query_at = None
+
+
+def connect_count():
+    return _connects
+
+
+def first_query_at():
+    # time.time() of the first statement sent through any pool in this process
+    return _first_query_at
+
+
+def _is_connection_error(err):
+    message = str(err)
+    return any(marker in message for marker in _CONNECTION_LOST)
+
+
+def _mark_first_query():
+    global _first_query_at
+    if _first_query_at is None:
+        _first_query_at = time.time()
+
+
+class PooledConnection:
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        self.conn = None
+        self.last_used = 0.0
+        self.in_transaction = False
+        self._statements = {}
+
+    def open(self):
+        global _connects
+        self.close()
+        self.conn = ibm_db.connect(self.conn_str, "", "")
+        self._statements = {}
+        self.last_used = time.monotonic()
+        with _stats_lock:
+            _connects += 1
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                ibm_db.close(self.conn)
+            except Exception:
+                pass
+        self.conn = None
+        self._statements = {}
+
+    def is_healthy(self):
+        if self.conn is None or not ibm_db.active(self.conn):
+            return False
+        if time.monotonic() - self.last_used < HEALTH_CHECK_AFTER:
+            return True
+        try:
+            ibm_db.exec_immediate(self.conn, "SELECT 1 FROM sysibm.sysdummy1")
+            return True
+        except Exception:
+            return False
+
+    def ensure_open(self):
+        if not self.is_healthy():
+            self.open()
+
+    def prepare(self, sql):
+        stmt = self._statements.get(sql)
+        if stmt is None:
+            stmt = ibm_db.prepare(self.conn, sql)
+            self._statements[sql] = stmt
+        return stmt
+
+    def execute(self, sql, params=()):
+        _mark_first_query()
+        try:
+            stmt = self.prepare(sql)
+            ibm_db.execute(stmt, tuple(params))
+        except Exception as e:
+            if self.in_transaction or (self.conn is not None and ibm_db.active(self.conn) and not _is_connection_error(e)):
+                raise
+            # Transparent reconnect, retried once
+            self.open()
+            stmt = self.prepare(sql)
+            ibm_db.execute(stmt, tuple(params))
+        self.last_used = time.monotonic()
+        return stmt
+
+    @contextmanager
+    def transaction(self):
+        # No transparent reconnect in here, the statements already sent would be lost
+        ibm_db.autocommit(self.conn, ibm_db.SQL_AUTOCOMMIT_OFF)
+        self.in_transaction = True
+        try:
+            yield self
+            ibm_db.commit(self.conn)
+        except Exception:
+            try:
+                ibm_db.rollback(self.conn)
+            except Exception:
+                pass
+            raise
+        finally:
+            self.in_transaction = False
+            if self.conn is not None and ibm_db.active(self.conn):
+                ibm_db.autocommit(self.conn, ibm_db.SQL_AUTOCOMMIT_ON)
+
+    def exec_immediate(self, sql):
+        _mark_first_query()
+        self.last_used = time.monotonic()
+        return ibm_db.exec_immediate(self.conn, sql)
+
+    def cursor(self, sql, params=(), options=None):
+        # One-shot statements with their own cursor attributes, kept out of the prepared statement cache
+        _mark_first_query()
+        stmt = ibm_db.prepare(self.conn, sql, options or {})
+        ibm_db.execute(stmt, tuple(params))
+        self.last_used = time.monotonic()
+        return stmt
+
+
+class ConnectionPool:
+    def __init__(self, conn_str, max_size=POOL_SIZE):
+        if not conn_str:
+            raise ValueError("CONN_STR not set in environment")
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        with self._lock:
+            pooled = self._idle.pop() if self._idle else PooledConnection(self.conn_str)
+        try:
+            pooled.ensure_open()
+            yield pooled
+        except Exception:
+            if pooled.conn is not None and not ibm_db.active(pooled.conn):
+                pooled.close()
+            raise
+        finally:
+            with self._lock:
+                self._idle.append(pooled)
+            self._slots.release()
+
+    def execute(self, sql, params=()):
+        with self.connection() as db:
+            db.execute(sql, params)
+
+    def fetch_one(self, sql, params=()):
+        with self.connection() as db:
+            return ibm_db.fetch_assoc(db.execute(sql, params)) or None
+
+    def fetch_all(self, sql, params=()):
+        with self.connection() as db:
+            stmt = db.execute(sql, params)
+            rows = []
+            while row := ibm_db.fetch_assoc(stmt):
+                rows.append(row)
+            return rows
+
+    def close_all(self):
+        with self._lock:
+            for pooled in self._idle:
+                pooled.close()
+            self._idle = []
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_str=None, max_size=None):
+    # max_size only applies when the pool is created, i.e. on the first call for a conn_str
+    conn_str = conn_str or os.getenv("CONN_STR")
+    with _pools_lock:
+        pool = _pools.get(conn_str)
+        if pool is None:
+            pool = _pools[conn_str] = ConnectionPool(conn_str, max(2, max_size or POOL_SIZE))
+        return pool
+
+
+@atexit.register
+def close_all_pools():
+    for pool in list(_pools.values()):
+        pool.close_all()
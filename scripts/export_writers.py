@@ -0,0 +1,286 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+from decimal import Decimal
+
+FORMATS = {"csv", "parquet", "arrow", "ndjson"}
+EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+COMPRESSIONS = {
+    "csv": {None, "gzip"},
+    "ndjson": {None, "gzip"},
+    "parquet": {None, "snappy", "gzip", "zstd", "lz4", "brotli"},
+    "arrow": {None, "lz4", "zstd"},
+}
+DEFAULT_COMPRESSION = {"csv": None, "ndjson": None, "parquet": "zstd", "arrow": "lz4"}
+
+
+def resolve_format(output, fmt=None, compression=None):
+    if fmt is None:
+        _, ext = os.path.splitext(output.removesuffix(".gz"))
+        fmt = EXTENSIONS.get(ext.lower(), "csv")
+        if compression is None and output.endswith(".gz"):
+            compression = "gzip"
+    fmt = fmt.lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}'. Expected one of {sorted(FORMATS)}")
+
+    if compression is None:
+        compression = DEFAULT_COMPRESSION[fmt]
+    elif str(compression).lower() in ("none", "false", "uncompressed"):
+        compression = None
+    else:
+        compression = str(compression).lower()
+
+    if compression not in COMPRESSIONS[fmt]:
+        raise ValueError(f"Compression '{compression}' is not supported for {fmt} output")
+    return fmt, compression
+
+
+def split_output(output):
+    # "a.csv.gz" -> ("a", ".csv.gz")
+    stem, ext = os.path.splitext(output)
+    if ext == ".gz":
+        stem, inner = os.path.splitext(stem)
+        ext = inner + ext
+    return stem, ext
+
+
+def describe_columns(stmt):
+    import ibm_db
+    return [
+        {
+            "name": ibm_db.field_name(stmt, i),
+            "type": ibm_db.field_type(stmt, i),
+            "precision": ibm_db.field_precision(stmt, i),
+            "scale": ibm_db.field_scale(stmt, i),
+        }
+        for i in range(ibm_db.num_fields(stmt))
+    ]
+
+
+def arrow_type(column):
+    import pyarrow as pa
+    db_type = column["type"]
+    if db_type == "int":
+        return pa.int32()
+    if db_type == "bigint":
+        return pa.int64()
+    if db_type == "real":
+        return pa.float64()
+    if db_type == "decimal":
+        precision, scale = column["precision"], column["scale"]
+        if 0 < precision <= 38:
+            return pa.decimal128(precision, scale)
+        return pa.float64()  # DECFLOAT
+    if db_type == "date":
+        return pa.date32()
+    if db_type == "time":
+        return pa.time64("us")
+    if db_type == "timestamp":
+        return pa.timestamp("us")
+    if db_type == "boolean":
+        return pa.bool_()
+    if db_type == "blob":
+        return pa.binary()
+    return pa.string()
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+    return pa.schema([(c["name"], arrow_type(c)) for c in columns])
+
+
+def to_record_batch(rows, schema):
+    import pyarrow as pa
+    arrays = []
+    for values, field in zip(zip(*rows), schema):
+        if pa.types.is_decimal(field.type):
+            # ibm_db hands DECIMAL back as strings
+            values = [Decimal(v) if isinstance(v, str) else v for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class CsvWriter:
+    def __init__(self, path, columns, compression=None, append=False, schema=None):
+        # Appending to a gzip file adds a new member, which readers handle transparently
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        mode = "at" if append else "wt"
+        if compression == "gzip":
+            self._file = gzip.open(path, mode, newline="")
+        else:
+            self._file = open(path, mode, newline="")
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow([c["name"] for c in columns])
+
+    def write_batch(self, rows):
+        self._writer.writerows(rows)
+
+    def write_arrow(self, record_batch):
+        self._writer.writerows(rows_from_arrow(record_batch))
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns, compression=None, append=False, schema=None):
+        import pyarrow.parquet as pq
+        self.schema = schema if schema is not None else arrow_schema(columns)
+        self._writer = pq.ParquetWriter(path, self.schema, compression=compression or "none")
+
+    def write_batch(self, rows):
+        self.write_arrow(to_record_batch(rows, self.schema))
+
+    def write_arrow(self, record_batch):
+        # One row group per fetched batch
+        self._writer.write_batch(record_batch)
+
+    def close(self):
+        self._writer.close()
+
+
+class ArrowWriter:
+    def __init__(self, path, columns, compression=None, append=False, schema=None):
+        import pyarrow as pa
+        self.schema = schema if schema is not None else arrow_schema(columns)
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        self._sink = pa.OSFile(path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, self.schema, options=options)
+
+    def write_batch(self, rows):
+        self.write_arrow(to_record_batch(rows, self.schema))
+
+    def write_arrow(self, record_batch):
+        self._writer.write_batch(record_batch)
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+
+class NdjsonWriter:
+    def __init__(self, path, columns, compression=None, append=False, schema=None):
+        self.schema = schema if schema is not None else arrow_schema(columns)
+        mode = "ab" if append else "wb"
+        self._file = gzip.open(path, mode) if compression == "gzip" else open(path, mode)
+
+    def write_batch(self, rows):
+        self.write_arrow(to_record_batch(rows, self.schema))
+
+    def write_arrow(self, record_batch):
+        import polars as pl
+        buffer = io.BytesIO()
+        pl.from_arrow(record_batch).write_ndjson(buffer)
+        self._file.write(buffer.getvalue())
+
+    def close(self):
+        self._file.close()
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+    "ndjson": NdjsonWriter,
+}
+
+
+def open_writer(path, fmt, columns, compression=None, append=False, schema=None):
+    # Only csv and ndjson can be appended to; parquet/arrow always start a new file
+    return WRITERS[fmt](path, columns, compression, append, schema)
+
+
+def rows_from_arrow(record_batch):
+    return list(zip(*[column.to_pylist() for column in record_batch.columns]))
+
+
+def merge_parts(part_paths, output_path, fmt, compression=None):
+    # Every part was written with the same columns, so they're stitched together without re-reading rows where possible
+    if fmt == "csv":
+        opener = gzip.open if compression == "gzip" else open
+        with opener(output_path, "wt", newline="") as out:
+            for i, path in enumerate(part_paths):
+                with opener(path, "rt", newline="") as part:
+                    header = part.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(part, out)
+    elif fmt == "ndjson":
+        # No header, and concatenated gzip members are still one valid gzip file
+        with open(output_path, "wb") as out:
+            for path in part_paths:
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, out)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for path in part_paths:
+                part = pq.ParquetFile(path)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, part.schema_arrow, compression=compression or "none")
+                for i in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(i))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        import pyarrow as pa
+        writer, sink = None, None
+        try:
+            for path in part_paths:
+                with pa.OSFile(path, "rb") as source:
+                    reader = pa.ipc.open_file(source)
+                    if writer is None:
+                        sink = pa.OSFile(output_path, "wb")
+                        writer = pa.ipc.new_file(sink, reader.schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+                    for i in range(reader.num_record_batches):
+                        writer.write_batch(reader.get_batch(i))
+        finally:
+            if writer is not None:
+                writer.close()
+            if sink is not None:
+                sink.close()
+
+
+def count_rows(path, fmt, compression=None):
+    # Rows in an exported file, for appended outputs without a manifest to add up from
+    if fmt in ("parquet", "arrow"):
+        return read_table([path], fmt).num_rows
+    opener = gzip.open if compression == "gzip" else open
+    with opener(path, "rt", newline="") as f:
+        if fmt == "csv":
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+        return sum(1 for line in f if line.strip())
+
+
+def read_table(paths, fmt):
+    # Reads exported file(s) back into one pyarrow Table; compressed csv/ndjson are detected from the .gz suffix
+    import pyarrow as pa
+    tables = []
+    for path in paths:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            tables.append(pq.read_table(path))
+        elif fmt == "arrow":
+            with pa.memory_map(path, "rb") as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+        elif fmt == "csv":
+            import pyarrow.csv as pacsv
+            tables.append(pacsv.read_csv(path))
+        else:
+            import pyarrow.json as pajson
+            tables.append(pajson.read_json(path))
+    return pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
@@ -0,0 +1,130 @@
+import re
+import time
+from contextlib import contextmanager
+
+import ibm_db
+
+ISOLATION_LEVELS = {"ur", "cs", "rs", "rr"}
+PHASES = ("execute", "fetch", "serialize", "write")
+# Queries that already say how they want to be read are left alone
+_READ_CLAUSE = re.compile(r"\bFOR\s+(READ|FETCH)\s+ONLY\b|\bFOR\s+UPDATE\b", re.I)
+_ISOLATION_CLAUSE = re.compile(r"\bWITH\s+(UR|CS|RS|RR)\s*$", re.I)
+
+
+def parse_extract(spec, batch_size):
+    spec = spec or {}
+    isolation = spec.get("isolation")
+    if isolation is not None:
+        isolation = str(isolation).lower()
+        if isolation not in ISOLATION_LEVELS:
+            raise ValueError(f"Unknown isolation '{isolation}'. Expected one of {sorted(ISOLATION_LEVELS)}")
+    fetch_size = int(spec.get("fetch_size", batch_size))
+    if fetch_size <= 0:
+        raise ValueError("extract.fetch_size must be a positive number of rows")
+    timeout = spec.get("timeout")
+    return {
+        "fetch_size": fetch_size,
+        "prefetch": bool(spec.get("prefetch", False)),
+        "read_only": bool(spec.get("read_only", False)),
+        "isolation": isolation,
+        "timeout": int(timeout) if timeout else None,
+    }
+
+
+def decorate_query(query, spec):
+    sql = query.strip().rstrip(";")
+    if _ISOLATION_CLAUSE.search(sql):
+        # The isolation clause has to come last, nothing can be appended after it
+        return sql
+    if spec["read_only"] and not _READ_CLAUSE.search(sql):
+        # Lets DB2 block rows to the client instead of shipping them one at a time
+        sql += " FOR READ ONLY"
+    if spec["isolation"]:
+        sql += f" WITH {spec['isolation'].upper()}"
+    return sql
+
+
+def statement_options(spec, remaining=None):
+    # Export cursors only ever move forward
+    options = {ibm_db.SQL_ATTR_CURSOR_TYPE: ibm_db.SQL_CURSOR_FORWARD_ONLY}
+    if spec["prefetch"]:
+        options[ibm_db.SQL_ATTR_ROWCOUNT_PREFETCH] = ibm_db.SQL_ROWCOUNT_PREFETCH_ON
+    # remaining: what's left of the job's own timeout, if it has one
+    timeouts = [t for t in (spec["timeout"], remaining) if t]
+    if timeouts:
+        options[ibm_db.SQL_ATTR_QUERY_TIMEOUT] = max(1, int(min(timeouts)))
+    return options
+
+
+def expected_rows(stmt):
+    # Only known up front with prefetch on, -1 otherwise
+    try:
+        total = ibm_db.num_rows(stmt)
+    except Exception:
+        return None
+    return total if total and total > 0 else None
+
+
+def fetch_batches(stmt, batch_size, fetch_size=None):
+    # Yields lists of at most batch_size tuples so only one batch is ever held in memory
+    fetchmany = getattr(ibm_db, "fetchmany", None)
+    if fetchmany is not None:
+        yield from _fetchmany_batches(fetchmany, stmt, batch_size, fetch_size or batch_size)
+        return
+
+    # One preallocated buffer, filled by index: consumers are done with a batch before the next fetch
+    buffer = [None] * batch_size
+    n = 0
+    fetch_tuple = ibm_db.fetch_tuple
+    row = fetch_tuple(stmt)
+    while row:
+        buffer[n] = row
+        n += 1
+        if n == batch_size:
+            yield buffer
+            n = 0
+        row = fetch_tuple(stmt)
+    if n:
+        yield buffer[:n]
+
+
+def _fetchmany_batches(fetchmany, stmt, batch_size, fetch_size):
+    batch = []
+    while True:
+        rows = fetchmany(stmt, fetch_size)
+        if not rows:
+            break
+        batch.extend(rows)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.current = None  # read by the live progress snapshots
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        outer, self.current = self.current, name
+        try:
+            yield
+        finally:
+            self.current = outer
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def add(self, other):
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def summary(self):
+        total = sum(self.seconds.values())
+        parts = []
+        for name, seconds in self.seconds.items():
+            share = f" ({seconds / total * 100:.0f}%)" if total > 0 else ""
+            parts.append(f"{name} {seconds:.2f}s{share}")
+        return "Phases: " + ", ".join(parts)
@@ -1,31 +1,62 @@
 import time
-import csv
-import polars as pl
-from yaml import safe_load
-from dotenv import load_dotenv
+import yaml
 import os
 import platform
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 
-driver_path = os.getenv("DB2_DRIVER_PATH")
-if driver_path and platform.system() == "Windows":
-    os.add_dll_directory(driver_path)
+# Startup matters for short CronJob pods: polars, pyarrow and dotenv are only imported when actually used
+if platform.system() == "Windows":
+    driver_path = os.getenv("DB2_DRIVER_PATH")
+    if driver_path:
+        os.add_dll_directory(driver_path)
 
 
 from scripts.color_classes import bcolors
+from scripts.db_pool import get_pool
+from scripts.log_sink import get_sink
+from scripts.export_writers import (describe_columns, open_writer, resolve_format, rows_from_arrow, to_record_batch,
+                                    merge_parts, arrow_schema, read_table)
+from scripts import incremental, partitions, checkpoints, publish, transforms, shared_scan, admission
+from scripts.progress import RunProgress
+from scripts.partitions import PARTITION_RETRY_DELAY
+from scripts.extract import PhaseTimer, parse_extract, decorate_query, statement_options, expected_rows, fetch_batches
+from scripts.registration import required_fields, YamlLoader
+from scripts.result_cache import ResultCache, cache_key, parse_cache, iter_cached_batches, cached_schema
 
 import ibm_db
 
-load_dotenv()
+# In the cluster CONN_STR comes from the db-credentials secret, .env is only for local runs
+if not os.getenv("CONN_STR"):
+    from dotenv import load_dotenv
+    load_dotenv()
 conn_str = os.getenv("CONN_STR")
-REQUIRED_FIELDS = {"job_name", "type", "query", "output"}
+DEFAULT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+DEFAULT_PROGRESS_EVERY = int(os.getenv("LOG_PROGRESS_EVERY", "10"))
+# Rows shown from the first batch, 0 turns the preview off
+DEFAULT_PREVIEW_ROWS = int(os.getenv("EXPORT_PREVIEW_ROWS", "10"))
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
 
 class JobFile:
     def __init__(self, yaml_path):
         self.run_id = None
+        self.job_id = None
+        # job_logs.run_id is NOT NULL, so messages logged before the first run row are held here
+        self._pending_logs = []
         with open(yaml_path, 'r') as f:
-            self._data = safe_load(f)
+            self._data = yaml.load(f, Loader=YamlLoader)
 
-        missing = REQUIRED_FIELDS - self._data.keys()
+        missing = required_fields(self._data) - self._data.keys()
         if missing:
             raise ValueError(f"Missing required fields: {missing}")
 
@@ -43,7 +74,70 @@ class JobFile:
             setattr(self, key, value)
 
         self.start_time = None
+        self.resumed = False
+        self.progress = RunProgress(self)
         self.end_time = None
+        self.rows_exported = 0
+        self.bytes_written = 0
+        self.queue_seconds = None
+        self.batch_size = int(self._data.get("batch_size", DEFAULT_BATCH_SIZE))
+        self.log_progress_every = int(self._data.get("log_progress_every", DEFAULT_PROGRESS_EVERY))
+        self.extract = parse_extract(self._data.get("extract"), self.batch_size)
+        self.timer = PhaseTimer()
+        preview = self._data.get("preview", DEFAULT_PREVIEW_ROWS)
+        self.preview_rows = 0 if preview is False else DEFAULT_PREVIEW_ROWS if preview is True else int(preview)
+        self.format, self.compression = resolve_format(
+            self.output, self._data.get("format"), self._data.get("compression")
+        )
+        self.incremental = incremental.parse_incremental(self._data.get("incremental"), self.format)
+        self.cache = parse_cache(self._data.get("cache"))
+        self.cache_hit = False
+        if self.cache and self.incremental:
+            # Every incremental run has a new watermark, a cached result could never be reused
+            self.log("cache is ignored for incremental jobs", "warning")
+            self.cache = None
+        self.partition = partitions.parse_partition(self._data.get("partition"), self.incremental)
+        if self.cache and self.partition:
+            self.log("cache is ignored for partitioned jobs", "warning")
+            self.cache = None
+        if self.partition:
+            # The pool size is fixed when it's first created, which is right here for a standalone runner
+            get_pool(conn_str, max_size=self.partition["parallel"] + 2)
+        self.retry = checkpoints.parse_retry(self._data)
+        if self.retry["checkpoint_column"]:
+            if self.incremental or self.partition:
+                # A partitioned job checkpoints per partition already, incremental runs are small to begin with
+                self.log("checkpoint is ignored for incremental and partitioned jobs", "warning")
+                self.retry["checkpoint_column"] = None
+            elif self.cache:
+                self.log("cache is ignored for checkpointed jobs", "warning")
+                self.cache = None
+        self.deadline = None
+        # Per-run file names (<stem>.run<run_id><ext>) and how many of them the PV keeps
+        self.versioned = bool(self._data.get("versioned", False))
+        self.retention = publish.parse_retention(self._data.get("retention"))
+        if self.versioned and self.incremental and self.incremental["mode"] == "append":
+            self.log("versioned is ignored for incremental append jobs, they always append to the same file", "warning")
+            self.versioned = False
+        self.outputs, self.columns = [], None
+        # scan: {table, columns, where} instead of a query, lets run_all --shared-scan read the table once for several jobs
+        self.scan = shared_scan.parse_scan(self._data.get("scan"))
+        if self.scan:
+            if self._data.get("query"):
+                raise ValueError("Define either `query` or `scan`, not both")
+            self.query = shared_scan.build_query(self.scan)
+        self.shared_feed = None
+        self.depends_on = transforms.parse_depends_on(self._data.get("depends_on"))
+        self.is_transform = self._data.get("type") == transforms.TRANSFORM_TYPE
+        if self.is_transform:
+            self.transform = transforms.parse_transform(self._data["transform"], self.depends_on)
+            self.query = None
+            if self.incremental or self.partition or self.cache or self.retry["checkpoint_column"]:
+                raise ValueError("incremental, partition, cache and checkpoint don't apply to transform jobs")
+        # Set by the DAG executor: the results of depends_on by job name, and whether a downstream job needs ours
+        self.inputs = {}
+        self.keep_result = False
+        self._result_batches, self._result_schema = None, None
         
         
         self.is_active = self._data.get("is_active", True)
@@ -54,72 +148,68 @@ class JobFile:
         self.status = "PENDING"
 
     def set_status(self, status, conn_str=conn_str):
-        conn = ibm_db.connect(conn_str, '', '')
-        job_id = self.get_id()
+        job_id = self.get_id(conn_str)
 
         # Ensure timestamp formatting
         start_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start_time)) if self.start_time else None
         end_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.end_time)) if self.end_time else None
 
-        if not hasattr(self, 'run_id') or self.run_id is None:
-            insert_stmt = ibm_db.prepare(conn,
-                "INSERT INTO job_mgmt.job_runs (job_id, started_at, ended_at, status) VALUES (?, ?, ?, ?)"
-            )
-            ibm_db.execute(insert_stmt, (job_id, start_time, end_time, status))
+        with get_pool(conn_str).connection() as db:
+            if not hasattr(self, 'run_id') or self.run_id is None:
+                db.execute(
+                    "INSERT INTO job_mgmt.job_runs (job_id, started_at, ended_at, status, cache_hit, rows_exported, bytes_written, "
+                    "queue_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, start_time, end_time, status, int(self.cache_hit), self.rows_exported, self.bytes_written,
+                     self.queue_seconds)
+                )
 
-            # Retrieve the last inserted run_id
-            id_stmt = ibm_db.exec_immediate(conn, "SELECT IDENTITY_VAL_LOCAL() FROM sysibm.sysdummy1")
-            row = ibm_db.fetch_assoc(id_stmt)
-            self.run_id = row["1"]
+                # Retrieve the last inserted run_id (same connection, IDENTITY_VAL_LOCAL is per session)
+                row = ibm_db.fetch_assoc(db.execute("SELECT IDENTITY_VAL_LOCAL() FROM sysibm.sysdummy1"))
+                self.run_id = row["1"]
 
-        else:
-            update_stmt = ibm_db.prepare(conn,
-                "UPDATE job_mgmt.job_runs SET job_id = ?, started_at = ?, ended_at = ?, status = ? WHERE run_id = ?"
-            )
-            ibm_db.execute(update_stmt, (job_id, start_time, end_time, status, self.run_id))
+                sink = get_sink(conn_str)
+                for log_time, log_message in self._pending_logs:
+                    sink.emit(self.run_id, log_time, log_message)
+                self._pending_logs = []
 
-        self.status = status
+            else:
+                db.execute(
+                    "UPDATE job_mgmt.job_runs SET job_id = ?, started_at = ?, ended_at = ?, status = ?, cache_hit = ?, "
+                    "rows_exported = ?, bytes_written = ?, queue_seconds = ? WHERE run_id = ?",
+                    (job_id, start_time, end_time, status, int(self.cache_hit),
+                     self.rows_exported, self.bytes_written, self.queue_seconds, self.run_id)
+                )
 
-        if conn:
-            ibm_db.close(conn)
+        self.status = status
 
     def get_id(self, conn_str=conn_str):
-        conn = ibm_db.connect(conn_str, '', '')
-        stmt = "SELECT job_id FROM job_mgmt.jobs WHERE job_name = ?"
-        stmt_prepared = ibm_db.prepare(conn, stmt)
-        ibm_db.execute(stmt_prepared, (self.job_name,))
-        result = ibm_db.fetch_assoc(stmt_prepared)
-
-        if result:
-            job_id = result['JOB_ID']
-        else:
-            job_id = None
-        
-        if conn:
-            ibm_db.close(conn)
-        
-        return job_id
+        # job_id never changes once the job exists, so it's only looked up once
+        if self.job_id is None:
+            result = get_pool(conn_str).fetch_one(
+                "SELECT job_id FROM job_mgmt.jobs WHERE job_name = ?", (self.job_name,)
+            )
+            self.job_id = result['JOB_ID'] if result else None
 
-    def insert_job(self, conn_str=conn_str):
-        conn = ibm_db.connect(conn_str, '', '')
+        return self.job_id
 
-        job_id = self.get_id()
+    def insert_job(self, conn_str=conn_str):
+        job_id = self.get_id(conn_str)
 
         # If job doesn't exist, insert it
         if job_id is None:
-            insert_stmt = ibm_db.prepare(conn,
-                "INSERT INTO job_mgmt.jobs (job_name, schedule, is_active, created_at) VALUES (?, ?, ?, ?)"
-            )
-            ibm_db.execute(insert_stmt, (self.job_name, self.schedule, self.is_active, self.created_at))
+            with get_pool(conn_str).connection() as db:
+                db.execute(
+                    "INSERT INTO job_mgmt.jobs (job_name, schedule, is_active, created_at) VALUES (?, ?, ?, ?)",
+                    (self.job_name, self.schedule, self.is_active, self.created_at)
+                )
+                row = ibm_db.fetch_assoc(db.execute("SELECT IDENTITY_VAL_LOCAL() FROM sysibm.sysdummy1"))
+                self.job_id = row["1"]
 
             self.log(f"Successfully inserted job '{self.job_name}' into the database.")
         else:
             self.set_status(None)
             self.log(f"Warning: No job inserted : {self.job_name} already exists under id {job_id}.", "warning")
 
-        if conn:
-            ibm_db.close(conn)
-
     def log(self, log_message, type="normal", debug=True,conn_str=conn_str):
         
         if type == "fail":
@@ -130,11 +220,6 @@ class JobFile:
             print(f"\n{log_message}\n")
 
         run_id = self.run_id
-        conn = ibm_db.connect(conn_str, '', '')
-        log_stmt = ibm_db.prepare(conn,
-            "INSERT INTO job_mgmt.job_logs (run_id, log_time, message) VALUES (?, ?, ?)"
-        )
-
         log_time = time.strftime("%Y-%m-%d %H:%M:%S")
 
         if debug:
@@ -143,54 +228,100 @@ class JobFile:
             print(f"message : {log_message}")
 
 
-        ibm_db.execute(log_stmt, (run_id,log_time,log_message))
-
-        if conn:
-            ibm_db.close(conn)
+        # Buffered and flushed to job_logs in batches by a background thread
+        if run_id is None:
+            self._pending_logs.append((log_time, log_message))
+        else:
+            get_sink(conn_str).emit(run_id, log_time, log_message)
 
     def run(self, conn_str=conn_str,  output_dir="/app/data/exports"):
         self.start_time = time.time()
-        start_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start_time))
-        self.set_status("RUNNING")
-        self.log(f"Started Running job {self.job_name} at {start_time}")
+        self.cache_hit = False
+        self.rows_exported = 0
+        self.bytes_written = 0
+        self.queue_seconds = None
+        self.timer = PhaseTimer()
+        pool = get_pool(conn_str)
+        self.checkpoint_hash = checkpoints.spec_hash(self.query, self.output, self.format, self.compression,
+                                                     self.partition, self.retry["checkpoint_column"])
+
+        first_attempt = 1
+        self.resumed = False
+        resumed = self.best_effort(checkpoints.find_resumable, pool, self.get_id(conn_str), self.checkpoint_hash) \
+            if self.retry["retries"] else None
+        if resumed:
+            if self.run_id is not None:
+                # The run row insert_job opened for this pod is superseded by the resumed one. It gets an end
+                # time, so nothing (the exporter's active runs) keeps waiting for it to finish.
+                self.end_time = self.start_time
+                self.set_status("RESUMED")
+                self.end_time = None
+            self.run_id, started_at = resumed
+            self.resumed = True
+            self.start_time = started_at or self.start_time
+            first_attempt = checkpoints.last_attempt(pool, self.run_id) + 1
+            self.log(f"Resuming failed run {self.run_id} from its checkpoints (attempt {first_attempt})")
 
         is_successful = False
-        conn = None
+        last_attempt = first_attempt + self.retry["retries"]
+        lease = None
+        # Rows, bytes, phase and memory of this run, for the exporter while it's still running
+        self.progress.start(output_dir)
 
         try:
-            conn = ibm_db.connect(conn_str, '', '')
-            stmt = ibm_db.exec_immediate(conn, self.query)
-
-            rows = []
-            header = [ibm_db.field_name(stmt, i) for i in range(ibm_db.num_fields(stmt))]
-
-            row = ibm_db.fetch_assoc(stmt)
-            while row:
-                rows.append(row)
-                row = ibm_db.fetch_assoc(stmt)
-
-            # Convert to Polars DataFrame and preview
-            try:
-                df = pl.DataFrame(rows)
-                print(f"{bcolors.OKCYAN}Result Preview (Polars DataFrame):{bcolors.ENDC}")
-                print(df.head(10))
-            except Exception as df_err:
-                print(f"{bcolors.WARNING}Could not display DataFrame preview: {df_err}{bcolors.ENDC}")
-
-            # Write to CSV
-            output_path = f"{output_dir}/{self.output}"
-            with open(output_path, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=header)
-                writer.writeheader()
-                writer.writerows(rows)
-
-            is_successful = True
+            lease = self.admit(pool)
+            # The run's duration starts once it's admitted, the wait is in queue_seconds.
+            # A resumed run keeps the started_at of its first attempt.
+            if lease is not None and not self.resumed:
+                self.start_time = time.time()
+            start_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start_time))
+            self.set_status("RUNNING")
+            self.log(f"Started Running job {self.job_name} at {start_time}")
+
+            for attempt in range(first_attempt, last_attempt + 1):
+                self.record_attempt(pool, attempt, "RUNNING")
+                try:
+                    self.deadline = time.monotonic() + self.retry["timeout"] if self.retry["timeout"] else None
+                    # Transforms and shared scans don't query DB2 themselves, they needn't hold a connection.
+                    # Partitioned jobs take one per partition: holding one while waiting on them could starve the pool.
+                    with (nullcontext() if self.is_transform or self.shared_feed or self.partition
+                          else pool.connection()) as db:
+                        self.export(db, output_dir)
+                    self.write_manifest(output_dir)
+                    is_successful = True
+                    self.record_attempt(pool, attempt, "SUCCESS")
+                    break
+                except Exception as e:
+                    self.log(f"Error: {e}", "fail")
+                    self.record_attempt(pool, attempt, "FAILURE", e)
+                    # A broken job definition fails the same way every time
+                    if attempt == last_attempt or isinstance(e, ValueError):
+                        break
+                    delay = checkpoints.backoff_delay(self.retry, attempt - first_attempt + 1)
+                    self.best_effort(self.set_status, "RETRYING")
+                    self.log(f"Attempt {attempt} failed, retrying in {delay:.0f}s ({last_attempt - attempt} left)", "warning")
+                    # The run slot is given back while backing off, a failing job mustn't sit on it doing nothing
+                    if lease is not None:
+                        self.release_lease(lease)
+                        lease = None
+                    time.sleep(delay)
+                    lease = self.admit(pool)
+                    if lease is not None:
+                        self.set_status("RETRYING")
+
+            if is_successful and self.retry["retries"]:
+                self.best_effort(checkpoints.clear_all, pool, self.run_id)
+            if is_successful:
+                self.collect_garbage(output_dir)
 
         except Exception as e:
+            # Waiting for a run slot (or the status update after it) failed, export errors are handled per attempt
             self.log(f"Error: {e}", "fail")
-            is_successful = False
 
         finally:
+            if lease is not None:
+                self.release_lease(lease)
+            self.deadline = None
             self.end_time = time.time()
             if is_successful == True:
                 self.set_status("SUCCESS") 
@@ -199,10 +330,599 @@ class JobFile:
 
             readable_end = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.end_time))
             self.log(f"Job Ended with Status: {self.status} at time: {readable_end}")
-            
+            self.log(self.export_stats())
+            if not self.cache_hit:
+                self.log(self.timer.summary())
+            self.progress.stop()
+            get_sink(conn_str).flush()
+
+    def admit(self, pool):
+        # Waits for one of the RUN_CONCURRENCY_BUDGET run slots shared by every runner pod.
+        # Transforms and shared-scan members don't send their own query to DB2.
+        if not admission.RUN_CONCURRENCY_BUDGET or self.is_transform or self.shared_feed is not None:
+            return None
+        self.set_status("QUEUED")
+        budget = admission.RUN_CONCURRENCY_BUDGET
+        lease, waited = admission.acquire(
+            pool, self.job_name, self.run_id,
+            on_wait=lambda: self.log(f"All {budget} run slots are taken, waiting in the queue", "warning")
+        )
+        # Retries wait for a slot again, queue_seconds is the run's total wait
+        self.queue_seconds = round((self.queue_seconds or 0) + waited, 3)
+        if waited >= 1:
+            self.log(f"Admitted to run slot {lease.slot} after {waited:.1f}s in the queue")
+        return lease
 
-            if conn:
-                ibm_db.close(conn)
+    def release_lease(self, lease):
+        try:
+            lease.release()
+        except Exception as e:
+            self.log(f"Could not release run slot {lease.slot}, it frees up after {lease.ttl}s: {e}", "warning")
+
+    def skip(self, reason, status="SKIPPED"):
+        # A job whose dependency didn't succeed (or that can't be ordered, INVALID) still gets a closed run row,
+        # so the gap is visible in job_runs and nothing waits for it to end
+        self.start_time = self.end_time = time.time()
+        self.set_status(status)
+        self.log(f"{status.capitalize()} {self.job_name}: {reason}", "warning")
+        get_sink(conn_str).flush()
+
+    def result_table(self):
+        # The rows of the last successful run as a pyarrow Table, for the jobs that depend on this one
+        import pyarrow as pa
+        if self._result_batches is not None and self._result_schema is not None:
+            return pa.Table.from_batches(self._result_batches, schema=self._result_schema)
+        # Resumed and merged-from-checkpoint runs never saw every row go by, read back what was written
+        return read_table([path for path, _ in self.outputs], self.format)
+
+    def record_attempt(self, pool, attempt, status, error=None):
+        # Single-attempt jobs are fully described by their job_runs row
+        if not self.retry["retries"]:
+            return
+        if status == "RUNNING":
+            self.best_effort(checkpoints.start_attempt, pool, self.run_id, attempt)
+        else:
+            self.best_effort(checkpoints.end_attempt, pool, self.run_id, attempt, status, self.rows_exported,
+                             str(error) if error else None)
+
+    def best_effort(self, fn, *args):
+        # Retry bookkeeping must never be the reason a run fails
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.log(f"Could not record retry state ({fn.__name__}): {e}", "warning")
+            return None
+
+    def check_deadline(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeoutError(f"Attempt exceeded the job timeout of {self.retry['timeout']:g}s")
+
+    def remaining(self):
+        return max(1.0, self.deadline - time.monotonic()) if self.deadline is not None else None
+
+    def export(self, db, output_dir):
+        self.outputs, self.columns = [], None
+        self._result_batches, self._result_schema = ([] if self.keep_result else None), None
+        if self.is_transform:
+            self.export_transform(output_dir)
+            return
+        # Only the first attempt reads from a shared scan, retries run the job's own query
+        feed, self.shared_feed = self.shared_feed, None
+        if feed is not None:
+            self.export_shared(feed, output_dir)
+            return
+        query, params = self.query, ()
+        if self.incremental:
+            watermark = incremental.load_watermark(db, self.get_id(), self.incremental)
+            query, params = incremental.build_query(self.query, self.incremental["column"], watermark)
+            if watermark is None:
+                self.log(f"Incremental run: no watermark yet for {self.incremental['column']}, extracting everything")
+            else:
+                self.log(f"Incremental run: {self.incremental['column']} > {watermark}")
+
+        if self.partition:
+            self.export_partitioned(query, output_dir)
+            return
+        if self.retry["checkpoint_column"] and self.retry["retries"]:
+            self.export_segmented(db, query, params, self.output_path(output_dir))
+            return
+
+        query = decorate_query(query, self.extract)
+        output_path = self.output_path(output_dir)
+        cache, key = None, None
+        if self.cache:
+            cache, key = ResultCache(output_dir), cache_key(query, params)
+            hit = cache.lookup(key, self.cache["ttl"])
+            if hit:
+                cached_path, age = hit
+                self.log(f"Cache hit: serving result {key[:12]} cached {age:.0f}s ago (ttl {self.cache['ttl']}s)")
+                self.cache_hit = True
+                self.export_cached(cached_path, output_path)
+                return
+            self.log(f"Cache miss for result {key[:12]}, querying DB2")
+
+        with self.timer.phase("execute"):
+            stmt = db.cursor(query, params, statement_options(self.extract, self.remaining()))
+            columns = describe_columns(stmt)
+        self.rows_exported = 0
+        total = expected_rows(stmt) if self.extract["prefetch"] else None
+
+        key_index, key_type = None, None
+        if self.incremental:
+            key_index = incremental.column_index(columns, self.incremental["column"])
+            key_type = columns[key_index]["type"]
+
+        # Stream batches straight to the output file, preview only the first one
+        append = bool(self.incremental) and self.incremental["mode"] == "append"
+        size_before = os.path.getsize(output_path) if append and os.path.exists(output_path) else 0
+        # Appends go to the file in place, everything else is written aside and renamed over the output
+        tmp_path = output_path if append else publish.temp_path(output_path)
+        writer = open_writer(tmp_path, self.format, columns, self.compression, append=append)
+        self.progress.track(tmp_path, size_before)
+        cache_tmp, cache_writer = cache.open_writer(key, columns) if cache else (None, None)
+        completed = False
+        try:
+            self.rows_exported, high_water = self.stream(
+                stmt, columns, writer, cache_writer, self.timer, key_index, key_type, total=total
+            )
+            completed = True
+        finally:
+            writer.close()
+            if not completed:
+                if append:
+                    publish.rollback_append(output_path, size_before)
+                else:
+                    publish.discard(tmp_path)
+            if cache_writer:
+                cache_writer.close()
+                if completed:
+                    cache.commit(key, cache_tmp)
+                else:
+                    cache.discard(cache_tmp)
+        with self.timer.phase("publish"):
+            if append:
+                publish.fsync_path(output_path)
+            else:
+                publish.publish(tmp_path, output_path)
+        self.bytes_written = os.path.getsize(output_path) - size_before
+        # The manifest describes the whole file, this run's rows go in its delta_rows
+        rows_in_file = publish.rows_after_append(output_path, size_before, self.rows_exported, self.format,
+                                                 self.compression) if append else self.rows_exported
+        self.columns, self.outputs = columns, [(output_path, rows_in_file)]
+
+        # Only move the watermark once the rows are safely written
+        if high_water is not None:
+            value = incremental.format_watermark(high_water)
+            try:
+                incremental.save_watermark(db, self.get_id(), self.incremental, value, self.run_id)
+            except Exception:
+                # The next run extracts these rows again, they mustn't already be in the file
+                if append:
+                    publish.rollback_append(output_path, size_before)
+                raise
+            self.log(f"New watermark for {self.incremental['column']}: {value}")
+
+    def stream(self, stmt, columns, writer, cache_writer, timer, key_index=None, key_type=None,
+               total=None, preview=True, label="", batches=None, max_batches=None, offset=0):
+        # Returns (rows, high water of key_index). Stops after max_batches when given, batches can then be passed again.
+        header = [c["name"] for c in columns]
+        of_total = f" of {total}" if total else ""
+        # Columnar outputs and the cache share one Arrow conversion per batch
+        columnar = hasattr(writer, "schema")
+        schema = writer.schema if columnar else cache_writer.schema if cache_writer else None
+        capture = self._result_batches
+        if capture is not None:
+            schema = schema if schema is not None else arrow_schema(columns)
+            self._result_schema = self._result_schema or schema
+        if batches is None:
+            batches = fetch_batches(stmt, self.batch_size, self.extract["fetch_size"])
+        rows, batch_number, high_water = 0, 0, None
+        while max_batches is None or batch_number < max_batches:
+            self.check_deadline()
+            with timer.phase("fetch"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            batch_number += 1
+            if rows == 0 and preview and self.preview_rows:
+                self.show_preview(header, batch)
+            with timer.phase("serialize"):
+                record_batch = to_record_batch(batch, schema) if schema is not None else None
+            with timer.phase("write"):
+                if columnar:
+                    writer.write_arrow(record_batch)
+                else:
+                    writer.write_batch(batch)
+                if cache_writer:
+                    cache_writer.write_arrow(record_batch)
+            if capture is not None:
+                capture.append(record_batch)
+            rows += len(batch)
+            self.progress.add_rows(len(batch))
+            if key_index is not None:
+                batch_high = incremental.batch_max(batch, key_index, key_type)
+                if batch_high is not None and (high_water is None or batch_high > high_water):
+                    high_water = batch_high
+            if self.log_progress_every and batch_number % self.log_progress_every == 0:
+                self.log(f"Progress{label}: {offset + rows}{of_total} rows exported ({batch_number} batches)", debug=False)
+        return rows, high_water
+
+    def export_segmented(self, db, query, params, output_path):
+        # Commits every checkpoint_every batches as a segment file ordered on the key,
+        # so a retry only extracts the rows after the last committed segment
+        column, every = self.retry["checkpoint_column"], self.retry["checkpoint_every"]
+        done = checkpoints.load(db, self.run_id, self.checkpoint_hash)
+        segments = []
+        for segment in sorted(done):
+            path = checkpoints.segment_output(output_path, segment)
+            if segment != len(segments) + 1 or not os.path.exists(path) or os.path.getsize(path) != done[segment]["bytes"]:
+                break
+            segments.append(segment)
+        checkpoints.clear(db, self.run_id, after=len(segments))
+        self.rows_exported = sum(done[s]["rows"] for s in segments)
+        last_key = done[segments[-1]]["last_key"] if segments else None
+        if segments:
+            self._result_batches = None
+
+        sql = f"SELECT * FROM ({query.strip().rstrip(';')}) AS ck"
+        if last_key is not None:
+            self.log(f"Resuming after segment {segments[-1]}: {self.rows_exported} rows already committed, {column} > {last_key}")
+            sql, params = f"{sql} WHERE ck.{column} > ?", tuple(params) + (last_key,)
+        sql = decorate_query(f"{sql} ORDER BY ck.{column}", self.extract)
+
+        with self.timer.phase("execute"):
+            stmt = db.cursor(sql, params, statement_options(self.extract, self.remaining()))
+            columns = describe_columns(stmt)
+        key_index = incremental.column_index(columns, column)
+        key_type = columns[key_index]["type"]
+        source = checkpoints.KeySegments(fetch_batches(stmt, self.batch_size, self.extract["fetch_size"]), key_index, every)
+
+        segment = len(segments) + 1
+        while True:
+            path = checkpoints.segment_output(output_path, segment)
+            tmp_path = publish.temp_path(path)
+            writer = open_writer(tmp_path, self.format, columns, self.compression)
+            self.progress.track(tmp_path)
+            try:
+                rows, high = self.stream(stmt, columns, writer, None, self.timer, key_index, key_type,
+                                         preview=self.rows_exported == 0, batches=source.segment(),
+                                         offset=self.rows_exported)
+            except Exception:
+                writer.close()
+                os.remove(tmp_path)
+                raise
+            writer.close()
+            if not rows:
+                os.remove(tmp_path)
+                break
+            publish.publish(tmp_path, path)
+            checkpoints.save(db, self.run_id, self.checkpoint_hash, segment, rows, os.path.getsize(path),
+                             incremental.format_watermark(high))
+            self.rows_exported += rows
+            segments.append(segment)
+            segment += 1
+
+        paths = [checkpoints.segment_output(output_path, s) for s in segments]
+        tmp_path = publish.temp_path(output_path)
+        with self.timer.phase("merge"):
+            if paths:
+                merge_parts(paths, tmp_path, self.format, self.compression)
+            else:
+                open_writer(tmp_path, self.format, columns, self.compression).close()
+        with self.timer.phase("publish"):
+            publish.publish(tmp_path, output_path)
+        for path in paths:
+            os.remove(path)
+        self.bytes_written = os.path.getsize(output_path)
+        self.columns, self.outputs = columns, [(output_path, self.rows_exported)]
+
+    def export_partitioned(self, query, output_dir):
+        spec = self.partition
+        pool = get_pool(conn_str)
+        with pool.connection() as db:
+            parts = partitions.plan_partitions(db, query, spec)
+            # Partitions a previous attempt of this run already committed are kept as they are
+            done = checkpoints.load(db, self.run_id, self.checkpoint_hash) if self.retry["retries"] else {}
+        # One connection is left for the status and checkpoint writes
+        workers = max(1, min(spec["parallel"], len(parts), pool.max_size - 1))
+        output_path = self.output_path(output_dir)
+        paths = [partitions.part_output(output_path, part["index"], len(parts)) for part in parts]
+        layout = "; ".join(f"part {part['index'] + 1}: {part['layout']}" for part in parts)
+        self.log(f"Partition layout ({spec['mode']} on {spec['column']}, {len(parts)} parts, {workers} at a time): {layout}")
+        if workers < min(spec["parallel"], len(parts)):
+            self.log(f"Only {workers} partitions run at once, raise DB_POOL_SIZE for more", "warning")
+
+        results, failed, todo = [], [], []
+        for part, path in zip(parts, paths):
+            saved = done.get(part["index"])
+            if saved and saved["last_key"] == part["layout"] and os.path.exists(path) and os.path.getsize(path) == saved["bytes"]:
+                results.append({"index": part["index"], "rows": saved["rows"], "bytes": saved["bytes"], "attempts": 0,
+                                "seconds": 0.0, "timer": PhaseTimer()})
+            else:
+                todo.append((part, path))
+        if results:
+            self.log(f"Resuming: {len(results)} of {len(parts)} partitions already committed")
+            self._result_batches = None
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="partition") as executor:
+            futures = {executor.submit(self.export_part, pool, part, path, len(parts)): part
+                       for part, path in todo}
+            for future in as_completed(futures):
+                part = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed.append(part["index"] + 1)
+                    self.log(f"Partition {part['index'] + 1}/{len(parts)} gave up: {e}", "fail")
+
+        if failed:
+            # With retries the committed parts are what the next attempt resumes from
+            if not self.retry["retries"]:
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            raise RuntimeError(f"Partition(s) {sorted(failed)} failed after {spec['retries']} retries")
+
+        for result in sorted(results, key=lambda r: r["index"]):
+            self.timer.add(result["timer"])
+            attempts = f"{result['attempts']} attempt(s)" if result["attempts"] else "from checkpoint"
+            self.log(f"Partition {result['index'] + 1}/{len(parts)}: {result['rows']} rows, {result['bytes']} bytes "
+                     f"in {result['seconds']:.2f}s ({attempts})", debug=False)
+        self.rows_exported = sum(r["rows"] for r in results)
+        # Parts resumed from a checkpoint weren't described in this attempt
+        self.columns = next((r["columns"] for r in results if r.get("columns")), None)
+
+        results.sort(key=lambda r: r["index"])
+        if not spec["merge"]:
+            self.bytes_written = sum(r["bytes"] for r in results)
+            self.outputs = [(path, result["rows"]) for path, result in zip(paths, results)]
+            return
+        # Empty parts are left out: their column types can't always be described
+        non_empty = [path for path, result in zip(paths, results) if result["rows"]]
+        tmp_path = publish.temp_path(output_path)
+        with self.timer.phase("merge"):
+            merge_parts(non_empty or paths[:1], tmp_path, self.format, self.compression)
+        with self.timer.phase("publish"):
+            publish.publish(tmp_path, output_path)
+        for path in paths:
+            os.remove(path)
+        self.bytes_written = os.path.getsize(output_path)
+        self.outputs = [(output_path, self.rows_exported)]
+        self.log(f"Merged {len(parts)} partitions into {self.output}")
+
+    def export_part(self, pool, part, path, count):
+        label = f" (part {part['index'] + 1}/{count})"
+        sql = decorate_query(part["sql"], self.extract)
+        tmp_path = publish.temp_path(path)
+        attempts = self.partition["retries"] + 1
+        for attempt in range(1, attempts + 1):
+            started = time.perf_counter()
+            timer = PhaseTimer()
+            try:
+                with pool.connection() as db:
+                    with timer.phase("execute"):
+                        stmt = db.cursor(sql, part["params"], statement_options(self.extract, self.remaining()))
+                        columns = describe_columns(stmt)
+                    writer = open_writer(tmp_path, self.format, columns, self.compression)
+                    self.progress.track(tmp_path)
+                    try:
+                        rows, _ = self.stream(stmt, columns, writer, None, timer,
+                                              preview=part["index"] == 0, label=label)
+                    finally:
+                        writer.close()
+                with timer.phase("publish"):
+                    publish.publish(tmp_path, path)
+                result = {"index": part["index"], "rows": rows, "bytes": os.path.getsize(path), "attempts": attempt,
+                          "seconds": time.perf_counter() - started, "timer": timer, "columns": columns}
+                break
+            except Exception as e:
+                publish.discard(tmp_path)
+                if attempt == attempts or isinstance(e, TimeoutError):
+                    raise
+                self.log(f"Partition {part['index'] + 1}/{count} failed (attempt {attempt}/{attempts}): {e}, retrying", "warning")
+                time.sleep(PARTITION_RETRY_DELAY * attempt)
+
+        if self.retry["retries"]:
+            try:
+                with pool.connection() as db:
+                    checkpoints.save(db, self.run_id, self.checkpoint_hash, part["index"], result["rows"],
+                                     result["bytes"], part["layout"])
+            except Exception as e:
+                self.log(f"Could not checkpoint partition {part['index'] + 1}/{count}: {e}", "warning")
+        return result
+
+    def export_cached(self, cached_path, output_path):
+        schema = cached_schema(cached_path)
+        columns = [{"name": field.name, "type": str(field.type)} for field in schema]
+        tmp_path = publish.temp_path(output_path)
+        writer = open_writer(tmp_path, self.format, columns, self.compression, schema=schema)
+        self.progress.track(tmp_path)
+        completed = False
+        try:
+            for record_batch in iter_cached_batches(cached_path, self.batch_size):
+                if self.rows_exported == 0 and self.preview_rows:
+                    self.show_preview(schema.names, rows_from_arrow(record_batch.slice(0, self.preview_rows)))
+                writer.write_arrow(record_batch)
+                if self._result_batches is not None:
+                    self._result_batches.append(record_batch)
+                self.rows_exported += record_batch.num_rows
+                self.progress.add_rows(record_batch.num_rows)
+            completed = True
+        finally:
+            writer.close()
+            if not completed:
+                publish.discard(tmp_path)
+        publish.publish(tmp_path, output_path)
+        self.bytes_written = os.path.getsize(output_path)
+        self.columns, self.outputs = columns, [(output_path, self.rows_exported)]
+        self._result_schema = schema
+
+    def export_shared(self, feed, output_dir):
+        # Record batches already filtered to this job's rows and columns by the shared scan
+        try:
+            header = feed.header()
+        except RuntimeError as e:
+            # The combined query didn't even start (one bad predicate is enough), so each job runs on its own
+            feed.close()
+            self.log(f"{e}, running the job's own query instead", "warning")
+            pool = get_pool(conn_str)
+            # Its own query needs its own run slot
+            lease = self.admit(pool)
+            try:
+                if lease is not None:
+                    self.set_status("RUNNING")
+                with pool.connection() as db:
+                    self.export(db, output_dir)
+            finally:
+                if lease is not None:
+                    lease.release()
+            return
+        try:
+            columns, schema = header
+            output_path = self.output_path(output_dir)
+            tmp_path = publish.temp_path(output_path)
+            writer = open_writer(tmp_path, self.format, columns, self.compression, schema=schema)
+            self.progress.track(tmp_path)
+            self.rows_exported, batch_number = 0, 0
+            completed = False
+            try:
+                for record_batch in feed:
+                    self.check_deadline()
+                    batch_number += 1
+                    if self.rows_exported == 0 and self.preview_rows:
+                        self.show_preview(schema.names, rows_from_arrow(record_batch.slice(0, self.preview_rows)))
+                    with self.timer.phase("write"):
+                        writer.write_arrow(record_batch)
+                    if self._result_batches is not None:
+                        self._result_batches.append(record_batch)
+                    self.rows_exported += record_batch.num_rows
+                    self.progress.add_rows(record_batch.num_rows)
+                    if self.log_progress_every and batch_number % self.log_progress_every == 0:
+                        self.log(f"Progress: {self.rows_exported} rows exported ({batch_number} batches)", debug=False)
+                completed = True
+            finally:
+                writer.close()
+                if not completed:
+                    publish.discard(tmp_path)
+        finally:
+            feed.close()
+        with self.timer.phase("publish"):
+            publish.publish(tmp_path, output_path)
+        self.bytes_written = os.path.getsize(output_path)
+        self.columns, self.outputs = columns, [(output_path, self.rows_exported)]
+        self._result_schema = schema
+
+    def export_transform(self, output_dir):
+        missing = [name for name in self.depends_on if name not in self.inputs]
+        if missing:
+            raise RuntimeError(f"No results for {missing}: transform jobs run through run_all.py or runner.py, "
+                               f"which run their dependencies first")
+        with self.timer.phase("transform"):
+            table = transforms.apply_transform(self.transform, self.inputs)
+        self.log(f"Transform: {table.num_rows} rows from {', '.join(f'{name} ({t.num_rows})' for name, t in self.inputs.items())}")
+
+        output_path = self.output_path(output_dir)
+        columns = [{"name": field.name, "type": str(field.type)} for field in table.schema]
+        tmp_path = publish.temp_path(output_path)
+        writer = open_writer(tmp_path, self.format, columns, self.compression, schema=table.schema)
+        self.progress.track(tmp_path)
+        self.rows_exported = 0
+        completed = False
+        try:
+            for record_batch in table.to_batches(max_chunksize=self.batch_size):
+                if self.rows_exported == 0 and self.preview_rows:
+                    self.show_preview(table.schema.names, rows_from_arrow(record_batch.slice(0, self.preview_rows)))
+                with self.timer.phase("write"):
+                    writer.write_arrow(record_batch)
+                self.rows_exported += record_batch.num_rows
+                self.progress.add_rows(record_batch.num_rows)
+            completed = True
+        finally:
+            writer.close()
+            if not completed:
+                publish.discard(tmp_path)
+        with self.timer.phase("publish"):
+            publish.publish(tmp_path, output_path)
+        self.bytes_written = os.path.getsize(output_path)
+        self.columns, self.outputs = columns, [(output_path, self.rows_exported)]
+        if self._result_batches is not None:
+            self._result_batches, self._result_schema = table.to_batches(), table.schema
+
+    def write_manifest(self, output_dir):
+        # <output>.manifest.json next to the export: downloaders can check completeness and skip unchanged files
+        if not self.outputs:
+            return
+        append = bool(self.incremental) and self.incremental["mode"] == "append"
+        with self.timer.phase("publish"):
+            files = [publish.file_entry(path, rows) for path, rows in self.outputs]
+            manifest = {
+                "job_name": self.job_name,
+                "run_id": self.run_id,
+                "output": os.path.basename(self.output_path(output_dir)),
+                "format": self.format,
+                "compression": self.compression,
+                "mode": "append" if append else "replace",
+                "rows": sum(f["rows"] for f in files),
+                "bytes": sum(f["bytes"] for f in files),
+                "sha256": files[0]["sha256"] if len(files) == 1 else None,
+                "files": files,
+                "schema": [self.schema_entry(c) for c in self.columns or []],
+                "cache_hit": self.cache_hit,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.start_time)),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration_s": round(time.time() - self.start_time, 3),
+                "phases_s": {name: round(seconds, 3) for name, seconds in self.timer.seconds.items()},
+            }
+            if append:
+                manifest["delta_rows"] = self.rows_exported
+            publish.write_manifest(self.output_path(output_dir), manifest)
+
+    def schema_entry(self, column):
+        entry = {"name": column["name"], "type": column.get("type")}
+        if column.get("type") == "decimal":
+            entry["precision"], entry["scale"] = column["precision"], column["scale"]
+        return entry
+
+    def collect_garbage(self, output_dir):
+        try:
+            removed = publish.collect_garbage(f"{output_dir}/{self.output}", self.retention)
+        except Exception as e:
+            self.log(f"Retention cleanup failed: {e}", "warning")
+            return
+        if removed:
+            shown = ", ".join(sorted(removed)[:5]) + ("..." if len(removed) > 5 else "")
+            self.log(f"Retention: removed {len(removed)} old file(s) ({shown})")
+
+    def output_path(self, output_dir):
+        if self.versioned or (self.incremental and self.incremental["mode"] == "partition"):
+            return f"{output_dir}/{incremental.partition_output(self.output, self.run_id)}"
+        return f"{output_dir}/{self.output}"
+
+    def show_preview(self, header, batch):
+        rows = batch[:self.preview_rows]
+        try:
+            import polars as pl
+        except ImportError:
+            # Polars is optional, a plain listing does the job
+            print(f"{bcolors.OKCYAN}Result Preview:{bcolors.ENDC}")
+            print(" | ".join(header))
+            for row in rows:
+                print(" | ".join(str(value) for value in row))
+            return
+        try:
+            df = pl.DataFrame(rows, schema=header, orient="row")
+            print(f"{bcolors.OKCYAN}Result Preview (Polars DataFrame):{bcolors.ENDC}")
+            print(df)
+        except Exception as df_err:
+            print(f"{bcolors.WARNING}Could not display DataFrame preview: {df_err}{bcolors.ENDC}")
+
+    def export_stats(self):
+        elapsed = (self.end_time or time.time()) - self.start_time
+        rows_per_sec = self.rows_exported / elapsed if elapsed > 0 else 0
+        peak = peak_rss_mb()
+        peak_str = f"{peak:.1f} MB" if peak is not None else "n/a"
+        return (f"Exported {self.rows_exported} rows ({self.bytes_written} bytes, {self.format}) "
+                f"in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec, peak RSS {peak_str})")
 
     def duration(self):
         if self.start_time and self.end_time:
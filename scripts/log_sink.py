@@ -0,0 +1,102 @@
+import atexit
+import os
+import signal
+import sys
+import threading
+
+from scripts.db_pool import get_pool
+
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+MAX_MESSAGE_LENGTH = 1000  # job_logs.message is VARCHAR(1000)
+
+
+def _insert_sql(n):
+    values = ", ".join(["(?, ?, ?)"] * n)
+    return f"INSERT INTO job_mgmt.job_logs (run_id, log_time, message) VALUES {values}"
+
+
+class LogSink:
+    def __init__(self, conn_str, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.conn_str = conn_str
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._records = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def emit(self, run_id, log_time, message):
+        with self._lock:
+            self._records.append((run_id, log_time, str(message)[:MAX_MESSAGE_LENGTH]))
+            full = len(self._records) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="job-log-sink", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if not records:
+                return
+
+            pool = get_pool(self.conn_str)
+            for i in range(0, len(records), self.batch_size):
+                chunk = records[i:i + self.batch_size]
+                params = [value for record in chunk for value in record]
+                try:
+                    pool.execute(_insert_sql(len(chunk)), params)
+                except Exception as e:
+                    # One bad record shouldn't take the whole batch with it
+                    print(f"⚠️ Batched job_logs insert failed ({e}), retrying row by row")
+                    for record in chunk:
+                        try:
+                            pool.execute(_insert_sql(1), record)
+                        except Exception as row_err:
+                            print(f"❌ Dropped log record {record}: {row_err}")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(conn_str=None):
+    conn_str = conn_str or os.getenv("CONN_STR")
+    with _sinks_lock:
+        sink = _sinks.get(conn_str)
+        if sink is None:
+            sink = _sinks[conn_str] = LogSink(conn_str)
+        return sink
+
+
+@atexit.register
+def flush_all_sinks():
+    for sink in list(_sinks.values()):
+        sink.close()
+
+
+def _on_sigterm(signum, frame):
+    # Kubernetes sends SIGTERM before killing the pod; exiting normally runs the atexit flush
+    sys.exit(128 + signum)
+
+
+if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+    signal.signal(signal.SIGTERM, _on_sigterm)
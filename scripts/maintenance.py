@@ -0,0 +1,207 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import ibm_db
+
+# Runs both as /app/maintenance.py and /app/scripts/maintenance.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.db_pool import get_pool, connect_count
+
+# Runs (and their logs, attempts, checkpoints) older than this are folded into job_run_daily and deleted
+RUN_RETENTION_DAYS = int(os.getenv("RUN_RETENTION_DAYS", "30"))
+# Runs per transaction, and log rows per DELETE, so pruning never holds long locks on DB2
+PRUNE_BATCH = int(os.getenv("PRUNE_BATCH", "500"))
+LOG_DELETE_BATCH = int(os.getenv("LOG_DELETE_BATCH", "5000"))
+
+# Histogram bounds kept in the rollups (same as the exporter's defaults). Stored as "le=count ..." so a reader
+# with other bounds can still fold them into its own buckets.
+ROLLUP_BUCKETS = {
+    "DURATION_HIST": [1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200],
+    "ROWS_HIST": [10, 100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8],
+    "BYTES_HIST": [1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10],
+    "QUEUE_HIST": [1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600],
+}
+# Durations, rows, bytes and queue time only come from runs that ran, like in the exporter: SKIPPED, INVALID
+# and RESUMED rows end the moment they start and would drag the histograms towards 0
+RAN_STATUSES = ("SUCCESS", "FAILURE")
+SUM_COLUMNS = ("RUNS", "SUCCESSES", "FAILURES", "CACHE_HITS", "DURATION_COUNT", "DURATION_SUM", "SUCCESS_SECONDS",
+               "ROWS_EXPORTED", "BYTES_WRITTEN", "QUEUE_SECONDS")
+ROLLUP_COLUMNS = ("JOB_ID", "RUN_DATE") + SUM_COLUMNS + ("DURATION_MIN", "DURATION_MAX", "LAST_ENDED_AT", "LAST_STATUS") \
+    + tuple(ROLLUP_BUCKETS)
+
+
+def parse_hist(text):
+    counts = {}
+    for pair in (text or "").split():
+        bound, count = pair.split("=")
+        counts[bound] = counts.get(bound, 0) + int(count)
+    return counts
+
+
+def format_hist(counts):
+    return " ".join(f"{bound}={counts[bound]}" for bound in sorted(counts, key=float) if counts[bound])
+
+
+def hist_bound(value, bounds):
+    return next((f"{b:g}" for b in bounds if value <= b), "inf")
+
+
+def _timestamp(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def empty_rollup(job_id, run_date):
+    rollup = dict.fromkeys(ROLLUP_COLUMNS)
+    rollup.update({"JOB_ID": job_id, "RUN_DATE": run_date}, **dict.fromkeys(SUM_COLUMNS, 0))
+    for column in ROLLUP_BUCKETS:
+        rollup[column] = {}
+    return rollup
+
+
+def add_run(rollup, run):
+    started, ended = _timestamp(run["STARTED_AT"]), _timestamp(run["ENDED_AT"])
+    status = run["STATUS"]
+    rollup["RUNS"] += 1
+    rollup["SUCCESSES"] += status == "SUCCESS"
+    rollup["FAILURES"] += status == "FAILURE"
+    rollup["CACHE_HITS"] += bool(run.get("CACHE_HIT")) and status in RAN_STATUSES
+
+    def observe(column, value):
+        bound = hist_bound(value, ROLLUP_BUCKETS[column])
+        rollup[column][bound] = rollup[column].get(bound, 0) + 1
+
+    if status in RAN_STATUSES and started is not None and ended is not None:
+        duration = max(0.0, (ended - started).total_seconds())
+        rollup["DURATION_COUNT"] += 1
+        rollup["DURATION_SUM"] += duration
+        if status == "SUCCESS":
+            rollup["SUCCESS_SECONDS"] += duration
+        rollup["DURATION_MIN"] = duration if rollup["DURATION_MIN"] is None else min(rollup["DURATION_MIN"], duration)
+        rollup["DURATION_MAX"] = duration if rollup["DURATION_MAX"] is None else max(rollup["DURATION_MAX"], duration)
+        observe("DURATION_HIST", duration)
+    for column, hist in (("ROWS_EXPORTED", "ROWS_HIST"), ("BYTES_WRITTEN", "BYTES_HIST"), ("QUEUE_SECONDS", "QUEUE_HIST")):
+        if status in RAN_STATUSES and run.get(column) is not None:
+            rollup[column] += run[column]
+            observe(hist, float(run[column]))
+    if ended is not None and (rollup["LAST_ENDED_AT"] is None or ended >= _timestamp(rollup["LAST_ENDED_AT"])):
+        rollup["LAST_ENDED_AT"], rollup["LAST_STATUS"] = ended, status
+
+
+def merge_rollup(db, rollup):
+    # Adds a batch's rollup to the stored one for that job and day
+    stmt = db.execute(f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM job_mgmt.job_run_daily WHERE job_id = ? AND run_date = ?",
+                      (rollup["JOB_ID"], rollup["RUN_DATE"]))
+    stored = ibm_db.fetch_assoc(stmt)
+    if stored:
+        for column in SUM_COLUMNS:
+            rollup[column] += stored[column] or 0
+        for column, pick in (("DURATION_MIN", min), ("DURATION_MAX", max)):
+            values = [v for v in (rollup[column], stored[column]) if v is not None]
+            rollup[column] = pick(values) if values else None
+        if stored["LAST_ENDED_AT"] is not None and (
+                rollup["LAST_ENDED_AT"] is None or _timestamp(stored["LAST_ENDED_AT"]) > rollup["LAST_ENDED_AT"]):
+            rollup["LAST_ENDED_AT"], rollup["LAST_STATUS"] = _timestamp(stored["LAST_ENDED_AT"]), stored["LAST_STATUS"]
+        for column in ROLLUP_BUCKETS:
+            for bound, count in parse_hist(stored[column]).items():
+                rollup[column][bound] = rollup[column].get(bound, 0) + count
+
+    values = dict(rollup)
+    for column in ROLLUP_BUCKETS:
+        values[column] = format_hist(rollup[column])
+    if isinstance(values["LAST_ENDED_AT"], datetime.datetime):
+        values["LAST_ENDED_AT"] = values["LAST_ENDED_AT"].strftime("%Y-%m-%d %H:%M:%S")
+    columns = [c for c in ROLLUP_COLUMNS if c not in ("JOB_ID", "RUN_DATE")]
+    if stored:
+        db.execute(f"UPDATE job_mgmt.job_run_daily SET {', '.join(f'{c} = ?' for c in columns)} "
+                   "WHERE job_id = ? AND run_date = ?",
+                   tuple(values[c] for c in columns) + (values["JOB_ID"], values["RUN_DATE"]))
+    else:
+        db.execute(f"INSERT INTO job_mgmt.job_run_daily ({', '.join(ROLLUP_COLUMNS)}) "
+                   f"VALUES ({', '.join('?' * len(ROLLUP_COLUMNS))})",
+                   tuple(values[c] for c in ROLLUP_COLUMNS))
+
+
+def prune_horizon(pool, cutoff):
+    # Runs below this run_id started before the cutoff. Placeholder rows without timestamps go with them
+    # once they are closed, runs still open (or left open by a crashed runner) are never pruned.
+    row = pool.fetch_one("SELECT MIN(run_id) AS horizon FROM job_mgmt.job_runs WHERE started_at >= ?", (cutoff,))
+    if row and row["HORIZON"] is not None:
+        return int(row["HORIZON"])
+    row = pool.fetch_one("SELECT MAX(run_id) AS last_id FROM job_mgmt.job_runs")
+    return int(row["LAST_ID"]) + 1 if row and row["LAST_ID"] is not None else 0
+
+
+def delete_logs(pool, run_ids, batch=LOG_DELETE_BATCH):
+    placeholders = ", ".join("?" * len(run_ids))
+    deleted = 0
+    while True:
+        with pool.connection() as db:
+            stmt = db.execute(
+                f"DELETE FROM job_mgmt.job_logs WHERE log_id IN (SELECT log_id FROM job_mgmt.job_logs "
+                f"WHERE run_id IN ({placeholders}) FETCH FIRST {int(batch)} ROWS ONLY)",
+                tuple(run_ids)
+            )
+            count = ibm_db.num_rows(stmt)
+        deleted += max(count, 0)
+        if count < batch:
+            return deleted
+
+
+def prune(pool, retention_days=RUN_RETENTION_DAYS, batch=PRUNE_BATCH, max_batches=None):
+    cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - retention_days * 86400))
+    horizon = prune_horizon(pool, cutoff)
+    runs_done, logs_done, batches = 0, 0, 0
+    columns = "run_id, job_id, started_at, ended_at, status, cache_hit, rows_exported, bytes_written, queue_seconds"
+
+    while max_batches is None or batches < max_batches:
+        runs = pool.fetch_all(
+            f"SELECT {columns} FROM job_mgmt.job_runs WHERE run_id < ? AND ended_at IS NOT NULL "
+            f"ORDER BY run_id FETCH FIRST {int(batch)} ROWS ONLY",
+            (horizon,)
+        )
+        if not runs:
+            break
+        run_ids = [run["RUN_ID"] for run in runs]
+        # Logs first (they reference the runs), in their own small deletes
+        logs_done += delete_logs(pool, run_ids)
+
+        rollups = {}
+        for run in runs:
+            moment = _timestamp(run["ENDED_AT"]) or _timestamp(run["STARTED_AT"])
+            if moment is None:
+                continue  # never started, nothing to keep
+            key = (run["JOB_ID"], moment.date().isoformat())
+            if key not in rollups:
+                rollups[key] = empty_rollup(*key)
+            add_run(rollups[key], run)
+
+        placeholders = ", ".join("?" * len(run_ids))
+        with pool.connection() as db:
+            # The rollup and the delete land together, so a run is always counted exactly once
+            with db.transaction():
+                for rollup in rollups.values():
+                    merge_rollup(db, rollup)
+                for table in ("job_run_attempts", "job_checkpoints", "job_runs"):
+                    db.execute(f"DELETE FROM job_mgmt.{table} WHERE run_id IN ({placeholders})", tuple(run_ids))
+        runs_done += len(runs)
+        batches += 1
+        print(f"🧹 Rolled up and pruned {runs_done} runs, {logs_done} log lines so far (runs before {cutoff})")
+
+    return {"runs": runs_done, "logs": logs_done, "batches": batches, "cutoff": cutoff}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold old job_runs/job_logs into job_run_daily and delete them")
+    parser.add_argument("--retention-days", type=int, default=RUN_RETENTION_DAYS)
+    parser.add_argument("--batch", type=int, default=PRUNE_BATCH, help="Runs per transaction")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches (next run continues)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = prune(get_pool(), args.retention_days, args.batch, args.max_batches)
+    print(f"✅ Pruned {result['runs']} runs and {result['logs']} log lines older than {result['cutoff']} "
+          f"in {result['batches']} batch(es), {time.perf_counter() - started:.2f}s, {connect_count()} DB connects")
@@ -0,0 +1,248 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import yaml
+
+from scripts.color_classes import bcolors
+from scripts.db_pool import get_pool, connect_count
+from scripts.jobfile_class import JobFile
+from scripts.registration import YamlLoader
+from scripts.shared_scan import SharedScan, plan_groups, SHARED_SCAN_WINDOW
+from scripts.transforms import parse_depends_on
+
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", "4"))
+
+
+def load_jobs(yaml_paths):
+    jobs, failures = [], []
+    for path in yaml_paths:
+        try:
+            jobs.append(JobFile(str(path)))
+        except Exception as e:
+            print(f"{bcolors.FAIL}❌ Could not load {path}: {e}{bcolors.ENDC}")
+            failures.append({"job_name": os.path.basename(str(path)), "status": "INVALID",
+                             "duration": None, "rows": 0, "bytes": 0, "error": str(e)})
+    return jobs, failures
+
+
+def concurrency_group(job):
+    return getattr(job, "concurrency_group", None) or job.job_name
+
+
+def group_limits(jobs):
+    # Jobs sharing a concurrency_group get the smallest max_concurrency declared in the group.
+    # Returns (limits, {job_name: error}), a limit below 1 would never let the job start.
+    limits, invalid = {}, {}
+    for job in jobs:
+        group = concurrency_group(job)
+        value = getattr(job, "max_concurrency", None)
+        try:
+            limit = 1 if value is None else int(value)
+        except (TypeError, ValueError):
+            limit = 0
+        if limit < 1:
+            invalid[job.job_name] = f"max_concurrency must be an integer of at least 1, got {value!r}"
+            continue
+        limits[group] = min(limits.get(group, limit), limit)
+    return limits, invalid
+
+
+def invalid_result(job_name, error):
+    print(f"{bcolors.FAIL}❌ {job_name}: {error}{bcolors.ENDC}")
+    return {"job_name": job_name, "status": "INVALID", "duration": None, "rows": 0, "bytes": 0, "error": error}
+
+
+def dependency_order(jobs):
+    # Topological order (Kahn), keeping the given order among independent jobs.
+    # Returns (ordered jobs, {job_name: error}) for unknown dependencies and cycles.
+    by_name = {job.job_name: job for job in jobs}
+    invalid = {}
+    changed = True
+    while changed:
+        # A job depending on an invalid one can't run either
+        changed = False
+        for job in jobs:
+            if job.job_name in invalid:
+                continue
+            bad = [name for name in job.depends_on if name not in by_name or name in invalid]
+            if bad:
+                invalid[job.job_name] = f"depends on {bad}, which is not part of this run or invalid"
+                changed = True
+
+    remaining = [job for job in jobs if job.job_name not in invalid]
+    waiting_on = {job.job_name: len(set(job.depends_on)) for job in remaining}
+    dependents = {job.job_name: [] for job in remaining}
+    for job in remaining:
+        for name in set(job.depends_on):
+            dependents[name].append(job)
+    ready = [job for job in remaining if waiting_on[job.job_name] == 0]
+    ordered = []
+    while ready:
+        job = ready.pop(0)
+        ordered.append(job)
+        for dependent in dependents[job.job_name]:
+            waiting_on[dependent.job_name] -= 1
+            if waiting_on[dependent.job_name] == 0:
+                ready.append(dependent)
+    for job in remaining:
+        if waiting_on[job.job_name] > 0:
+            invalid[job.job_name] = "dependency cycle"
+    return ordered, invalid
+
+
+def dependency_closure(yaml_path):
+    # The YAML plus, transitively, the YAMLs of the jobs it depends on, looked up among its sibling files
+    def read(path):
+        with open(path, "rb") as f:
+            data = yaml.load(f, Loader=YamlLoader)
+        return data if isinstance(data, dict) else {}
+
+    data = read(yaml_path)
+    if not data.get("depends_on"):
+        return [yaml_path]
+    directory = os.path.dirname(os.path.abspath(yaml_path))
+    by_name = {}
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.is_file() and entry.name.endswith((".yaml", ".yml")):
+            try:
+                by_name.setdefault(str(read(entry.path).get("job_name")), entry.path)
+            except Exception:
+                continue
+
+    paths, queue = [], [yaml_path]
+    while queue:
+        path = queue.pop(0)
+        if path in paths:
+            continue
+        paths.append(path)
+        for name in parse_depends_on(read(path).get("depends_on")):
+            if name not in by_name:
+                raise ValueError(f"Dependency '{name}' of {os.path.basename(path)} not found in {directory}")
+            queue.append(by_name[name])
+    return paths
+
+
+def run_jobs(yaml_paths, workers=EXECUTOR_WORKERS, db_connections=None, output_dir="/app/data/exports",
+             shared_scan=False, scan_window=SHARED_SCAN_WINDOW):
+    started = time.time()
+    # The pool is the global DB connection budget shared by every job in this process
+    get_pool(max_size=db_connections or workers + 1)
+
+    jobs, results = load_jobs(yaml_paths)
+    limits, invalid = group_limits(jobs)
+    loaded = jobs
+    jobs, unordered = dependency_order([job for job in jobs if job.job_name not in invalid])
+    invalid.update(unordered)
+    for job in loaded:
+        if job.job_name in invalid:
+            try:
+                job.skip(invalid[job.job_name], "INVALID")
+            except Exception as e:
+                print(f"⚠️ Could not record {job.job_name} as INVALID: {e}")
+    results.extend(invalid_result(name, error) for name, error in invalid.items())
+    running_per_group = {}
+    pending = list(jobs)
+    running = {}
+
+    # Results handed from a job to the jobs depending on it, as pyarrow Tables kept only until the last consumer ran
+    consumers = {job.job_name: 0 for job in jobs}
+    for job in jobs:
+        for name in set(job.depends_on):
+            consumers[name] += 1
+    for job in jobs:
+        job.keep_result = consumers[job.job_name] > 0
+    outcome, tables = {}, {}
+
+    # Jobs due together on the same table run off one scan, dispatched as a single unit
+    scan_groups = {}
+    if shared_scan:
+        for group in plan_groups(jobs, scan_window):
+            print(f"🔀 {group.job_name}: {', '.join(job.job_name for job in group.jobs)}")
+            for job in group.jobs:
+                scan_groups[job.job_name] = group
+
+    def release(job):
+        job.inputs = {}
+        for name in set(job.depends_on):
+            consumers[name] -= 1
+            if consumers[name] == 0:
+                tables.pop(name, None)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job") as executor:
+        while pending or running:
+            for job in list(pending):
+                if job not in pending:
+                    continue  # already went out with its shared scan
+                # pending is in dependency order, so a skip cascades down the DAG in a single pass
+                failed = next((name for name in job.depends_on if outcome.get(name, "SUCCESS") != "SUCCESS"), None)
+                if failed:
+                    pending.remove(job)
+                    job.skip(f"dependency {failed} ended with {outcome[failed]}")
+                    outcome[job.job_name] = "SKIPPED"
+                    release(job)
+                    results.append({"job_name": job.job_name, "status": "SKIPPED", "duration": None, "rows": 0,
+                                    "bytes": 0, "error": f"dependency {failed} did not succeed"})
+                    continue
+                if len(running) >= workers or any(name not in outcome for name in job.depends_on):
+                    continue
+                if job.job_name in scan_groups:
+                    # One query for the whole group, so concurrency_group limits don't apply to it
+                    scan = scan_groups[job.job_name]
+                    for member in scan.jobs:
+                        pending.remove(member)
+                    running[executor.submit(scan.run, output_dir)] = scan
+                    continue
+                group = concurrency_group(job)
+                if running_per_group.get(group, 0) >= limits[group]:
+                    continue
+                pending.remove(job)
+                running_per_group[group] = running_per_group.get(group, 0) + 1
+                job.inputs = {name: tables[name] for name in job.depends_on}
+                running[executor.submit(job.run, output_dir=output_dir)] = job
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = running.pop(future)
+                if isinstance(unit, SharedScan):
+                    errors = future.exception() or future.result()
+                    finished = [(job, errors if isinstance(errors, BaseException) else errors.get(job.job_name))
+                                for job in unit.jobs]
+                else:
+                    running_per_group[concurrency_group(unit)] -= 1
+                    finished = [(unit, future.exception())]
+                for job, error in finished:
+                    status = job.status if error is None else "FAILURE"
+                    if status == "SUCCESS" and job.keep_result:
+                        try:
+                            tables[job.job_name] = job.result_table()
+                        except Exception as e:
+                            status, error = "FAILURE", f"could not hand its result to downstream jobs: {e}"
+                    outcome[job.job_name] = status
+                    release(job)
+                    results.append({
+                        "job_name": job.job_name,
+                        "status": status,
+                        "duration": job.duration(),
+                        "rows": job.rows_exported,
+                        "bytes": job.bytes_written,
+                        "error": str(error) if error else None,
+                    })
+
+    print_summary(results, time.time() - started)
+    return results
+
+
+def print_summary(results, elapsed):
+    width = max([len(r["job_name"]) for r in results] + [8])
+    print(f"\n{bcolors.BOLD}{'JOB'.ljust(width)}  {'STATUS':<8}  {'DURATION':>9}  {'ROWS':>12}  {'BYTES':>14}{bcolors.ENDC}")
+    for r in sorted(results, key=lambda r: r["job_name"]):
+        color = bcolors.OKGREEN if r["status"] == "SUCCESS" else bcolors.WARNING if r["status"] == "SKIPPED" else bcolors.FAIL
+        duration = f"{r['duration']:.2f}s" if r["duration"] is not None else "-"
+        print(f"{r['job_name'].ljust(width)}  {color}{r['status']:<8}{bcolors.ENDC}  "
+              f"{duration:>9}  {r['rows']:>12}  {r['bytes']:>14}")
+
+    failed = sum(1 for r in results if r["status"] != "SUCCESS")
+    print(f"\n⏱️ {len(results)} jobs in {elapsed:.2f}s, {failed} failed, {connect_count()} DB connects")
@@ -0,0 +1,74 @@
+import os
+import re
+
+import ibm_db
+
+from scripts.export_writers import split_output
+
+PARTITION_MODES = {"mod", "range"}
+# Seconds to wait before retrying a failed partition, multiplied by the attempt number
+PARTITION_RETRY_DELAY = float(os.getenv("PARTITION_RETRY_DELAY", "2"))
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_partition(spec, incremental=None):
+    if not spec:
+        return None
+    column = str(spec.get("column") or "")
+    if not _IDENTIFIER.match(column):
+        raise ValueError("partition needs a `column`: an integer key of the select list, like transaction_id")
+
+    mode = spec.get("mode", "mod")
+    if mode not in PARTITION_MODES:
+        raise ValueError(f"Unknown partition mode '{mode}'. Expected one of {sorted(PARTITION_MODES)}")
+    count = int(spec.get("count", 4))
+    if count < 1:
+        raise ValueError("partition.count must be at least 1")
+    if incremental:
+        raise ValueError("partition can't be combined with incremental, pick one")
+
+    return {
+        "column": column.upper(),
+        "mode": mode,
+        "count": count,
+        "parallel": max(1, int(spec.get("parallel", count))),
+        "merge": bool(spec.get("merge", True)),
+        "retries": max(0, int(spec.get("retries", 2))),
+    }
+
+
+def plan_partitions(db, query, spec):
+    # One query per partition, each wrapping the job's query like incremental does
+    inner = query.strip().rstrip(";")
+    column, count = spec["column"], spec["count"]
+
+    if spec["mode"] == "mod":
+        # ABS so negative keys still land in a bucket
+        bounds = [(f"MOD(ABS(part.{column}), {count}) = ?", (i,), f"MOD({column}, {count}) = {i}")
+                  for i in range(count)]
+    else:
+        row = ibm_db.fetch_tuple(db.execute(f"SELECT MIN(part.{column}), MAX(part.{column}) FROM ({inner}) AS part"))
+        low, high = (int(row[0]), int(row[1])) if row and row[0] is not None else (0, 0)
+        step = max(1, -(-(high - low + 1) // count))
+        bounds = []
+        for i in range(count):
+            start, end = low + i * step, low + (i + 1) * step
+            bounds.append((f"part.{column} >= ? AND part.{column} < ?", (start, end), f"{start} <= {column} < {end}"))
+
+    parts = []
+    for index, (predicate, params, layout) in enumerate(bounds):
+        if index == 0:
+            # Rows without a key have to go somewhere
+            predicate, layout = f"({predicate} OR part.{column} IS NULL)", f"{layout} or NULL"
+        parts.append({
+            "index": index,
+            "sql": f"SELECT * FROM ({inner}) AS part WHERE {predicate}",
+            "params": params,
+            "layout": layout,
+        })
+    return parts
+
+
+def part_output(output_path, index, count):
+    stem, ext = split_output(output_path)
+    return f"{stem}.part{index + 1}of{count}{ext}"
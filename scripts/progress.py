@@ -0,0 +1,155 @@
+import json
+import os
+import platform
+import socket
+import threading
+import time
+import urllib.request
+
+# Seconds between progress snapshots of a running job, 0 turns live progress off
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "10"))
+# Exporter endpoint the snapshots are also POSTed to, e.g. http://metrics-exporter:9123/progress
+PROGRESS_URL = os.getenv("PROGRESS_URL")
+PROGRESS_POST_TIMEOUT = float(os.getenv("PROGRESS_POST_TIMEOUT", "2"))
+# Snapshots go to <output_dir>/.progress/<job_name>-<run_id>.json, on the shared exports volume in the cluster
+PROGRESS_DIRNAME = ".progress"
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Peak instead of current, ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+class RunProgress:
+    # Counters the export loops bump, sampled by a background thread into a status file and/or a POST
+
+    def __init__(self, job, interval=PROGRESS_INTERVAL, url=PROGRESS_URL):
+        self.job = job
+        self.interval = interval
+        self.url = url
+        self.path = None
+        self.rows = 0
+        self._files = {}  # path being written -> [size before the run, last size seen]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = None  # (monotonic, rows) of the previous snapshot
+        self._post_failed = False
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def add_rows(self, count):
+        with self._lock:
+            self.rows += count
+
+    def track(self, path, base=0):
+        # Bytes written are read from the size of the files being written, no bookkeeping in the writers
+        with self._lock:
+            self._files.setdefault(path, [base, base])
+
+    def bytes_written(self):
+        with self._lock:
+            paths = list(self._files)
+        sizes = {}
+        for path in paths:
+            try:
+                sizes[path] = os.path.getsize(path)
+            except OSError:
+                pass  # published (renamed) or discarded, keep the last size seen
+        with self._lock:
+            for path, size in sizes.items():
+                self._files[path][1] = size
+            return sum(max(0, size - base) for base, size in self._files.values())
+
+    def start(self, output_dir):
+        self._stop.clear()
+        self.rows, self._files, self._last = 0, {}, None
+        if not self.enabled:
+            return
+        self.path = os.path.join(output_dir, PROGRESS_DIRNAME, f"{self.job.job_name}-{self.job.run_id}.json")
+        self._thread = threading.Thread(target=self._loop, name="run-progress", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.publish()
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        # A last snapshot with the final status, then the run no longer shows up as in progress
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.publish(finished=True)
+
+    def snapshot(self, finished=False):
+        job = self.job
+        now = time.monotonic()
+        rows = self.rows
+        rate = 0.0
+        if self._last is not None and now > self._last[0]:
+            rate = (rows - self._last[1]) / (now - self._last[0])
+        elif job.start_time:
+            rate = rows / max(time.time() - job.start_time, 1e-9)
+        self._last = (now, rows)
+        timer = getattr(job, "timer", None)
+        return {
+            "job_name": job.job_name,
+            "run_id": job.run_id,
+            "status": job.status,
+            # Phase of the main export loop, partitions report the run's status
+            "phase": (timer.current if timer else None) or (job.status or "").lower(),
+            "rows": rows,
+            "bytes": self.bytes_written(),
+            "rows_per_sec": round(rate, 1),
+            "elapsed_seconds": round(time.time() - job.start_time, 1) if job.start_time else 0.0,
+            "rss_bytes": current_rss_bytes(),
+            "host": socket.gethostname(),
+            "updated_at": time.time(),
+            "finished": finished,
+        }
+
+    def publish(self, finished=False):
+        # Progress is best effort, it must never slow down or fail the run
+        try:
+            body = json.dumps(self.snapshot(finished)).encode()
+        except Exception as e:
+            print(f"⚠️ Could not build progress snapshot: {e}")
+            return
+        try:
+            if finished:
+                os.remove(self.path)
+            else:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(body)
+                os.replace(tmp_path, self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Could not write progress file {self.path}: {e}")
+        if self.url:
+            try:
+                request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+                urllib.request.urlopen(request, timeout=PROGRESS_POST_TIMEOUT).close()
+                self._post_failed = False
+            except Exception as e:
+                if not self._post_failed:
+                    print(f"⚠️ Could not push progress to {self.url}: {e}")
+                self._post_failed = True
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from scripts.export_writers import split_output, count_rows
+
+MANIFEST_SUFFIX = ".manifest.json"
+# Temp files of a crashed run older than this are removed by the next run of the same job
+STALE_TMP_AFTER = int(os.getenv("STALE_TMP_AFTER", str(6 * 3600)))
+
+
+def temp_path(path):
+    # Hidden and suffixed so downloaders and globs on the final name never pick it up.
+    # Unique per call: several jobs (threads of one process) may write the same output at once.
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(directory):
+    if os.name == "nt":
+        return  # directories can't be opened on Windows, the rename is durable enough there
+    fsync_path(directory)
+
+
+def publish(tmp_path, path):
+    # Readers see either the previous file or the complete new one, never a partial write
+    fsync_path(tmp_path)
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path) or ".")
+
+
+def discard(tmp_path):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def rollback_append(path, size_before):
+    # An append that failed part-way: cut the file back so the next run doesn't append the same rows again
+    if not os.path.exists(path):
+        return
+    if size_before:
+        os.truncate(path, size_before)
+    else:
+        os.remove(path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_entry(path, rows):
+    return {"name": os.path.basename(path), "rows": rows, "bytes": os.path.getsize(path), "sha256": file_sha256(path)}
+
+
+def manifest_path(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def write_manifest(output_path, manifest):
+    # Written after the data, so a manifest always describes complete files
+    path = manifest_path(output_path)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    publish(tmp_path, path)
+    return path
+
+
+def rows_after_append(output_path, size_before, added, fmt, compression=None):
+    # The previous manifest describes the file as it was before this append, unless something else wrote to it
+    # (or it predates delta_rows, when rows was only the delta)
+    if not size_before:
+        return added
+    try:
+        with open(manifest_path(output_path)) as f:
+            previous = json.load(f)
+        if "delta_rows" in previous and previous.get("bytes") == size_before:
+            return int(previous["rows"]) + added
+    except (OSError, ValueError, TypeError, KeyError):
+        pass
+    return count_rows(output_path, fmt, compression)
+
+
+def parse_retention(spec):
+    if not spec:
+        return None
+    if isinstance(spec, int) and not isinstance(spec, bool):
+        spec = {"keep": spec}
+    keep = spec.get("keep")
+    max_age_days = spec.get("max_age_days")
+    if keep is None and max_age_days is None:
+        raise ValueError("retention needs `keep` (versions) and/or `max_age_days`")
+    if keep is not None and int(keep) < 1:
+        raise ValueError("retention.keep must be at least 1")
+    return {
+        "keep": int(keep) if keep is not None else None,
+        "max_age": float(max_age_days) * 86400 if max_age_days is not None else None,
+    }
+
+
+def collect_garbage(output_path, retention=None):
+    # output_path is the unversioned one; versions are <stem>.run<id>[.partXofN]<ext>
+    directory, name = os.path.split(output_path)
+    directory = directory or "."
+    stem, ext = split_output(name)
+    version = re.compile(rf"^{re.escape(stem)}\.run(\d+)(\.part\d+of\d+)?{re.escape(ext)}({re.escape(MANIFEST_SUFFIX)})?$")
+    now = time.time()
+    removed = []
+
+    runs = {}
+    for entry in os.scandir(directory):
+        if not entry.is_file():
+            continue
+        if entry.name.startswith(f".{stem}") and ".tmp-" in entry.name:
+            if now - entry.stat().st_mtime > STALE_TMP_AFTER:
+                os.remove(entry.path)
+                removed.append(entry.name)
+            continue
+        match = version.match(entry.name)
+        if match:
+            runs.setdefault(int(match.group(1)), []).append(entry)
+
+    if retention:
+        for i, run_id in enumerate(sorted(runs, reverse=True)):
+            entries = runs[run_id]
+            newest = max(e.stat().st_mtime for e in entries)
+            too_many = retention["keep"] is not None and i >= retention["keep"]
+            too_old = retention["max_age"] is not None and now - newest > retention["max_age"]
+            if too_many or too_old:
+                for entry in entries:
+                    os.remove(entry.path)
+                    removed.append(entry.name)
+    return removed
@@ -0,0 +1,338 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+import ibm_db
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from scripts import sync_jobfiles
+from scripts.db_pool import get_pool
+from scripts.registration import file_content_hash
+
+# A job is reconciled at most once per RECONCILE_MIN_INTERVAL seconds, and at most RECONCILE_RATE jobs/sec overall
+RECONCILE_MIN_INTERVAL = float(os.getenv("RECONCILE_MIN_INTERVAL", "2"))
+RECONCILE_RATE = float(os.getenv("RECONCILE_RATE", "20"))
+RECONCILE_MAX_BACKOFF = 60
+DB_POLL_INTERVAL = float(os.getenv("RECONCILER_DB_POLL", "5"))
+# Fallback when watchdog isn't installed; with watchdog this is just a safety net
+FS_POLL_INTERVAL = float(os.getenv("RECONCILER_FS_POLL", "2"))
+# Full sync_all() pass, catches anything the watches missed
+RESYNC_INTERVAL = float(os.getenv("RECONCILER_RESYNC", "600"))
+WATCH_TIMEOUT = 300
+
+# updated_at is a ROW CHANGE TIMESTAMP, any edit of a job row moves its MAX
+DB_FINGERPRINT_SQL = """
+    SELECT COUNT(*) AS JOBS, MAX(job_id) AS MAX_ID, SUM(CASE WHEN is_active THEN job_id ELSE 0 END) AS ACTIVE_SUM,
+           MAX(updated_at) AS LAST_UPDATE
+    FROM job_mgmt.jobs
+"""
+
+
+def db_fingerprint(db):
+    row = ibm_db.fetch_assoc(db.execute(DB_FINGERPRINT_SQL))
+    return row["JOBS"], row["MAX_ID"], row["ACTIVE_SUM"], str(row["LAST_UPDATE"])
+
+
+class ReconcileQueue:
+    # One pending entry per job name, no matter how many events came in for it
+
+    def __init__(self, min_interval=RECONCILE_MIN_INTERVAL, rate=RECONCILE_RATE):
+        self.min_interval = min_interval
+        self.spacing = 1 / rate if rate > 0 else 0
+        self._cond = threading.Condition()
+        self._due = {}  # name -> earliest start (monotonic)
+        self._last = {}
+        self._failures = {}
+        self._processing = set()
+        self._next_slot = 0.0
+        self._closed = False
+
+    def add(self, name, delay=0.0):
+        with self._cond:
+            earliest = max(time.monotonic() + delay, self._last.get(name, 0.0) + self.min_interval)
+            self._due[name] = min(self._due.get(name, earliest), earliest)
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._closed:
+                ready = [(due, name) for name, due in self._due.items() if name not in self._processing]
+                if not ready:
+                    self._cond.wait()
+                    continue
+                due, name = min(ready)
+                now = time.monotonic()
+                start = max(due, self._next_slot)
+                if start > now:
+                    self._cond.wait(start - now)
+                    continue
+                del self._due[name]
+                self._processing.add(name)
+                self._next_slot = now + self.spacing
+                return name
+            return None
+
+    def done(self, name, ok=True):
+        with self._cond:
+            self._processing.discard(name)
+            self._last[name] = time.monotonic()
+            if ok:
+                self._failures.pop(name, None)
+            else:
+                failures = self._failures[name] = self._failures.get(name, 0) + 1
+                self.add(name, delay=min(RECONCILE_MAX_BACKOFF, 2 ** failures))
+            self._cond.notify_all()
+
+    def idle(self):
+        with self._cond:
+            return not self._due and not self._processing
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Reconciler:
+    def __init__(self, conn_str=None, jobs_dir=None, api=None, watch_factory=None, workers=2):
+        self.conn_str = conn_str or sync_jobfiles.CONN_STR
+        if not self.conn_str:
+            raise ValueError("CONN_STR not set in environment")
+        if jobs_dir is not None:
+            sync_jobfiles.JOBS_DIR = jobs_dir
+        if api is not None:
+            sync_jobfiles.batch_v1 = api
+        self.watch_factory = watch_factory
+        self.workers = workers
+        self.queue = ReconcileQueue()
+        self.stop_event = threading.Event()
+        self.reconciled = 0
+        self._threads = []
+        self._watch = None
+        self._fs_changed = threading.Event()
+        self._fs_snapshot = {}
+        self._db_fingerprint = None
+        self._db_snapshot = {}
+
+    # --- per-job reconcile ---
+
+    def reconcile_job(self, name):
+        yaml_path = os.path.join(sync_jobfiles.JOBS_DIR, f"{name}.yaml")
+        try:
+            yaml_hashes = {name: file_content_hash(yaml_path)}
+        except FileNotFoundError:
+            yaml_hashes = {}
+
+        with get_pool(self.conn_str).connection() as db:
+            db_jobs = sync_jobfiles.get_db_jobs(db, name)
+            if yaml_hashes and name not in db_jobs:
+                sync_jobfiles.insert_missing_jobs(db, set(yaml_hashes), db_jobs)
+                db_jobs = sync_jobfiles.get_db_jobs(db, name)
+
+            changed = sync_jobfiles.get_changed_jobs(yaml_hashes, db_jobs)
+            to_activate, to_deactivate = sync_jobfiles.plan_active_flags(set(yaml_hashes), db_jobs)
+            if changed or to_activate or to_deactivate:
+                sync_jobfiles.apply_db_changes(db, db_jobs, changed, to_activate, to_deactivate)
+
+        db_row = db_jobs.get(name)
+        action = sync_jobfiles.cronjob_action(db_row, sync_jobfiles.get_cronjob(name))
+        if action:
+            sync_jobfiles.apply_cronjob_action(action, name, db_row)
+        self.reconciled += 1
+        return action
+
+    def worker(self):
+        while not self.stop_event.is_set():
+            name = self.queue.get()
+            if name is None:
+                return
+            ok = True
+            try:
+                action = self.reconcile_job(name)
+                if action:
+                    print(f"🔁 Reconciled {name}: {action}")
+            except Exception as e:
+                ok = False
+                print(f"❌ Reconcile of {name} failed: {e}")
+            self.queue.done(name, ok)
+
+    # --- change sources ---
+
+    def scan_jobs_dir(self):
+        snapshot = {}
+        with os.scandir(sync_jobfiles.JOBS_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".yaml"):
+                    st = entry.stat()
+                    snapshot[entry.name[:-len(".yaml")]] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def check_jobs_dir(self):
+        snapshot = self.scan_jobs_dir()
+        for name in snapshot.keys() | self._fs_snapshot.keys():
+            if snapshot.get(name) != self._fs_snapshot.get(name):
+                self.queue.add(name)
+        self._fs_snapshot = snapshot
+
+    def watch_jobs_dir(self):
+        interval = FS_POLL_INTERVAL
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(handler, event):
+                    self._fs_changed.set()
+
+            observer = Observer()
+            observer.schedule(Handler(), sync_jobfiles.JOBS_DIR, recursive=False)
+            observer.daemon = True
+            observer.start()
+            interval = max(interval, 30)
+            print(f"👀 Watching {sync_jobfiles.JOBS_DIR} with watchdog")
+        except ImportError:
+            print(f"👀 Polling {sync_jobfiles.JOBS_DIR} every {interval}s (install watchdog for inotify)")
+
+        while not self.stop_event.is_set():
+            # ConfigMap mounts swap a ..data symlink, so any event triggers a rescan rather than trusting its path
+            self._fs_changed.wait(interval)
+            self._fs_changed.clear()
+            try:
+                self.check_jobs_dir()
+            except Exception as e:
+                print(f"❌ Scanning {sync_jobfiles.JOBS_DIR} failed: {e}")
+
+    def load_db_snapshot(self, db):
+        fingerprint = db_fingerprint(db)
+        snapshot = {name: (row["IS_ACTIVE"], row["SCHEDULE"], row["CONTENT_HASH"], int(row["SCHEDULE_OFFSET"] or 0))
+                    for name, row in sync_jobfiles.get_db_jobs(db).items()}
+        return fingerprint, snapshot
+
+    def check_db(self):
+        with get_pool(self.conn_str).connection() as db:
+            if db_fingerprint(db) == self._db_fingerprint:
+                return
+            # Something changed, only now pay for the full listing
+            fingerprint, snapshot = self.load_db_snapshot(db)
+        for name in snapshot.keys() | self._db_snapshot.keys():
+            if snapshot.get(name) != self._db_snapshot.get(name):
+                self.queue.add(name)
+        self._db_fingerprint, self._db_snapshot = fingerprint, snapshot
+
+    def poll_db(self):
+        while not self.stop_event.wait(DB_POLL_INTERVAL):
+            try:
+                self.check_db()
+            except Exception as e:
+                print(f"❌ DB poll failed: {e}")
+
+    def watch_cronjobs(self):
+        api = sync_jobfiles.get_batch_api()
+        resource_version = None
+        while not self.stop_event.is_set():
+            try:
+                if resource_version is None:
+                    listing = api.list_namespaced_cron_job(namespace=sync_jobfiles.NAMESPACE,
+                                                           label_selector=sync_jobfiles.CRONJOB_SELECTOR)
+                    resource_version = listing.metadata.resource_version
+
+                self._watch = self.watch_factory()
+                for event in self._watch.stream(api.list_namespaced_cron_job, namespace=sync_jobfiles.NAMESPACE,
+                                                label_selector=sync_jobfiles.CRONJOB_SELECTOR,
+                                                resource_version=resource_version, timeout_seconds=WATCH_TIMEOUT):
+                    if event["type"] == "ERROR":
+                        # Usually 410 Gone: our resource_version is too old, relist and resync
+                        print(f"⚠️ CronJob watch error: {event['object']}")
+                        resource_version = None
+                        self.queue_all()
+                        break
+                    cronjob = event["object"]
+                    resource_version = cronjob.metadata.resource_version or resource_version
+                    self.queue.add(cronjob.metadata.name)
+            except Exception as e:
+                if self.stop_event.is_set():
+                    return
+                print(f"❌ CronJob watch failed: {e}")
+                resource_version = None
+                self.queue_all()
+                self.stop_event.wait(5)
+
+    def queue_all(self):
+        for name in self._fs_snapshot.keys() | self._db_snapshot.keys():
+            self.queue.add(name)
+
+    def resync(self):
+        while not self.stop_event.wait(RESYNC_INTERVAL):
+            self.full_sync()
+
+    def full_sync(self):
+        try:
+            # Files are snapshotted before the pass so edits made during it still show up as changes,
+            # the DB after it so the pass's own writes don't
+            self._fs_snapshot = self.scan_jobs_dir()
+            sync_jobfiles.sync_all()
+            with get_pool(self.conn_str).connection() as db:
+                self._db_fingerprint, self._db_snapshot = self.load_db_snapshot(db)
+        except Exception as e:
+            print(f"❌ Full sync failed: {e}")
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self.watch_factory is None:
+            from kubernetes import watch
+            self.watch_factory = watch.Watch
+
+        self.full_sync()
+        targets = [self.watch_jobs_dir, self.poll_db, self.watch_cronjobs, self.resync]
+        targets += [self.worker] * self.workers
+        for target in targets:
+            thread = threading.Thread(target=target, name=f"reconciler-{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🚀 Reconciler started ({self.workers} workers)")
+
+    def stop(self):
+        self.stop_event.set()
+        self.queue.close()
+        self._fs_changed.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def wait_idle(self, timeout=30.0, settle=0.2):
+        # For tests and benchmarks: wait until nothing is queued or running for `settle` seconds
+        deadline = time.monotonic() + timeout
+        quiet_since = None
+        while time.monotonic() < deadline:
+            if self.queue.idle():
+                quiet_since = quiet_since or time.monotonic()
+                if time.monotonic() - quiet_since >= settle:
+                    return True
+            else:
+                quiet_since = None
+            time.sleep(0.02)
+        return False
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        self.start()
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+        print(f"👋 Reconciler stopped after {self.reconciled} reconciles")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-driven job/CronJob reconciler (replaces the sync CronJob)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RECONCILER_WORKERS", "2")))
+    parser.add_argument("--jobs-dir", default=None)
+    args = parser.parse_args()
+    Reconciler(jobs_dir=args.jobs_dir, workers=args.workers).run_forever()
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import time
+from contextlib import nullcontext
+
+import ibm_db
+import yaml
+
+from scripts.color_classes import bcolors
+from scripts.db_pool import get_pool
+from scripts.export_writers import resolve_format
+from scripts import incremental, transforms, shared_scan
+from scripts.result_cache import parse_cache
+
+REQUIRED_FIELDS = {"job_name", "type", "query", "output"}
+# Transform jobs read their upstream jobs' results instead of querying DB2
+TRANSFORM_REQUIRED_FIELDS = {"job_name", "type", "output", "transform", "depends_on"}
+# libyaml's loader when PyYAML was built with it, several times faster on big job folders
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# Rows per multi-row INSERT / names per IN (...) lookup
+REGISTER_CHUNK = 200
+
+
+def content_hash(raw_yaml):
+    # The CronJob is built from the YAML and the runner image, so both go into the hash
+    runner_image = os.getenv("RUNNER_IMAGE", "batch-runner:latest")
+    return hashlib.sha256(raw_yaml + b"\0" + runner_image.encode("utf-8")).hexdigest()
+
+
+def file_content_hash(yaml_path):
+    with open(yaml_path, 'rb') as f:
+        return content_hash(f.read())
+
+
+def required_fields(data):
+    if data.get("type") == transforms.TRANSFORM_TYPE:
+        return TRANSFORM_REQUIRED_FIELDS
+    # A `scan` spec stands in for the query
+    return REQUIRED_FIELDS - {"query"} if data.get("scan") else REQUIRED_FIELDS
+
+
+def load_job_definition(yaml_path):
+    # Same checks JobFile does on load, without touching the DB
+    with open(yaml_path, 'rb') as f:
+        raw = f.read()
+    data = yaml.load(raw, Loader=YamlLoader)
+    if not isinstance(data, dict):
+        raise ValueError("YAML does not contain a mapping")
+
+    missing = required_fields(data) - data.keys()
+    if missing:
+        raise ValueError(f"Missing required fields: {missing}")
+
+    fmt, _ = resolve_format(data["output"], data.get("format"), data.get("compression"))
+    incremental.parse_incremental(data.get("incremental"), fmt)
+    parse_cache(data.get("cache"))
+    if shared_scan.parse_scan(data.get("scan")) and data.get("query"):
+        raise ValueError("Define either `query` or `scan`, not both")
+    depends_on = transforms.parse_depends_on(data.get("depends_on"))
+    if data.get("type") == transforms.TRANSFORM_TYPE:
+        transforms.parse_transform(data["transform"], depends_on)
+
+    warnings = []
+    if "notify" not in data:
+        warnings.append("Notify not found. Defaulting to `false`. Please define it explicitly.")
+
+    return {
+        "job_name": str(data["job_name"]),
+        "schedule": data.get("schedule"),
+        "is_active": data.get("is_active", True),
+        "created_at": data.get("created_at", time.strftime("%Y-%m-%d %H:%M:%S")),
+        "content_hash": content_hash(raw),
+        "warnings": warnings,
+    }
+
+
+def fetch_job_ids(db, job_names):
+    job_ids = {}
+    for i in range(0, len(job_names), REGISTER_CHUNK):
+        chunk = job_names[i:i + REGISTER_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        stmt = db.execute(f"SELECT job_id, job_name FROM job_mgmt.jobs WHERE job_name IN ({placeholders})", tuple(chunk))
+        while row := ibm_db.fetch_assoc(stmt):
+            job_ids[row["JOB_NAME"]] = row["JOB_ID"]
+    return job_ids
+
+
+def insert_jobs(db, definitions):
+    for i in range(0, len(definitions), REGISTER_CHUNK):
+        chunk = definitions[i:i + REGISTER_CHUNK]
+        values = ", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))
+        params = []
+        for job in chunk:
+            params.extend((job["job_name"], job["schedule"], job["is_active"], job["created_at"], job["content_hash"]))
+        db.execute(f"INSERT INTO job_mgmt.jobs (job_name, schedule, is_active, created_at, content_hash) VALUES {values}", params)
+
+
+def register_jobs(yaml_paths, conn_str=None, db=None):
+    # Returns one dict per path: path, job_name, status (registered|exists|invalid|failed), job_id, error, warnings
+    results = []
+    definitions = {}
+    for path in yaml_paths:
+        result = {"path": str(path), "job_name": None, "status": None, "job_id": None, "error": None, "warnings": []}
+        results.append(result)
+        try:
+            job = load_job_definition(path)
+        except FileNotFoundError:
+            result.update(status="invalid", error=f"File not found: {path}")
+            continue
+        except Exception as e:
+            result.update(status="invalid", error=str(e))
+            continue
+
+        result.update(job_name=job["job_name"], warnings=job["warnings"])
+        if job["job_name"] in definitions:
+            result.update(status="invalid", error=f"Duplicate job_name, already defined in {definitions[job['job_name']][0]['path']}")
+            continue
+        definitions[job["job_name"]] = (result, job)
+
+    if not definitions:
+        return results
+
+    with (nullcontext(db) if db is not None else get_pool(conn_str).connection()) as db:
+        existing = fetch_job_ids(db, list(definitions))
+        new_jobs = [job for name, (_, job) in definitions.items() if name not in existing]
+
+        try:
+            if new_jobs:
+                with db.transaction():
+                    insert_jobs(db, new_jobs)
+                inserted = fetch_job_ids(db, [job["job_name"] for job in new_jobs])
+            else:
+                inserted = {}
+        except Exception as e:
+            for job in new_jobs:
+                definitions[job["job_name"]][0].update(status="failed", error=str(e))
+            inserted = None
+
+    for name, (result, _) in definitions.items():
+        if name in existing:
+            result.update(status="exists", job_id=existing[name])
+        elif inserted is not None:
+            result.update(status="registered", job_id=inserted.get(name))
+    return results
+
+
+def print_results(results):
+    for result in results:
+        label = result["job_name"] or os.path.basename(result["path"])
+        for warning in result["warnings"]:
+            print(f"{bcolors.WARNING}⚠️ {label}: {warning}{bcolors.ENDC}")
+        if result["status"] == "registered":
+            print(f"✅ Registered {label} (job_id {result['job_id']})")
+        elif result["status"] == "exists":
+            print(f"👌 {label} already exists under id {result['job_id']}")
+        else:
+            print(f"{bcolors.FAIL}❌ {label} {result['status']}: {result['error']}{bcolors.ENDC}")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print("📋 " + ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
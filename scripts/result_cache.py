@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+CACHE_DIR_NAME = ".cache"
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 ** 3)))
+CACHE_EXT = ".parquet"
+
+# String literals and quoted identifiers are kept as written, only comments and whitespace outside them are folded
+_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|(?:\s|--[^\n]*)+""")
+
+
+def parse_cache(spec):
+    if not spec:
+        return None
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        spec = {"ttl": spec}
+    if spec is True:
+        spec = {}
+    ttl = int(spec.get("ttl", 3600))
+    if ttl <= 0:
+        raise ValueError("cache ttl must be a positive number of seconds")
+    return {"ttl": ttl}
+
+
+def normalize_query(query):
+    query = _TOKENS.sub(lambda m: m.group(1) or " ", query)
+    return query.strip().rstrip(";").strip()
+
+
+def cache_key(query, params=()):
+    payload = json.dumps([normalize_query(query), [str(p) for p in params]])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # Entries are zstd parquet files on the exports PV.
+    # mtime = when the entry was written (TTL), atime = last hit (LRU).
+
+    def __init__(self, output_dir, max_bytes=CACHE_MAX_BYTES):
+        self.directory = os.path.join(output_dir, CACHE_DIR_NAME)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXT)
+
+    def lookup(self, key, ttl):
+        path = self.path(key)
+        try:
+            written = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        age = time.time() - written
+        if age > ttl:
+            self._remove(path)
+            return None
+        os.utime(path, (time.time(), written))
+        return path, age
+
+    def open_writer(self, key, columns):
+        from scripts.export_writers import ParquetWriter
+        os.makedirs(self.directory, exist_ok=True)
+        # Unique per writer: jobs of one run_all process often miss on the same key at the same time
+        tmp_path = f"{self.path(key)}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        return tmp_path, ParquetWriter(tmp_path, columns, compression="zstd")
+
+    def commit(self, key, tmp_path):
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def discard(self, tmp_path):
+        self._remove(tmp_path)
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_EXT):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            print(f"🧹 Evicted cached result {os.path.basename(path)} ({size} bytes)")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def iter_cached_batches(path, batch_size):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield record_batch
+
+
+def cached_schema(path):
+    import pyarrow.parquet as pq
+    return pq.read_schema(path)
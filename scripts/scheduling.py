@@ -0,0 +1,105 @@
+import datetime
+import math
+import os
+import time
+
+import ibm_db
+
+from scripts.cron_utils import MACROS
+
+# Jobs sharing a cron expression are spread over this many minutes after it, 0 leaves every schedule as written
+SCHEDULE_JITTER_WINDOW = int(os.getenv("SCHEDULE_JITTER_WINDOW", "0"))
+# Successful runs this recent feed the expected durations
+DURATION_LOOKBACK_DAYS = int(os.getenv("DURATION_LOOKBACK_DAYS", "14"))
+# Expected duration of a job without history yet
+DEFAULT_DURATION = float(os.getenv("DEFAULT_JOB_DURATION", "60"))
+
+
+def _fields(schedule):
+    return MACROS.get(schedule.strip(), schedule).split()
+
+
+def shiftable(schedule):
+    # Only a fixed minute (and a fixed or any hour) can be moved without changing how often the job runs
+    fields = _fields(schedule) if schedule else []
+    return len(fields) == 5 and fields[0].isdigit() and (fields[1] == "*" or fields[1].isdigit())
+
+
+def shift_schedule(schedule, offset):
+    if not offset or not shiftable(schedule):
+        return schedule
+    fields = _fields(schedule)
+    total = int(fields[0]) + offset
+    if fields[1] == "*":
+        return " ".join([str(total % 60)] + fields[1:])
+    hour = int(fields[1]) + total // 60
+    if hour > 23:
+        return schedule  # would land on the next day
+    return " ".join([str(total % 60), str(hour)] + fields[2:])
+
+
+def effective_schedule(db_row):
+    # What the CronJob actually runs on: the YAML schedule moved by the job's smoothing offset
+    return shift_schedule(db_row["SCHEDULE"] or "* * * * *", int(db_row.get("SCHEDULE_OFFSET") or 0))
+
+
+def _timestamp(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def load_durations(db, days=DURATION_LOOKBACK_DAYS):
+    # job_name -> average seconds of its recent successful runs
+    since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - days * 86400))
+    stmt = db.execute(
+        "SELECT j.job_name, r.started_at, r.ended_at FROM job_mgmt.job_runs r "
+        "JOIN job_mgmt.jobs j ON j.job_id = r.job_id "
+        "WHERE r.status = 'SUCCESS' AND r.started_at >= ? AND r.ended_at IS NOT NULL",
+        (since,)
+    )
+    totals = {}
+    while row := ibm_db.fetch_assoc(stmt):
+        seconds = (_timestamp(row["ENDED_AT"]) - _timestamp(row["STARTED_AT"])).total_seconds()
+        total, count = totals.get(row["JOB_NAME"], (0.0, 0))
+        totals[row["JOB_NAME"]] = (total + max(0.0, seconds), count + 1)
+    # Days already pruned by scripts/maintenance.py (retention shorter than the lookback) come from the rollups
+    stmt = db.execute(
+        "SELECT j.job_name, d.success_seconds, d.successes FROM job_mgmt.job_run_daily d "
+        "JOIN job_mgmt.jobs j ON j.job_id = d.job_id WHERE d.run_date >= ? AND d.successes > 0",
+        (since[:10],)
+    )
+    while row := ibm_db.fetch_assoc(stmt):
+        total, count = totals.get(row["JOB_NAME"], (0.0, 0))
+        totals[row["JOB_NAME"]] = (total + float(row["SUCCESS_SECONDS"]), count + int(row["SUCCESSES"]))
+    return {name: total / count for name, (total, count) in totals.items()}
+
+
+def plan_offsets(db_jobs, durations, window=SCHEDULE_JITTER_WINDOW):
+    # job_name -> minutes after its cron time. Within each group of active jobs on the same expression the
+    # longest jobs are placed first, each on the start minute overlapping least with the jobs already placed.
+    offsets = dict.fromkeys(db_jobs, 0)
+    if window <= 0:
+        return offsets
+
+    groups = {}
+    for name, row in db_jobs.items():
+        if row["IS_ACTIVE"] and shiftable(row["SCHEDULE"]):
+            groups.setdefault(" ".join(_fields(row["SCHEDULE"])), []).append(name)
+
+    for schedule, names in groups.items():
+        if len(names) < 2:
+            continue
+        # Hourly schedules can't move further than the next hour
+        span = min(window, 60) if schedule.split()[1] == "*" else window
+        # Whole minutes, so small changes in history don't move jobs around on every sync
+        minutes = {name: max(1, math.ceil(durations.get(name, DEFAULT_DURATION) / 60)) for name in names}
+        load = [0] * (span + max(minutes.values()))
+        starts = [0] * span
+        for name in sorted(names, key=lambda n: (-minutes[n], n)):
+            length = minutes[name]
+            # Least overlap first, then the minute with the fewest pods starting
+            start = min(range(span), key=lambda s: (sum(load[s:s + length]), starts[s], s))
+            offsets[name] = start
+            starts[start] += 1
+            for minute in range(start, start + length):
+                load[minute] += 1
+    return offsets
@@ -0,0 +1,225 @@
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts import admission, cron_utils
+from scripts.db_pool import get_pool
+from scripts.export_writers import arrow_schema, describe_columns, to_record_batch
+from scripts.extract import PhaseTimer, decorate_query, statement_options, fetch_batches
+
+# Jobs reading the same table whose schedules fired within this many minutes of each other share one scan
+SHARED_SCAN_WINDOW = int(os.getenv("SHARED_SCAN_WINDOW", "15"))
+# Batches buffered per job before the scan waits for a slow writer
+FEED_DEPTH = int(os.getenv("SHARED_SCAN_FEED_DEPTH", "4"))
+_TABLE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+_COLUMN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+FLAG_PREFIX = "SCAN_MATCH_"
+
+
+def parse_scan(spec):
+    if not spec:
+        return None
+    if not isinstance(spec, dict) or not spec.get("table"):
+        raise ValueError("scan needs at least `table`, e.g. {table: public.users, where: \"...\"}")
+    table = str(spec["table"])
+    if not _TABLE.match(table):
+        raise ValueError(f"scan.table '{table}' is not a plain [schema.]table name")
+    columns = spec.get("columns")
+    if columns is not None:
+        columns = [str(c).upper() for c in ([columns] if isinstance(columns, str) else columns)]
+        bad = [c for c in columns if not _COLUMN.match(c)]
+        if bad or not columns:
+            raise ValueError(f"scan.columns must be plain column names, got {bad or columns}")
+    where = spec.get("where")
+    return {"table": table.lower(), "columns": columns, "where": str(where).strip() if where else None}
+
+
+def build_query(scan):
+    # What the job runs when it isn't part of a shared scan
+    columns = ", ".join(scan["columns"]) if scan["columns"] else "*"
+    sql = f"SELECT {columns} FROM {scan['table']}"
+    return f"{sql} WHERE {scan['where']}" if scan["where"] else sql
+
+
+def shareable(job):
+    # Jobs with their own extraction strategy keep their own scan
+    return bool(job.scan) and not (job.depends_on or job.incremental or job.partition or job.cache
+                                   or job.retry["checkpoint_column"])
+
+
+def plan_groups(jobs, window=SHARED_SCAN_WINDOW, now=None):
+    # Clusters of at least two jobs on the same table whose last schedule fire lies within `window` minutes.
+    # Unscheduled jobs are run by hand together, so they count as due at the same time.
+    by_table = {}
+    for job in jobs:
+        if shareable(job):
+            fired = cron_utils.previous_fire(job.schedule, now)
+            by_table.setdefault(job.scan["table"], []).append((fired, job))
+
+    groups = []
+    for table, entries in by_table.items():
+        unscheduled = [job for fired, job in entries if fired is None]
+        clusters = [unscheduled] if unscheduled else []
+        current, started = [], None
+        for fired, job in sorted(((f, j) for f, j in entries if f is not None), key=lambda e: e[0]):
+            if current and (fired - started).total_seconds() > window * 60:
+                clusters.append(current)
+                current = []
+            if not current:
+                started = fired
+            current.append(job)
+        if current:
+            clusters.append(current)
+        groups.extend(SharedScan(table, cluster) for cluster in clusters if len(cluster) > 1)
+    return groups
+
+
+class ScanFeed:
+    # One job's side of a shared scan: a header (columns, schema), then record batches, then None
+    def __init__(self, depth=FEED_DEPTH):
+        self._queue = queue.Queue(maxsize=depth)
+        self.closed = False
+
+    def put(self, item):
+        # Gives up once the job stopped reading, so a failed job can't stall the scan
+        while not self.closed:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self):
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            raise RuntimeError(f"Shared scan failed: {item}")
+        return item
+
+    def header(self):
+        return self._get()
+
+    def __iter__(self):
+        while True:
+            item = self._get()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.closed = True
+
+
+class SharedScan:
+    def __init__(self, table, jobs):
+        self.table = table
+        self.jobs = jobs
+        self.job_name = f"shared scan of {table}"
+
+    def query(self):
+        # Each job's predicate becomes a 0/1 column, DB2 evaluates them all in the same pass
+        alias = "scan"
+        if any(job.scan["columns"] is None for job in self.jobs):
+            select = [f"{alias}.*"]
+        else:
+            select = list(dict.fromkeys(c for job in self.jobs for c in job.scan["columns"]))
+        wheres = [job.scan["where"] for job in self.jobs]
+        flags = [f"CASE WHEN ({where}) THEN 1 ELSE 0 END AS {FLAG_PREFIX}{i}"
+                 for i, where in enumerate(wheres) if where]
+        sql = f"SELECT {', '.join(select + flags)} FROM {self.table} {alias}"
+        if all(wheres):
+            sql += " WHERE " + " OR ".join(f"({where})" for where in wheres)
+        return sql
+
+    def run(self, output_dir):
+        # Every job runs as usual (own job_runs row, manifest, retries) but reads its rows from a feed
+        feeds = [ScanFeed() for _ in self.jobs]
+        for job, feed in zip(self.jobs, feeds):
+            job.shared_feed = feed
+            job.log(f"Sharing one scan of {self.table} with {len(self.jobs) - 1} other job(s): "
+                    f"{', '.join(j.job_name for j in self.jobs if j is not job)}")
+
+        def run_job(job, feed):
+            try:
+                job.run(output_dir=output_dir)
+            finally:
+                feed.close()
+                job.shared_feed = None
+
+        with ThreadPoolExecutor(max_workers=len(self.jobs), thread_name_prefix="scan-job") as executor:
+            futures = [executor.submit(run_job, job, feed) for job, feed in zip(self.jobs, feeds)]
+            self.scan(feeds)
+            return {job.job_name: future.exception() for job, future in zip(self.jobs, futures)}
+
+    def scan(self, feeds):
+        timer, rows, started = PhaseTimer(), 0, time.perf_counter()
+        lead = self.jobs[0]
+        lease = None
+        try:
+            # The members don't take run slots, the one query they share does
+            if admission.RUN_CONCURRENCY_BUDGET:
+                lease, waited = admission.acquire(get_pool(), self.job_name, lead.run_id)
+                if waited >= 1:
+                    lead.log(f"{self.job_name} admitted to run slot {lease.slot} after {waited:.1f}s in the queue")
+                # Each member's run row gets the scan's wait, and its duration starts at admission like any run's
+                admitted = time.time()
+                for job in self.jobs:
+                    job.queue_seconds = round((job.queue_seconds or 0) + waited, 3)
+                    if not job.resumed:
+                        job.start_time = admitted
+            with get_pool().connection() as db:
+                with timer.phase("execute"):
+                    stmt = db.cursor(decorate_query(self.query(), lead.extract), (), statement_options(lead.extract))
+                    columns = describe_columns(stmt)
+                schema = arrow_schema(columns)
+                names = [c["name"] for c in columns]
+
+                outputs = []
+                for i, (job, feed) in enumerate(zip(self.jobs, feeds)):
+                    wanted = job.scan["columns"]
+                    picked = [c for c in columns if not c["name"].startswith(FLAG_PREFIX)
+                              and (wanted is None or c["name"] in wanted)]
+                    if wanted is not None:
+                        # Keep the order the job asked for
+                        picked.sort(key=lambda c: wanted.index(c["name"]))
+                    flag = f"{FLAG_PREFIX}{i}"
+                    outputs.append((feed, [c["name"] for c in picked], names.index(flag) if flag in names else None))
+                    feed.put((picked, arrow_schema(picked)))
+
+                import pyarrow.compute as pc
+                for batch in fetch_batches(stmt, lead.batch_size, lead.extract["fetch_size"]):
+                    with timer.phase("serialize"):
+                        record_batch = to_record_batch(batch, schema)
+                    rows += len(batch)
+                    live = 0
+                    for feed, picked, flag_index in outputs:
+                        if feed.closed:
+                            continue
+                        live += 1
+                        with timer.phase("split"):
+                            part = record_batch
+                            if flag_index is not None:
+                                part = part.filter(pc.equal(record_batch.column(flag_index), 1))
+                            part = part.select(picked)
+                        if part.num_rows:
+                            feed.put(part)
+                    if not live:
+                        break
+        except Exception as e:
+            for feed in feeds:
+                feed.put(e)
+            return
+        finally:
+            if lease is not None:
+                try:
+                    lease.release()
+                except Exception as e:
+                    print(f"⚠️ Could not release run slot {lease.slot}, it frees up after {lease.ttl}s: {e}")
+        summary = (f"Shared scan of {self.table}: {rows} rows read once for {len(self.jobs)} jobs "
+                   f"in {time.perf_counter() - started:.2f}s. {timer.summary()}")
+        for job, feed in zip(self.jobs, feeds):
+            if not feed.closed:
+                job.log(summary, debug=False)
+            feed.put(None)
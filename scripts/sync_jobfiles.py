@@ -1,182 +1,225 @@
 import os
 import ibm_db
 import sys
+import time
 import json
 import yaml
 from pathlib import Path
-from scripts.jobfile_class import JobFile
+from scripts.registration import register_jobs, print_results, load_job_definition, file_content_hash
+from scripts.db_pool import get_pool, connect_count
 from dotenv import load_dotenv
 from kubernetes import client, config
-from kubernetes.client.exceptions import ApiException
+from scripts.cronjob_applier import CronJobApplier, cronjob_manifest, report, NAMESPACE, CRONJOB_SELECTOR
+from scripts.scheduling import SCHEDULE_JITTER_WINDOW, effective_schedule, load_durations, plan_offsets
 
 load_dotenv()
 JOBS_DIR = "jobs"
 CONN_STR = os.getenv("CONN_STR")
+# Job names per batched UPDATE ... WHERE job_name IN (...)
+UPDATE_CHUNK = 500
 
-# Init Kubernetes client
-config.load_incluster_config()
-batch_v1 = client.BatchV1Api()
-api_client = client.ApiClient()
+# Run durations behind the schedule offsets, reloaded when the active jobs or their schedules change, or once they
+# are older than this (the reconciler calls sync_all over and over in one process)
+DURATION_REFRESH = int(os.getenv("SCHEDULE_DURATION_REFRESH", "3600"))
+_durations = {"key": None, "loaded_at": 0.0, "values": {}}
 
-def get_db_job_names(conn) -> dict:
+# Kubernetes client, created on first use so the module can be imported outside the cluster
+batch_v1 = None
+
+def get_batch_api():
+    global batch_v1
+    if batch_v1 is None:
+        try:
+            config.load_incluster_config()
+        except config.ConfigException:
+            config.load_kube_config()  # running outside the cluster, e.g. db_scheduler.py locally
+        batch_v1 = client.BatchV1Api()
+    return batch_v1
+
+def get_applier():
+    return CronJobApplier(get_batch_api())
+
+def get_db_jobs(db, job_name=None) -> dict:
+    sql = "SELECT job_id, job_name, schedule, is_active, content_hash, schedule_offset FROM job_mgmt.jobs"
+    params = ()
+    if job_name is not None:
+        sql += " WHERE job_name = ?"
+        params = (job_name,)
     job_map = {}
-    stmt = ibm_db.exec_immediate(conn, "SELECT job_name, is_active FROM job_mgmt.jobs")
+    stmt = db.execute(sql, params)
     while row := ibm_db.fetch_assoc(stmt):
-        job_map[row["JOB_NAME"]] = row["IS_ACTIVE"]
+        row["IS_ACTIVE"] = bool(row["IS_ACTIVE"])
+        job_map[row["JOB_NAME"]] = row
     return job_map
 
-def get_schedule_for_job(job_name):
-    conn = ibm_db.connect(CONN_STR, "", "")
-    stmt = ibm_db.prepare(conn, "SELECT schedule FROM job_mgmt.jobs WHERE job_name = ?")
-    ibm_db.execute(stmt, (job_name,))
-    row = ibm_db.fetch_assoc(stmt)
-    ibm_db.close(conn)
-    return row["SCHEDULE"] if row else "* * * * *"
+def get_yaml_hashes(job_files) -> dict:
+    # Raw bytes only, YAMLs are parsed just for jobs whose hash changed
+    return {Path(f).stem: file_content_hash(os.path.join(JOBS_DIR, f)) for f in job_files}
 
-def set_inactive_for_missing(conn, missing_jobs):
-    if not missing_jobs:
-        return
-    for job_name in missing_jobs:
-        stmt = ibm_db.prepare(conn, """
-            UPDATE job_mgmt.jobs SET is_active = false WHERE job_name = ?
-        """)
-        ibm_db.execute(stmt, (job_name,))
-        print(f"🛑 Marked '{job_name}' as inactive (missing from YAML folder)")
-
-def set_active_jobs(conn, yaml_jobs):
-    for job_name in yaml_jobs:
-        stmt = ibm_db.prepare(conn, """
-            UPDATE job_mgmt.jobs SET is_active = true WHERE job_name = ?
-        """)
-        ibm_db.execute(stmt, (job_name,))
-        print(f"✅ Marked '{job_name}' as active")
-
-
-def insert_missing_jobs(yaml_jobs, db_jobs):
-    new_jobs = {
-        job_file for job_file in yaml_jobs
-        if job_file not in db_jobs
-    }
-    for job_file in new_jobs:
-        full_path = os.path.join(JOBS_DIR, f"{job_file}.yaml")
-        print(f"➕ Adding new job: {job_file}")
+def get_changed_jobs(yaml_hashes, db_jobs):
+    return sorted(name for name, h in yaml_hashes.items() if name in db_jobs and db_jobs[name]["CONTENT_HASH"] != h)
+
+def update_changed_jobs(db, changed):
+    updates = []
+    for name in changed:
         try:
-            result = os.popen(f"{sys.executable} sender.py {full_path}").read()
-            print(f"✅ Successfully added job: {job_file}")
-            if result:
-                print(f"   Output: {result.strip()}")
+            job = load_job_definition(os.path.join(JOBS_DIR, f"{name}.yaml"))
         except Exception as e:
-            print(f"❌ Failed to add job {job_file}: {e}")
+            print(f"❌ Skipping changed job '{name}', YAML is invalid: {e}")
+            continue
+        updates.append((name, job["schedule"], job["content_hash"]))
+
+    for name, schedule, new_hash in updates:
+        db.execute("UPDATE job_mgmt.jobs SET schedule = ?, content_hash = ? WHERE job_name = ?", (schedule, new_hash, name))
+        print(f"✏️ Updated '{name}' (schedule {schedule})")
+    return updates
+
+def plan_active_flags(yaml_jobs, db_jobs):
+    # Only jobs whose flag actually changes get written
+    to_activate = sorted(name for name in yaml_jobs if name in db_jobs and not db_jobs[name]["IS_ACTIVE"])
+    to_deactivate = sorted(name for name, row in db_jobs.items() if name not in yaml_jobs and row["IS_ACTIVE"])
+    return to_activate, to_deactivate
+
+def set_active_flag(db, job_names, active):
+    for i in range(0, len(job_names), UPDATE_CHUNK):
+        chunk = job_names[i:i + UPDATE_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        db.execute(f"UPDATE job_mgmt.jobs SET is_active = ? WHERE job_name IN ({placeholders})", (active, *chunk))
+    for job_name in job_names:
+        if active:
+            print(f"✅ Marked '{job_name}' as active")
+        else:
+            print(f"🛑 Marked '{job_name}' as inactive (missing from YAML folder)")
+
+def apply_db_changes(db, db_jobs, changed, to_activate, to_deactivate):
+    # One transaction for all of it, db_jobs is updated in place
+    with db.transaction():
+        updates = update_changed_jobs(db, changed)
+        set_active_flag(db, to_activate, True)
+        set_active_flag(db, to_deactivate, False)
+    for name, schedule, new_hash in updates:
+        db_jobs[name].update(SCHEDULE=schedule, CONTENT_HASH=new_hash)
+    for name in to_activate:
+        db_jobs[name]["IS_ACTIVE"] = True
+    for name in to_deactivate:
+        db_jobs[name]["IS_ACTIVE"] = False
+
+
+def insert_missing_jobs(db, yaml_jobs, db_jobs):
+    new_jobs = sorted(job_file for job_file in yaml_jobs if job_file not in db_jobs)
+    if not new_jobs:
+        return []
+    print(f"➕ Adding {len(new_jobs)} new job(s)")
+    results = register_jobs([os.path.join(JOBS_DIR, f"{job_file}.yaml") for job_file in new_jobs], db=db)
+    print_results(results)
+    return [r for r in results if r["status"] == "registered"]
+
+
+def smooth_schedules(db_jobs, window=SCHEDULE_JITTER_WINDOW):
+    # Offsets live in jobs.schedule_offset, so a single-job reconcile builds the same schedule as a full sync
+    current = {name: int(row.get("SCHEDULE_OFFSET") or 0) for name, row in db_jobs.items()}
+    if window <= 0 and not any(current.values()):
+        return
+    key = (window, frozenset((name, row["SCHEDULE"], bool(row["IS_ACTIVE"])) for name, row in db_jobs.items()))
+    try:
+        with get_pool(CONN_STR).connection() as db:
+            if window > 0 and (key != _durations["key"] or time.time() - _durations["loaded_at"] > DURATION_REFRESH):
+                _durations.update(key=key, loaded_at=time.time(), values=load_durations(db))
+            durations = _durations["values"] if window > 0 else {}
+            offsets = plan_offsets(db_jobs, durations, window)
+            changed = [(offset, name) for name, offset in sorted(offsets.items()) if offset != current[name]]
+            if changed:
+                with db.transaction():
+                    for offset, name in changed:
+                        db.execute("UPDATE job_mgmt.jobs SET schedule_offset = ? WHERE job_name = ?", (offset, name))
+    except Exception as e:
+        # The CronJobs keep the offsets they have
+        print(f"⚠️ Schedule smoothing skipped: {e}")
+        return
+    for offset, name in changed:
+        db_jobs[name]["SCHEDULE_OFFSET"] = offset
+    if changed:
+        print(f"🕰️ Moved {len(changed)} job(s) within a {window}-minute jitter window")
+
+def get_cronjobs() -> dict:
+    # name -> (suspend, content hash annotation, schedule)
+    return get_applier().live_state()
+
+def get_cronjob(name):
+    # Same as a get_cronjobs() entry, None if there is no generated CronJob with that name
+    return get_applier().read_state(name)
+
+def cronjob_action(db_row, live):
+    # live is the (suspend, hash, schedule) state of the CronJob, None if it doesn't exist
+    if db_row is None:
+        return "delete" if live is not None else None
+    if live is None:
+        return "create"
+    # Re-applied when the YAML (or runner image) changed since the CronJob was built
+    if db_row["CONTENT_HASH"] and live[1] != db_row["CONTENT_HASH"]:
+        return "update"
+    # ... or when schedule smoothing moved it
+    if live[2] != effective_schedule(db_row):
+        return "update"
+    # ... or when the suspend flag disagrees with is_active
+    if live[0] == db_row["IS_ACTIVE"]:
+        return "suspend" if live[0] is False else "resume"
+    return None
 
+def plan_cronjob_operation(action, job, db_row, name=None):
+    # name is the CronJob's, the job's own name unless the caller maps it (db_scheduler's cronjob- prefix)
+    name = name or job
+    if action == "delete":
+        print(f"🗑️ Deleting orphaned CronJob: {name}")
+        return name, action, None
+    yaml_path = os.path.join(JOBS_DIR, f"{job}.yaml")
+    if action == "create" and not os.path.exists(yaml_path):
+        print(f"⚠️ CronJob YAML not found for DB job '{job}'")
+        return None
+    print(f"⏳ {action.capitalize()} CronJob: {name}")
+    manifest = cronjob_manifest(name, effective_schedule(db_row), yaml_path,
+                                suspend=not db_row["IS_ACTIVE"], content_hash=db_row["CONTENT_HASH"])
+    return name, action, manifest
 
-def get_cronjob_names() -> set:
+def apply_cronjob_action(action, job, db_row):
+    operation = plan_cronjob_operation(action, job, db_row)
+    if operation is None:
+        return None
+    result = get_applier().run_one(*operation)
+    if result["error"]:
+        raise RuntimeError(f"Failed to {action} CronJob {job}: {result['error']}")
+    return result
+
+def sync_cronjobs_with_db(db_jobs, cron_name=None):
+    # cron_name maps a job name to its CronJob name, the job name itself by default
+    applier = get_applier()
     try:
-        cronjobs = batch_v1.list_namespaced_cron_job(namespace="default").items
-        return {cj.metadata.name for cj in cronjobs}
+        k8s_cronjobs = applier.live_state()
     except Exception as e:
+        # Without the live state every job would look new, better to do nothing this pass
         print(f"❌ Failed to fetch CronJobs: {e}")
-        return set()
-
-def generate_cronjob_spec(job_name: str, schedule: str, yaml_path: str, suspend: bool = False):
-    runner_image = os.getenv("RUNNER_IMAGE", "batch-runner:latest")
-    return client.V1CronJob(
-        api_version="batch/v1",
-        kind="CronJob",
-        metadata=client.V1ObjectMeta(
-            name=(job_name),
-            labels={"app": "batch-runner"},
-        ),
-        spec=client.V1CronJobSpec(
-            schedule=schedule,
-            suspend=suspend,
-            job_template=client.V1JobTemplateSpec(
-                spec=client.V1JobSpec(
-                    template=client.V1PodTemplateSpec(
-                        spec=client.V1PodSpec(
-                            containers=[
-                                client.V1Container(
-                                    name="runner",
-                                    image=runner_image,
-                                    image_pull_policy="Never",
-                                    command=["python", "runner.py", yaml_path],
-                                    env=[
-                                        client.V1EnvVar(
-                                            name="CONN_STR",
-                                            value_from=client.V1EnvVarSource(
-                                                secret_key_ref=client.V1SecretKeySelector(
-                                                    name="db-credentials",
-                                                    key="conn_str"
-                                                )
-                                            )
-                                        )
-                                    ],
-                                    volume_mounts=[client.V1VolumeMount(
-                                        name="export-volume",
-                                        mount_path="/app/data/exports"
-                                    )]
-                                )
-                            ],
-                            volumes=[client.V1Volume(
-                                name="export-volume",
-                                persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
-                                    claim_name="job-exports-pvc"
-                                )
-                            )],
-                            restart_policy="Never"
-                        )
-                    )
-                )
-            )
-        )
-    )
-
-def sync_cronjobs_with_db(db_jobs):
-    k8s_cronjobs = get_cronjob_names()
-    print(f"📦 Existing K8s CronJobs: {sorted(k8s_cronjobs)}")
-
-    db_names = set(db_jobs.keys())
-    k8s_names = {(jn) for jn in db_names}
-    print(f"🧾 Expected CronJob names: {sorted(k8s_names)}")
-
-    to_create = db_names - k8s_cronjobs
-    to_delete = k8s_cronjobs - db_names
-    to_update = db_names & k8s_cronjobs
-
-    for job in to_create:
-        original_job_name = job.removeprefix("cronjob-")
-        yaml_path = os.path.join(JOBS_DIR, f"{original_job_name}.yaml")
-        if os.path.exists(yaml_path):
-            print(f"⏳ Creating CronJob: {job}")
-            try:
-                schedule = get_schedule_for_job(original_job_name)
-                cronjob_spec = generate_cronjob_spec(original_job_name, schedule, yaml_path)
-                batch_v1.create_namespaced_cron_job(namespace="default", body=cronjob_spec)
-                print(f"✅ Created CronJob: {job}")
-            except ApiException as e:
-                if e.status == 409:
-                    print(f"⚠️ Already exists: {job}. Replacing instead.")
-                    batch_v1.replace_namespaced_cron_job(name=job, namespace="default", body=cronjob_spec)
-                    print(f"♻️ Replaced existing CronJob: {job}")
-                else:
-                    print(f"❌ Failed to create CronJob {job}: {e}")
-        else:
-            print(f"⚠️ CronJob YAML not found for DB job '{original_job_name}'")
+        return
+    print(f"📦 Existing K8s CronJobs: {len(k8s_cronjobs)}, expected: {len(db_jobs)}")
+    smooth_schedules(db_jobs)
 
-    for job in to_delete:
-        print(f"🗑️ Deleting orphaned CronJob: {job}")
-        try:
-            batch_v1.delete_namespaced_cron_job(name=job, namespace="default")
-        except Exception as e:
-            print(f"❌ Failed to delete CronJob {job}: {e}")
+    names = {cron_name(job) if cron_name else job: job for job in db_jobs}
+    operations = []
+    for name in sorted(names.keys() | k8s_cronjobs.keys()):
+        job = names.get(name)
+        db_row = db_jobs.get(job) if job is not None else None
+        action = cronjob_action(db_row, k8s_cronjobs.get(name))
+        if action:
+            operation = plan_cronjob_operation(action, job or name, db_row, name)
+            if operation:
+                operations.append(operation)
 
-    for job in to_update:
-        suspend = not db_jobs[job]
-        print(f"🔄 Syncing suspend={suspend} for CronJob: {job}")
-        try:
-            body = {"spec": {"suspend": suspend}}
-            batch_v1.patch_namespaced_cron_job(name=job, namespace="default", body=body)
-        except Exception as e:
-            print(f"❌ Failed to patch CronJob {job}: {e}")
+    if not operations:
+        print("👌 CronJobs already up to date")
+        return
+
+    started = time.perf_counter()
+    results = applier.run(operations)
+    report(results, time.perf_counter() - started)
 
 def sync_all():
     if not CONN_STR:
@@ -188,23 +231,27 @@ def sync_all():
         return
 
     job_files = [f for f in os.listdir(JOBS_DIR) if f.endswith(".yaml")]
-    print(f"📄 Found {len(job_files)} YAML files: {job_files}")
+    print(f"📄 Found {len(job_files)} YAML files")
 
-    conn = ibm_db.connect(CONN_STR, "", "")
-    yaml_jobs = {Path(f).stem for f in job_files}
-    db_jobs = get_db_job_names(conn)
+    yaml_hashes = get_yaml_hashes(job_files)
+    yaml_jobs = set(yaml_hashes)
 
-    print(f"🗂️  YAML jobs: {yaml_jobs}")
-    print(f"💾 DB jobs: {db_jobs}")
+    with get_pool(CONN_STR).connection() as db:
+        db_jobs = get_db_jobs(db)
+        print(f"🗂️  YAML jobs: {len(yaml_jobs)}, 💾 DB jobs: {len(db_jobs)}")
 
-    insert_missing_jobs(yaml_jobs, db_jobs)
-    set_active_jobs(conn, yaml_jobs)
-    set_inactive_for_missing(conn, {name for name in set(db_jobs.keys())} - yaml_jobs)
+        if insert_missing_jobs(db, yaml_jobs, db_jobs):
+            db_jobs = get_db_jobs(db)  # Refresh after inserts
 
-    db_jobs = get_db_job_names(conn)  # Refresh after inserts/updates
-    sync_cronjobs_with_db(db_jobs)
+        changed = get_changed_jobs(yaml_hashes, db_jobs)
+        to_activate, to_deactivate = plan_active_flags(yaml_jobs, db_jobs)
+        if changed or to_activate or to_deactivate:
+            apply_db_changes(db, db_jobs, changed, to_activate, to_deactivate)
+        else:
+            print("👌 Job definitions and active flags already up to date")
 
-    ibm_db.close(conn)
+    sync_cronjobs_with_db(db_jobs)
+    print(f"🔌 DB connects this sync: {connect_count()}")
 
 if __name__ == "__main__":
     print("🔁 Syncing job YAMLs with database records and Kubernetes...")
@@ -0,0 +1,94 @@
+TRANSFORM_TYPE = "transform"
+STEP_KINDS = ("filter", "join", "group_by", "select", "sort", "limit", "sql")
+AGGREGATIONS = {"sum", "mean", "min", "max", "count", "n_unique", "first", "last", "median", "std"}
+JOIN_HOWS = {"inner", "left", "right", "full", "semi", "anti", "cross"}
+
+
+def parse_depends_on(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [str(name) for name in value]
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def parse_transform(spec, depends_on):
+    if not isinstance(spec, dict):
+        raise ValueError("transform must be a mapping with `steps` (and optionally `input`)")
+    if not depends_on:
+        raise ValueError("a transform job needs `depends_on`: the jobs whose results it reads")
+    source = str(spec.get("input", depends_on[0]))
+    if source not in depends_on:
+        raise ValueError(f"transform input '{source}' is not listed in depends_on")
+
+    steps = []
+    for i, step in enumerate(spec.get("steps") or [], start=1):
+        kinds = [kind for kind in STEP_KINDS if kind in (step or {})]
+        if len(kinds) != 1:
+            raise ValueError(f"transform step {i} needs exactly one of {list(STEP_KINDS)}")
+        kind = kinds[0]
+        if kind == "join":
+            join = step["join"]
+            if True in join:
+                # YAML 1.1 reads a bare `on:` key as the boolean true
+                join["on"] = join.pop(True)
+            if join.get("with") not in depends_on:
+                raise ValueError(f"transform step {i}: join `with` must be one of depends_on {depends_on}")
+            if join.get("how", "inner") not in JOIN_HOWS:
+                raise ValueError(f"transform step {i}: unknown join how '{join.get('how')}'")
+            if join.get("how") != "cross" and not (join.get("on") or (join.get("left_on") and join.get("right_on"))):
+                raise ValueError(f"transform step {i}: join needs `on` or `left_on`/`right_on`")
+        if kind == "group_by":
+            aggs = step.get("agg") or {}
+            if not aggs:
+                raise ValueError(f"transform step {i}: group_by needs `agg`, e.g. {{AMOUNT: [sum, max]}}")
+            unknown = {fn for fns in aggs.values() for fn in _as_list(fns)} - AGGREGATIONS
+            if unknown:
+                raise ValueError(f"transform step {i}: unknown aggregation(s) {sorted(unknown)}")
+        steps.append(step)
+    return {"input": source, "steps": steps}
+
+
+def apply_transform(spec, inputs):
+    # inputs: {job_name: pyarrow.Table}. Everything stays lazy until the final collect, so Polars can push
+    # filters and projections down through joins and aggregations.
+    import polars as pl
+    frames = {name: pl.from_arrow(table).lazy() for name, table in inputs.items()}
+    frame = frames[spec["input"]]
+
+    for step in spec["steps"]:
+        if "filter" in step:
+            frame = frame.filter(pl.sql_expr(step["filter"]))
+        elif "join" in step:
+            join = step["join"]
+            how = join.get("how", "inner")
+            other = frames[join["with"]]
+            if how == "cross":
+                frame = frame.join(other, how="cross", suffix=join.get("suffix", "_right"))
+            elif join.get("on"):
+                frame = frame.join(other, on=_as_list(join["on"]), how=how, suffix=join.get("suffix", "_right"))
+            else:
+                frame = frame.join(other, left_on=_as_list(join["left_on"]), right_on=_as_list(join["right_on"]),
+                                   how=how, suffix=join.get("suffix", "_right"))
+        elif "group_by" in step:
+            aggs = [getattr(pl.col(column), fn)().alias(f"{column}_{fn}".upper())
+                    for column, fns in step["agg"].items() for fn in _as_list(fns)]
+            frame = frame.group_by(_as_list(step["group_by"]), maintain_order=True).agg(aggs)
+        elif "select" in step:
+            frame = frame.select(_as_list(step["select"]))
+        elif "sort" in step:
+            sort = step["sort"]
+            if not isinstance(sort, dict):
+                sort = {"by": sort}
+            frame = frame.sort(_as_list(sort["by"]), descending=bool(sort.get("descending", False)))
+        elif "limit" in step:
+            frame = frame.limit(int(step["limit"]))
+        elif "sql" in step:
+            # The frame so far is the table `self`
+            frame = frame.sql(step["sql"])
+
+    return frame.collect().to_arrow()